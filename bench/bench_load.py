@@ -0,0 +1,276 @@
+"""
+Load a resource of a mock service through the sync, async_*, batch and
+asyncio paths of the generated clients at a fixed concurrency, and
+report throughput, latency percentiles, CPU time and memory per call.
+
+The mock runs in its own process so that only the client is measured,
+and the rate limits of the spec are lifted. The calls can be recorded to
+a cassette and replayed later without the mock or any network, at full
+speed or with the recorded latencies. The asyncio path has a transport
+of its own and is not run when recording or replaying.
+
+    python bench/bench_load.py googleplaces --resource Places --param key=k \
+        --calls 5000 --concurrency 16 --latency 0.005 --output run.json
+    python bench/bench_load.py googleplaces --resource Places --param key=k \
+        --compare run.json
+    python bench/bench_load.py googleplaces --resource Places --param key=k \
+        --latency 0.005 --record places.cassette
+    python bench/bench_load.py googleplaces --resource Places --param key=k \
+        --replay places.cassette --replay-latency 1
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import threading
+import subprocess
+import tracemalloc
+import concurrent.futures
+
+from rekt import load_service
+from rekt.mock import resolve_spec
+from rekt.utils import load_config, api_method_name, async_api_method_name, batch_api_method_name
+from rekt.httputils import HTTPVerb
+from rekt.transport import RecordingTransport, ReplayTransport
+
+MODES = ('sync', 'async', 'batch', 'aio')
+# Lower is better for every field except the throughput
+_FIELDS = ('calls_per_sec', 'p50_ms', 'p99_ms', 'cpu_us_per_call', 'alloc_bytes_per_call',
+           'errors')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('bench-load')
+    parser.add_argument('spec', help='path or name of a builtin spec')
+    parser.add_argument('--resource', required=True)
+    parser.add_argument('--verb', default='GET')
+    parser.add_argument('--param', action='append', default=[],
+                        help='call argument as name=value, repeatable')
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--items', type=int, default=10)
+    parser.add_argument('--item-size', type=int, default=100)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='count allocations per call, slows every mode down')
+    parser.add_argument('--output', help='write the results as json')
+    parser.add_argument('--compare', help='json results of an earlier run to compare with')
+    parser.add_argument('--record', help='cassette to record the calls to')
+    parser.add_argument('--replay', help='cassette to answer the calls from instead of the mock')
+    parser.add_argument('--replay-latency', type=float, default=0.0,
+                        help='factor of the recorded latency to replay, 0 for full speed')
+    return parser.parse_args()
+
+
+def start_mock(args):
+    command = [sys.executable, '-m', 'rekt.mock', args.spec, '--latency', str(args.latency),
+               '--items', str(args.items), '--item-size', str(args.item_size),
+               '--error-rate', str(args.error_rate), '--seed', '0']
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True)
+    return process, process.stdout.readline().strip()
+
+
+def run_sync(service, method, kwargs, calls, concurrency, options):
+    latencies, errors = [], [0]
+    remaining = iter(range(calls))
+    lock = threading.Lock()
+
+    with service.Client(thread_count=concurrency, rate_limits={}, **options) as client:
+        call = getattr(client, method)
+
+        def worker():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                started = time.perf_counter()
+                try:
+                    call(**kwargs)
+                except Exception:
+                    errors[0] += 1
+                latencies.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return latencies, errors[0]
+
+
+def run_async(service, method, kwargs, calls, concurrency, options):
+    latencies, errors = [], 0
+    with service.Client(thread_count=concurrency, rate_limits={}, **options) as client:
+        call = getattr(client, method)
+        started, pending = {}, set()
+        submitted = 0
+        while submitted < calls or pending:
+            while submitted < calls and len(pending) < concurrency:
+                future = call(**kwargs)
+                started[future] = time.perf_counter()
+                pending.add(future)
+                submitted += 1
+            done, pending = concurrent.futures.wait(pending, return_when='FIRST_COMPLETED')
+            now = time.perf_counter()
+            for future in done:
+                latencies.append(now - started.pop(future))
+                errors += future.exception() is not None
+
+    return latencies, errors
+
+
+def run_batch(service, method, kwargs, calls, concurrency, options):
+    latencies, errors = [], 0
+    started = {}
+
+    def inputs():
+        for index in range(calls):
+            # Pulled by the batch right before it submits the call
+            started[index] = time.perf_counter()
+            yield kwargs
+
+    with service.Client(thread_count=concurrency, rate_limits={}, **options) as client:
+        for result in getattr(client, method)(inputs(), max_in_flight=concurrency):
+            latencies.append(time.perf_counter() - started.pop(result.index))
+            errors += result.exception is not None
+
+    return latencies, errors
+
+
+def run_aio(service, method, kwargs, calls, concurrency, options):
+    latencies, errors = [], [0]
+
+    async def main():
+        async with service.AsyncClient(max_concurrency=concurrency) as client:
+            call = getattr(client, method)
+            remaining = iter(range(calls))
+
+            async def worker():
+                for _ in remaining:
+                    started = time.perf_counter()
+                    try:
+                        await call(**kwargs)
+                    except Exception:
+                        errors[0] += 1
+                    latencies.append(time.perf_counter() - started)
+
+            await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+    return latencies, errors[0]
+
+
+_RUNNERS = {'sync' : run_sync, 'async' : run_async, 'batch' : run_batch, 'aio' : run_aio}
+_METHOD_NAMES = {'sync' : api_method_name, 'async' : async_api_method_name,
+                 'batch' : batch_api_method_name, 'aio' : api_method_name}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(mode, service, method, kwargs, args, options):
+    runner = _RUNNERS[mode]
+    # Warm up connections and caches of the interpreter
+    runner(service, method, kwargs, args.concurrency, args.concurrency, options)
+
+    if args.trace_memory:
+        tracemalloc.start()
+    cpu, wall = time.process_time(), time.perf_counter()
+    latencies, errors = runner(service, method, kwargs, args.calls, args.concurrency, options)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    alloc = None
+    if args.trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        alloc = peak / float(args.calls)
+
+    return {
+        'calls_per_sec' : args.calls / wall,
+        'p50_ms' : percentile(latencies, 0.5) * 1e3,
+        'p99_ms' : percentile(latencies, 0.99) * 1e3,
+        'cpu_us_per_call' : cpu / args.calls * 1e6,
+        'alloc_bytes_per_call' : alloc,
+        'errors' : errors,
+        'maxrss_kib' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def print_results(results, baseline=None):
+    print('{:<6} {:>14} {:>10} {:>10} {:>14} {:>16} {:>8}'.format('mode', *_FIELDS))
+    for mode, result in results.items():
+        cells = []
+        for field in _FIELDS:
+            value = result[field]
+            cell = '-' if value is None else '{:.1f}'.format(value)
+            old = (baseline or {}).get(mode, {}).get(field)
+            if value is not None and old:
+                cell += ' {:+.0f}%'.format((value - old) / old * 100)
+            cells.append(cell)
+        print('{:<6} {:>14} {:>10} {:>10} {:>14} {:>16} {:>8}'.format(mode, *cells))
+
+
+def main():
+    args = parse_args()
+    kwargs = dict([param.split('=', 1) for param in args.param])
+
+    config = load_config(resolve_spec(args.spec))
+    process, transport = None, None
+    if args.replay:
+        transport = ReplayTransport(args.replay, latency=args.replay_latency)
+    else:
+        process, config['base_url'] = start_mock(args)
+        if args.record:
+            transport = RecordingTransport(args.record)
+    options = {} if transport is None else {'transport' : transport}
+
+    try:
+        service = load_service(config)
+        api = getattr(service, '{}Resource'.format(args.resource))
+        verb = HTTPVerb[args.verb]
+
+        results = {}
+        for mode in args.modes.split(','):
+            if mode == 'aio' and (transport is not None or not hasattr(service, 'AsyncClient')):
+                continue
+            method = _METHOD_NAMES[mode](verb, api)
+            results[mode] = measure(mode, service, method, kwargs, args, options)
+    finally:
+        if transport is not None:
+            transport.close()
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)['results']
+
+    if args.replay:
+        source = 'replayed from {} at {}x the recorded latency'.format(args.replay,
+                                                                       args.replay_latency)
+    else:
+        source = '{}s mock latency'.format(args.latency)
+    print('{} calls of {} {} at concurrency {}, {}'.format(
+        args.calls, args.verb, args.resource, args.concurrency, source))
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump({'args' : vars(args), 'results' : results}, outfile, indent=2,
+                      sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Compare the response modes on a large result set: decode time, memory
+held, objects tracked by the garbage collector, the pause of a full
+collection while the results are held, and the memory still held after
+dropping them until the cyclic collector runs.
+
+    python bench/bench_memory.py --results 200000
+"""
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+
+from rekt.httputils import HTTPVerb
+from rekt.response import ResponseMode
+from rekt.service import create_api_definition, decode_content
+
+MODES = ('object', 'compact', 'lazy', 'dict')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('bench-memory')
+    parser.add_argument('--results', type=int, default=200000)
+    parser.add_argument('--pages', type=int, default=20,
+                        help='responses the results are split into')
+    parser.add_argument('--modes', default=','.join(MODES))
+    return parser.parse_args()
+
+
+def details_api():
+    return create_api_definition('Details', {
+        'url' : '/details/json',
+        'GET' : {'key' : None, 'placeid' : None},
+        'fields' : [['place_id', 'name', 'geometry', 'rating', 'types', 'vicinity',
+                     'opening_hours']],
+    }, 'https://maps.googleapis.com/maps/api/place')
+
+
+def result(index):
+    item = {
+        'place_id' : 'ChIJ{:012d}'.format(index),
+        'name' : 'Place {}'.format(index),
+        'geometry' : {'location' : {'lat' : 47.6 + index * 1e-6, 'lng' : -122.3}},
+        'types' : ['cafe', 'food', 'point_of_interest'],
+        'vicinity' : '{} Pike St, Seattle'.format(index),
+    }
+    # Optional fields come and go as in real results
+    if index % 3:
+        item['rating'] = 4.5
+    if index % 2:
+        item['opening_hours'] = {'open_now' : True}
+    return item
+
+
+def bodies(results, pages):
+    per_page = max(1, results // pages)
+    for start in range(0, results, per_page):
+        page = [result(i) for i in range(start, min(results, start + per_page))]
+        yield json.dumps({'status' : 'OK', 'results' : page}).encode('utf-8')
+
+
+def measure(mode, api, payloads):
+    decode = lambda: [decode_content(api, HTTPVerb.GET, body, mode) for body in payloads]
+
+    gc.collect()
+    started = time.perf_counter()
+    responses = decode()
+    elapsed = time.perf_counter() - started
+    del responses
+    gc.collect()
+
+    # Memory is traced on a second run since tracing slows decoding down
+    tracemalloc.start()
+    responses = decode()
+    held = tracemalloc.get_traced_memory()[0]
+
+    # A first collection untracks tuples of atomic values, then the
+    # pause of collecting the results that are held
+    gc.collect()
+    tracked = len(gc.get_objects())
+    started = time.perf_counter()
+    gc.collect()
+    pause = time.perf_counter() - started
+
+    # Without cycles the memory is returned right away, otherwise only
+    # once the collector runs
+    gc.disable()
+    try:
+        del responses
+        lingering = tracemalloc.get_traced_memory()[0]
+    finally:
+        gc.enable()
+    tracemalloc.stop()
+    gc.collect()
+
+    return elapsed, held, tracked, pause, lingering
+
+
+def main():
+    args = parse_args()
+    api = details_api()
+    payloads = list(bodies(args.results, args.pages))
+
+    gc.collect()
+    baseline = len(gc.get_objects())
+    print('{} results in {} responses, {:.1f} MiB of json'.format(
+        args.results, len(payloads), sum(map(len, payloads)) / 2. ** 20))
+    print('{:<8} {:>10} {:>10} {:>14} {:>12} {:>14}'.format(
+        'mode', 'decode ms', 'held MiB', 'gc tracked', 'gc pause ms', 'after del MiB'))
+    for name in args.modes.split(','):
+        decode, held, tracked, pause, lingering = measure(ResponseMode(name), api, payloads)
+        print('{:<8} {:>10.1f} {:>10.1f} {:>14} {:>12.1f} {:>14.1f}'.format(
+            name, decode * 1e3, held / 2. ** 20, tracked - baseline, pause * 1e3,
+            lingering / 2. ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Compare the per call cost of turning keyword arguments into request
+parameters: the request class validation previously done on every call
+against the compiled request builders.
+
+    python bench/bench_requests.py --repeat 200000
+"""
+import time
+import argparse
+
+from rekt.httputils import HTTPVerb
+from rekt.service import create_api_definition, request_arguments
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('bench-requests')
+    parser.add_argument('--repeat', type=int, default=200000)
+    return parser.parse_args()
+
+
+def places_api():
+    optional = ['location', 'radius', 'rankby', 'keyword', 'language', 'minprice',
+                'maxprice', 'name', 'opennow', 'types', 'pagetoken', 'zagatselected']
+    spec = dict([(arg, {'default' : None}) for arg in optional])
+    spec['key'] = None
+    spec['radius'] = {'default' : 500}
+    return create_api_definition('Places', {'url' : '/nearbysearch/json', 'GET' : spec},
+                                 'https://maps.googleapis.com/maps/api/place')
+
+
+def request_class_params(api, verb, kwargs):
+    # The per call path before the request builders
+    request = api.request_classes[verb](**kwargs)
+    return dict([ (k,v) for k,v in request.items() if v is not None ])
+
+
+def builder_params(api, verb, kwargs):
+    return api.request_builders[verb].build(kwargs)
+
+
+def builder_arguments(api, verb, kwargs):
+    builder = api.request_builders[verb]
+    return request_arguments(builder, builder.build(kwargs))
+
+
+def measure(func, api, kwargs, repeat):
+    verb = HTTPVerb.GET
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(api, verb, kwargs)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    args = parse_args()
+    api = places_api()
+    calls = [
+        ('3 args', {'key' : 'k', 'location' : '47.6,-122.3', 'keyword' : 'coffee'}),
+        ('8 args', {'key' : 'k', 'location' : '47.6,-122.3', 'keyword' : 'coffee',
+                    'language' : 'en', 'minprice' : 1, 'maxprice' : 3, 'opennow' : True,
+                    'types' : 'cafe'}),
+    ]
+
+    print('{:<8} {:<20} {:>12}'.format('call', 'path', 'usec/call'))
+    for label, kwargs in calls:
+        for name, func in (('request class', request_class_params),
+                           ('builder', builder_params),
+                           ('builder + split', builder_arguments)):
+            elapsed = measure(func, api, kwargs, args.repeat)
+            print('{:<8} {:<20} {:>12.3f}'.format(label, name, elapsed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
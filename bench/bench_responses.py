@@ -0,0 +1,95 @@
+"""
+Compare parse time and allocations of the response modes and json
+decoders on a synthetic Places search result page.
+
+    python bench/bench_responses.py --results 60 --repeat 200
+"""
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+
+from rekt.httputils import HTTPVerb
+from rekt.response import ResponseMode
+from rekt.service import create_api_definition, decode_content
+from rekt.decoders import StdlibDecoder, OrjsonDecoder, orjson
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('bench-responses')
+    parser.add_argument('--results', type=int, default=60,
+                        help='number of places in the synthetic response')
+    parser.add_argument('--repeat', type=int, default=200)
+    return parser.parse_args()
+
+
+def places_page(count):
+    place = lambda i: {
+        'place_id' : 'ChIJ{:020d}'.format(i),
+        'name' : 'Place {}'.format(i),
+        'vicinity' : '{} Pike St, Seattle'.format(i),
+        'rating' : 4.2,
+        'types' : ['bar', 'restaurant', 'food', 'point_of_interest', 'establishment'],
+        'geometry' : {
+            'location' : {'lat' : 47.6097 + i * 1e-4, 'lng' : -122.3331},
+            'viewport' : {
+                'northeast' : {'lat' : 47.61, 'lng' : -122.33},
+                'southwest' : {'lat' : 47.60, 'lng' : -122.34},
+            },
+        },
+        'opening_hours' : {'open_now' : True, 'weekday_text' : []},
+        'photos' : [{'height' : 1080, 'width' : 1920, 'photo_reference' : 'x' * 160,
+                     'html_attributions' : ['<a href="https://maps.google.com">A</a>']}],
+        'plus_code' : {'compound_code' : 'JJ5M+V9 Seattle', 'global_code' : '84VVJJ5M+V9'},
+    }
+    return json.dumps({'html_attributions' : [], 'next_page_token' : 'token',
+                       'status' : 'OK', 'results' : [place(i) for i in range(count)]}).encode('utf-8')
+
+
+def measure(api, content, mode, decoder, repeat, touch):
+    gc.collect()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        response = decode_content(api, HTTPVerb.GET, content, mode, decoder)
+        if touch:
+            for place in response.results:
+                place.geometry.location.lat
+    elapsed = (time.perf_counter() - started) / repeat
+
+    tracemalloc.start()
+    response = decode_content(api, HTTPVerb.GET, content, mode, decoder)
+    if touch:
+        for place in response.results:
+            place.geometry.location.lat
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    blocks = sum(stat.count for stat in snapshot.statistics('filename'))
+    return elapsed, blocks, peak
+
+
+def main():
+    args = parse_args()
+    api = create_api_definition('Places', {'url' : '/nearbysearch/json', 'GET' : {'key' : None}},
+                                'http://localhost')
+    content = places_page(args.results)
+    print('{} byte body with {} results'.format(len(content), args.results))
+    print('{:<8} {:<28} {:>12} {:>14} {:>12}'.format(
+        'decoder', 'mode', 'usec/call', 'live blocks', 'peak KiB'))
+
+    decoders = [StdlibDecoder()] + ([OrjsonDecoder()] if orjson is not None else [])
+    for decoder in decoders:
+        for touch in (False, True):
+            for mode in ResponseMode:
+                if touch and mode in (ResponseMode.raw, ResponseMode.dict):
+                    continue
+                elapsed, blocks, peak = measure(api, content, mode, decoder, args.repeat, touch)
+                label = '{}{}'.format(mode.name, ' + read every lat' if touch else '')
+                print('{:<8} {:<28} {:>12.1f} {:>14} {:>12.1f}'.format(
+                    decoder.name, label, elapsed * 1e6, blocks, peak / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
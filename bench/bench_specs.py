@@ -0,0 +1,102 @@
+"""
+Time loading a large synthetic Swagger document: parsing it as yaml with
+the pure python and the libyaml loaders and as json, converting it with
+load_swagger_config, and generating the service for every resource
+against only a few of them.
+
+    python bench/bench_specs.py --resources 2000 --operations 2 --params 8
+"""
+import json
+import time
+import pathlib
+import argparse
+import tempfile
+
+import yaml
+
+from rekt.service import load_service
+from rekt.utils import load_config, load_swagger_config, snake_case_to_camel_case
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('bench-specs')
+    parser.add_argument('--resources', type=int, default=2000)
+    parser.add_argument('--operations', type=int, default=2,
+                        help='operations per resource, GET then POST, PUT and DELETE')
+    parser.add_argument('--params', type=int, default=8)
+    parser.add_argument('--subset', type=int, default=5,
+                        help='resources used by the subset load')
+    parser.add_argument('--repeat', type=int, default=3)
+    return parser.parse_args()
+
+
+def swagger_document(resources, operations, params):
+    methods = ('GET', 'POST', 'PUT', 'DELETE')[:operations]
+    apis = []
+    for index in range(resources):
+        parameters = [{'name' : 'param_{}'.format(n), 'paramType' : 'query', 'type' : 'string',
+                       'required' : n == 0, 'description' : 'Parameter {} of the call'.format(n)}
+                      for n in range(params)]
+        parameters.append({'name' : 'Authorization', 'paramType' : 'header', 'type' : 'string'})
+        apis.append({
+            'path' : '/v1/group_{}/resource_{}'.format(index % 50, index),
+            'description' : 'Synthetic resource {}'.format(index),
+            'operations' : [{'method' : method, 'nickname' : '{}_{}'.format(method.lower(), index),
+                             'type' : 'Item', 'parameters' : parameters}
+                            for method in methods],
+        })
+    return {'swaggerVersion' : '1.2', 'basePath' : 'https://api.example.com', 'apis' : apis}
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    args = parse_args()
+    document = swagger_document(args.resources, args.operations, args.params)
+
+    tmp = pathlib.Path(tempfile.mkdtemp())
+    yaml_path, json_path = tmp / 'swagger.yaml', tmp / 'swagger.json'
+    yaml_path.write_text(yaml.dump(document, default_flow_style=False))
+    json_path.write_text(json.dumps(document, indent=2))
+
+    print('{} resources x {} operations x {} params: {:.1f} MiB yaml, {:.1f} MiB json'.format(
+        args.resources, args.operations, args.params, yaml_path.stat().st_size / 2. ** 20,
+        json_path.stat().st_size / 2. ** 20))
+
+    rows = []
+    if getattr(yaml, 'CSafeLoader', None) is not None:
+        rows.append(('yaml, libyaml loader', lambda: load_config(yaml_path)))
+    else:
+        print('pyyaml was built without libyaml, load_config uses the pure python loader')
+    rows.append(('json', lambda: load_config(json_path)))
+    rows.insert(0, ('yaml, pure python loader',
+                    lambda: yaml.load(yaml_path.read_text(), Loader=yaml.SafeLoader)))
+
+    for label, func in rows:
+        # The pure python loader is slow enough for a single run
+        repeat = 1 if label.endswith('pure python loader') else args.repeat
+        elapsed, _ = best_of(repeat, func)
+        print('parse {:<28} {:>9.1f} ms'.format(label, elapsed * 1e3))
+
+    subset = [snake_case_to_camel_case(api['path'].rsplit('/', 1)[-1])
+              for api in document['apis'][:args.subset]]
+    loads = [
+        ('all resources', None),
+        ('{} resources'.format(len(subset)), subset),
+    ]
+    for label, resources in loads:
+        elapsed, service = best_of(args.repeat, lambda: load_service(
+            load_swagger_config('Synthetic', document['basePath'], json_path, resources)))
+        print('json to service, {:<18} {:>9.1f} ms  ({} resources)'.format(
+            label, elapsed * 1e3, len(service.resources)))
+
+
+if __name__ == '__main__':
+    main()
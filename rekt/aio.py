@@ -0,0 +1,531 @@
+"""
+Native asyncio support for rekt.
+
+Services loaded with load_service also get an AsyncClient class whose
+generated api methods are coroutines. Requests are prepared with the
+requests library, so params, headers and auth behave exactly like the
+synchronous Client, and then sent over a small non-blocking HTTP/1.1
+transport with its own keep-alive connection pool. The responses are
+plain requests Response objects and the errors raised are the same
+requests exceptions the synchronous Client raises.
+"""
+import ssl
+import zlib
+import time
+import asyncio
+import datetime
+import itertools
+
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+
+import requests
+import requests.certs
+import requests.utils
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from rekt.httputils import HTTPStatus
+from rekt.response import ResponseMode
+from rekt.session import PoolConfig
+from rekt.batch import BatchResult
+from rekt.exceptions import DeadlineExceededError
+from rekt.decoders import get_decoder
+from rekt.service import request_arguments, parse_response, response_mode, record_response
+from rekt.utils import read_only_dict, api_method_name, batch_api_method_name
+
+__all__ = ['AsyncRestClient', 'AsyncTransport', 'aiter_batch', 'create_async_rest_client_class']
+
+_ASYNC_CLIENT_NAME_FMT = '{}AsyncClient'
+_DEFAULT_MAX_CONCURRENCY = 100
+_DEFAULT_PORTS = {'http' : 80, 'https' : 443}
+_NO_BODY_STATUSES = frozenset((HTTPStatus.NO_CONTENT, HTTPStatus.NOT_MODIFIED))
+_SUPPORTED_REQARGS = frozenset(('headers', 'auth', 'timeout', 'verify', 'cert'))
+_CRLF = b'\r\n'
+# The methods a stale connection is retried for, the same as the sync Client
+_RETRY_METHODS = Retry.DEFAULT_ALLOWED_METHODS
+
+
+def create_ssl_context(verify=True, cert=None):
+    """
+    Build an ssl context from the requests style verify and cert
+    arguments.
+    """
+    if verify is False:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    else:
+        cafile = verify if isinstance(verify, str) else requests.certs.where()
+        context = ssl.create_default_context(cafile=cafile)
+
+    if isinstance(cert, str):
+        context.load_cert_chain(cert)
+    elif cert is not None:
+        context.load_cert_chain(*cert)
+
+    return context
+
+
+class _Connection(object):
+    __slots__ = ('reader', 'writer', 'last_used')
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = None
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionPool(object):
+    """
+    Keep-alive connections grouped by (scheme, host, port), following the
+    same PoolConfig semantics as the synchronous session: at most
+    connections host pools are cached, each keeping at most maxsize idle
+    connections, and with block set no more than maxsize connections
+    per host are ever open at once.
+    """
+    def __init__(self, config=PoolConfig(), ssl_context=None):
+        self.config = config
+        self._ssl_context = ssl_context
+        self._idle = OrderedDict()
+        self._limits = {}
+
+    def _slot(self, key):
+        if not self.config.block:
+            return None
+        if key not in self._limits:
+            self._limits[key] = asyncio.Semaphore(self.config.maxsize)
+        return self._limits[key]
+
+    async def acquire(self, key):
+        """
+        Returns a (connection, reused) pair for the host key, preferring
+        the most recently used idle connection.
+        """
+        slot = self._slot(key)
+        if slot is not None:
+            await slot.acquire()
+
+        try:
+            idle = self._idle.get(key, ())
+            now = asyncio.get_event_loop().time()
+            while idle:
+                conn = idle.pop()
+                expired = (self.config.keepalive_timeout is not None
+                           and now - conn.last_used > self.config.keepalive_timeout)
+                if expired or conn.reader.at_eof():
+                    conn.close()
+                    continue
+                return conn, True
+
+            scheme, host, port = key
+            sslctx = self._ssl_context if scheme == 'https' else None
+            reader, writer = await asyncio.open_connection(
+                host, port, ssl=sslctx, server_hostname=host if sslctx else None)
+            return _Connection(reader, writer), False
+
+        except BaseException:
+            if slot is not None:
+                slot.release()
+            raise
+
+    def release(self, key, conn, reusable):
+        slot = self._slot(key)
+        if slot is not None:
+            slot.release()
+
+        if not reusable:
+            conn.close()
+            return
+
+        idle = self._idle.pop(key, None)
+        if idle is None:
+            idle = deque()
+        self._idle[key] = idle
+
+        if len(idle) >= self.config.maxsize:
+            conn.close()
+        else:
+            conn.last_used = asyncio.get_event_loop().time()
+            idle.append(conn)
+
+        while len(self._idle) > self.config.connections:
+            _, stale = self._idle.popitem(last=False)
+            for c in stale:
+                c.close()
+
+    def close(self):
+        for conn in itertools.chain.from_iterable(self._idle.values()):
+            conn.close()
+        self._idle.clear()
+
+
+async def _read_head(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError('Connection closed before the response')
+
+    version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+
+    headers = CaseInsensitiveDict()
+    while True:
+        line = await reader.readline()
+        if line in (_CRLF, b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip(), value.strip()
+        headers[name] = '{}, {}'.format(headers[name], value) if name in headers else value
+
+    return version, int(status), reason, headers
+
+
+async def _iter_body(reader, method, status, headers):
+    """
+    Yields the raw (still content encoded) body of a response as it is
+    read off the connection.
+    """
+    if method == 'HEAD' or status in _NO_BODY_STATUSES or status < HTTPStatus.OK:
+        return
+
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        while True:
+            size = int((await reader.readline()).split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                while (await reader.readline()) not in (_CRLF, b'\n', b''):
+                    pass
+                return
+            yield await reader.readexactly(size)
+            await reader.readexactly(len(_CRLF))
+
+    elif 'content-length' in headers:
+        remaining = int(headers['content-length'])
+        while remaining > 0:
+            chunk = await reader.read(min(remaining, 2 ** 16))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(chunk)
+            yield chunk
+
+    else:
+        while True:
+            chunk = await reader.read(2 ** 16)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _decompressor(headers):
+    encoding = headers.get('content-encoding', '').lower()
+    if encoding == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        return zlib.decompressobj()
+    return None
+
+
+def _keep_alive(version, headers):
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    # Without a length or chunking the body ends when the server closes
+    framed = 'content-length' in headers or 'chunked' in headers.get('transfer-encoding', '').lower()
+    return connection != 'close' and framed
+
+
+class AsyncTransport(object):
+    """
+    Sends requests PreparedRequest objects over pooled asyncio
+    connections and returns requests Response objects.
+    """
+    def __init__(self, pool=PoolConfig(), verify=True, cert=None):
+        self.pool = AsyncConnectionPool(pool, create_ssl_context(verify, cert))
+
+    async def send(self, prepared, timeout=None):
+        if isinstance(timeout, tuple):
+            timeout = None if None in timeout else sum(timeout)
+
+        try:
+            return await asyncio.wait_for(self._send(prepared), timeout)
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.Timeout(e, request=prepared)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            raise requests.exceptions.ConnectionError(e, request=prepared)
+
+    async def _send(self, prepared):
+        url = urlsplit(prepared.url)
+        key = (url.scheme, url.hostname, url.port or _DEFAULT_PORTS[url.scheme])
+        target = '{}?{}'.format(url.path or '/', url.query) if url.query else (url.path or '/')
+
+        body = prepared.body or b''
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        headers = CaseInsensitiveDict(prepared.headers)
+        headers['Host'] = url.netloc
+        headers.setdefault('Connection', 'keep-alive')
+        if body or prepared.method in ('POST', 'PUT', 'PATCH'):
+            headers['Content-Length'] = str(len(body))
+
+        head = ''.join(['{} {} HTTP/1.1\r\n'.format(prepared.method, target)]
+                       + ['{}: {}\r\n'.format(k, v) for k, v in headers.items()]
+                       + ['\r\n'])
+        payload = head.encode('latin-1') + body
+
+        # A reused connection may have been closed by the server while it
+        # sat idle, which is only noticed once we try to use it. The server
+        # may also have acted on the request before closing, so only the
+        # idempotent methods are sent again.
+        for attempt in itertools.count():
+            conn, reused = await self.pool.acquire(key)
+            started = datetime.datetime.now()
+            try:
+                conn.writer.write(payload)
+                await conn.writer.drain()
+                version, status, reason, resp_headers = await _read_head(conn.reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.pool.release(key, conn, reusable=False)
+                if (reused and prepared.method in _RETRY_METHODS
+                        and attempt < self.pool.config.max_retries):
+                    continue
+                raise
+            except BaseException:
+                self.pool.release(key, conn, reusable=False)
+                raise
+            break
+        # Like requests, elapsed is the time until the response headers
+        elapsed = datetime.datetime.now() - started
+
+        reusable = False
+        try:
+            chunks = []
+            decompressor = _decompressor(resp_headers)
+            async for chunk in _iter_body(conn.reader, prepared.method, status, resp_headers):
+                chunks.append(decompressor.decompress(chunk) if decompressor else chunk)
+            if decompressor:
+                chunks.append(decompressor.flush())
+            reusable = _keep_alive(version, resp_headers)
+        finally:
+            self.pool.release(key, conn, reusable)
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = resp_headers
+        response.url = prepared.url
+        response.request = prepared
+        response.encoding = requests.utils.get_encoding_from_headers(resp_headers)
+        response.elapsed = elapsed
+        response._content = b''.join(chunks)
+        return response
+
+    def close(self):
+        self.pool.close()
+
+
+class AsyncRestClient(object):
+    """
+    Class for convenience off of which we will dynamically create
+    the asyncio rest client
+    """
+    def __str__(self):
+        return '{}'.format(self.__class__.__name__)
+
+    def __repr__(self):
+        return '<{}>'.format(self.__class__.__name__)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """
+        Close every pooled connection held by the client's transport.
+        """
+        self._transport.close()
+
+
+async def _measured_send(client, api, verb, prepared):
+    started = time.monotonic()
+    try:
+        raw_response = await client._transport.send(prepared, timeout=client.reqargs.get('timeout'))
+    except BaseException as e:
+        client.metrics.on_request(api.name, verb.name, e.__class__.__name__,
+                                  time.monotonic() - started, None, 0, 0)
+        raise
+
+    record_response(client.metrics, api, verb, raw_response, time.monotonic() - started)
+    return raw_response
+
+
+async def _authorized_send(client, api, verb, request):
+    # Preparing the request runs the auth, so an auth that would block
+    # on a token refresh is waited for off the event loop first
+    pending_refresh = getattr(request.auth, 'pending_refresh', None)
+    if pending_refresh is not None:
+        refresh = pending_refresh()
+        if refresh is not None:
+            await asyncio.wrap_future(refresh)
+    return await _limited_send(client, api, verb, request.prepare())
+
+
+async def _limited_send(client, api, verb, prepared):
+    async with client._semaphore:
+        if client.metrics is None:
+            return await client._transport.send(prepared, timeout=client.reqargs.get('timeout'))
+        return await _measured_send(client, api, verb, prepared)
+
+
+def create_coroutine_api_call_func(api, verb):
+    """
+    From an api definition object create the related coroutine api call
+    method, the asyncio counterpart of service.create_api_call_func.
+    """
+    builder = api.request_builders[verb]
+
+    async def api_call_func(self, **kwargs):
+
+        mode = response_mode(self, kwargs.pop('_response_mode', None))
+        timeout = kwargs.pop('_timeout', None)
+        params = builder.build(kwargs)
+        query, data = request_arguments(builder, params)
+
+        request = requests.Request(verb.name, api.url, headers=self._headers,
+                                   auth=self.reqargs.get('auth'), params=query, data=data)
+
+        if timeout is None:
+            raw_response = await _authorized_send(self, api, verb, request)
+        else:
+            # The timeout of the whole call, waiting for a token and a
+            # slot included
+            try:
+                raw_response = await asyncio.wait_for(
+                    _authorized_send(self, api, verb, request), timeout)
+            except asyncio.TimeoutError:
+                raise DeadlineExceededError('Deadline exceeded calling {}'.format(api.name))
+
+        return parse_response(api, verb, raw_response, mode, self.decoder)
+
+    method_name = api_method_name(verb, api)
+
+    api_call_func.__name__ = method_name
+    api_call_func.__doc__ = '{}\n{}'.format(
+        method_name, ''.join(api.request_classes[verb].__doc__.splitlines(True)[1:]))
+
+    return api_call_func
+
+
+async def aiter_batch(call, calls, max_in_flight, ordered=False):
+    """
+    The asyncio counterpart of batch.iter_batch. Awaits call(**kwargs)
+    for each dict pulled lazily from calls with at most max_in_flight
+    outstanding, and yields a BatchResult for each of them.
+    """
+    if max_in_flight < 1:
+        raise ValueError('max_in_flight must be at least 1')
+
+    inputs = enumerate(calls)
+    in_flight = deque() if ordered else {}
+
+    def fill():
+        for index, kwargs in itertools.islice(inputs, max_in_flight - len(in_flight)):
+            task = asyncio.ensure_future(call(**kwargs))
+            if ordered:
+                in_flight.append((index, kwargs, task))
+            else:
+                in_flight[task] = (index, kwargs)
+
+    def result(index, kwargs, task):
+        if task.exception() is not None:
+            return BatchResult(index, kwargs, None, task.exception())
+        return BatchResult(index, kwargs, task.result(), None)
+
+    try:
+        fill()
+        while in_flight:
+            if ordered:
+                index, kwargs, task = in_flight.popleft()
+                await asyncio.wait([task])
+                done = [result(index, kwargs, task)]
+            else:
+                finished, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                done = [result(*(in_flight.pop(t) + (t,))) for t in finished]
+
+            fill()
+            for item in done:
+                yield item
+
+    finally:
+        tasks = (item[2] for item in in_flight) if ordered else in_flight
+        for task in tasks:
+            task.cancel()
+
+
+def create_coroutine_batch_api_call_func(api, verb):
+    """
+    From an api definition object create the related batch api call
+    method, an async generator over aiter_batch.
+    """
+    def api_call_func(self, calls, max_in_flight=None, ordered=False):
+        api_method = getattr(self, api_method_name(verb, api))
+        return aiter_batch(api_method, calls, max_in_flight or self._max_concurrency, ordered)
+
+    method_name = batch_api_method_name(verb, api)
+
+    api_call_func.__name__ = method_name
+    api_call_func.__doc__ = """{}
+Await {} with each dict of keyword arguments from calls, keeping at most
+max_in_flight calls outstanding (defaults to the client max_concurrency).
+
+Returns an async generator of rekt.batch.BatchResult in completion
+order, or in the order of calls when ordered is set. Failed calls are
+yielded with the exception set rather than raised.
+""".format(method_name, api_method_name(verb, api))
+
+    return api_call_func
+
+
+def create_async_rest_client_class(name, apis, BaseClass=AsyncRestClient):
+    """
+    Generate the coroutine api call functions and attach them to the
+    generated AsyncRestClient subclass with the name <Service>AsyncClient.
+    """
+    api_funcs = [create_coroutine_api_call_func(api, verb) for api in apis for verb in api.actions]
+    api_funcs.extend([create_coroutine_batch_api_call_func(api, verb) for api in apis for verb in api.actions])
+    api_mapper = dict([ (f.__name__, f) for f in api_funcs ])
+
+    def __init__(self, max_concurrency=_DEFAULT_MAX_CONCURRENCY, pool=None,
+                 response_mode=ResponseMode.object, decoder=None, metrics=None, **reqargs):
+        BaseClass.__init__(self)
+        unsupported = set(reqargs) - _SUPPORTED_REQARGS
+        if unsupported:
+            raise TypeError('Arguments {} not supported by {}'.format(
+                    ', '.join(sorted(unsupported)), self.__class__.__name__))
+
+        setattr(self, 'reqargs', read_only_dict(reqargs))
+        setattr(self, 'response_mode', ResponseMode(response_mode))
+        setattr(self, 'decoder', get_decoder(decoder))
+        setattr(self, 'metrics', metrics)
+
+        # Only the content encodings the transport can decode are offered
+        headers = requests.utils.default_headers()
+        headers['Accept-Encoding'] = 'gzip, deflate'
+        headers.update(reqargs.get('headers') or {})
+        self._headers = headers
+
+        # Every in-flight call holds a connection so the pool is sized to
+        # the concurrency limit unless told otherwise.
+        if pool is None:
+            pool = PoolConfig(maxsize=max_concurrency)
+        self._transport = AsyncTransport(pool, reqargs.get('verify', True), reqargs.get('cert'))
+        self._max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    api_mapper['__init__'] = __init__
+
+    ClientClass = type(_ASYNC_CLIENT_NAME_FMT.format(name), (BaseClass,), api_mapper)
+    return ClientClass
@@ -0,0 +1,184 @@
+"""
+Authentication plugins for generated clients.
+
+The plugins are requests auth objects, so they are given once to the
+client and apply to every request it sends, from the sync, async_* and
+AsyncClient methods alike:
+
+    client = service.Client(auth=ApiKeyAuth('my-key'))
+    client.get_places(location='47.6,-122.3', radius=500)
+
+* ApiKeyAuth adds an api key to the query string.
+* TokenAuth sends a bearer token from a fetch function. The token is
+  cached and refreshed in the background shortly before it expires, so
+  calls never wait on a refresh while the current token is valid, and
+  concurrent calls share a single refresh when they have to wait. The
+  AsyncClient waits for it without blocking its event loop.
+* UrlSigningAuth signs urls with a HMAC-SHA1 of their path and query,
+  e.g. for the google maps premium plan, caching the signatures.
+"""
+import hmac
+import time
+import base64
+import hashlib
+import threading
+
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from requests.auth import AuthBase
+
+from rekt.coalesce import SingleFlight
+from rekt.executor import WorkerPool
+
+__all__ = ['ApiKeyAuth', 'TokenAuth', 'UrlSigningAuth']
+
+_REFRESH = 'refresh'
+
+
+class ApiKeyAuth(AuthBase):
+    """
+    Sends key as the param query string argument of every request.
+    """
+    def __init__(self, key, param='key'):
+        self.key = key
+        self.param = param
+
+    def __call__(self, request):
+        request.prepare_url(request.url, {self.param : self.key})
+        return request
+
+
+class TokenAuth(AuthBase):
+    """
+    Sends the token returned by fetch() in the Authorization header.
+
+    :param fetch: called with no arguments, returns a (token, expires_in)
+        pair where expires_in is the lifetime of the token in seconds,
+        None if it does not expire
+    :param refresh_before: seconds before the token expires from which a
+        refresh is started in the background, at most half the lifetime
+        of the token so that short lived tokens are not fetched again
+        right away
+    :param scheme: the authorization scheme in front of the token
+    :param executor: runs the background refreshes, a single thread pool
+        of its own by default
+
+    Clients do not close their auth, which may be shared between them.
+    Its owner closes it when done, which shuts down the thread pool it
+    made, while an executor passed in is left to its owner.
+    """
+    def __init__(self, fetch, refresh_before=60.0, scheme='Bearer', executor=None):
+        self.fetch = fetch
+        self.refresh_before = refresh_before
+        self.scheme = scheme
+        self.refreshes = 0
+        # (token, time.monotonic() at which it expires, seconds before
+        # that it is refreshed), swapped as a whole
+        self._state = (None, 0.0, 0.0)
+        self._flight = SingleFlight()
+        self._owns_executor = executor is None
+        self._executor = executor or WorkerPool(max_workers=1, idle_timeout=10.0,
+                                                thread_name_prefix='rekt-auth')
+
+    def __call__(self, request):
+        request.headers['Authorization'] = '{} {}'.format(self.scheme, self.token())
+        return request
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _fresh(self, state, early=False):
+        # Valid, or with early set not due for a refresh yet
+        token, expires, margin = state
+        return token is not None and time.monotonic() < expires - (margin if early else 0.0)
+
+    def token(self):
+        """
+        The current token, only waiting for a refresh when there is no
+        valid token at all.
+        """
+        state = self._state
+        if not self._fresh(state):
+            return self._flight.do(_REFRESH, self._refresh)
+        if not self._fresh(state, early=True):
+            # Joins the refresh already in flight if there is one
+            self._flight.submit(_REFRESH, self._executor, self._refresh)
+        return state[0]
+
+    def pending_refresh(self):
+        """
+        None when there is a valid token, otherwise the Future of the
+        refresh running on the executor, for callers such as the
+        AsyncClient that must not block waiting for it.
+        """
+        if self._fresh(self._state):
+            return None
+        return self._flight.submit(_REFRESH, self._executor, self._refresh)
+
+    def _refresh(self):
+        # A caller that read the state just before another refresh
+        # finished must not fetch again
+        state = self._state
+        if self._fresh(state, early=True):
+            return state[0]
+
+        token, expires_in = self.fetch()
+        if expires_in is None:
+            self._state = (token, float('inf'), 0.0)
+        else:
+            self._state = (token, time.monotonic() + expires_in,
+                           min(self.refresh_before, expires_in / 2.0))
+        self.refreshes += 1
+        return token
+
+    def close(self):
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+
+class UrlSigningAuth(AuthBase):
+    """
+    Appends a signature param to every url, the url safe base64 HMAC-SHA1
+    of its path and query under the url safe base64 encoded secret,
+    after adding the client id or key when given. Signatures of the
+    cache_size most recent urls are cached.
+    """
+    def __init__(self, secret, client_id=None, key=None, param='signature', cache_size=1024):
+        self._secret = base64.urlsafe_b64decode(secret)
+        self.client_id = client_id
+        self.key = key
+        self.param = param
+        self.cache_size = cache_size
+        self._signatures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        params = [(name, value) for name, value in (('client', self.client_id), ('key', self.key))
+                  if value is not None]
+        if params:
+            request.prepare_url(request.url, params)
+
+        url = urlsplit(request.url)
+        resource = '{}?{}'.format(url.path, url.query) if url.query else url.path
+        request.prepare_url(request.url, {self.param : self.signature(resource)})
+        return request
+
+    def signature(self, resource):
+        with self._lock:
+            signature = self._signatures.get(resource)
+            if signature is not None:
+                self._signatures.move_to_end(resource)
+                return signature
+
+        digest = hmac.new(self._secret, resource.encode('utf-8'), hashlib.sha1).digest()
+        signature = base64.urlsafe_b64encode(digest).decode('ascii')
+
+        with self._lock:
+            self._signatures[resource] = signature
+            while len(self._signatures) > self.cache_size:
+                self._signatures.popitem(last=False)
+        return signature
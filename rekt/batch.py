@@ -0,0 +1,74 @@
+import itertools
+import concurrent.futures
+
+from collections import namedtuple, deque
+
+__all__ = ['BatchResult', 'iter_batch']
+
+#: The outcome of a single call in a batch. index is the position of
+#: kwargs in the input, and exactly one of response or exception is set.
+BatchResult = namedtuple('BatchResult', ('index', 'kwargs', 'response', 'exception'))
+
+
+def _batch_result(index, kwargs, future):
+    exception = future.exception()
+    if exception is not None:
+        return BatchResult(index, kwargs, None, exception)
+    return BatchResult(index, kwargs, future.result(), None)
+
+
+def iter_batch(submit, calls, max_in_flight, ordered=False):
+    """
+    Lazily pull the keyword argument dicts from the calls iterable,
+    call submit(kwargs) for each one so that at most max_in_flight of
+    the returned futures are outstanding at a time, and yield a
+    BatchResult for each of them.
+
+    :param submit: callable taking a kwargs dict and returning a
+        concurrent.futures.Future
+    :param ordered: yield results in input order instead of completion
+        order. A slow call then holds back the results behind it, but
+        never more than max_in_flight of them.
+    """
+    if max_in_flight < 1:
+        raise ValueError('max_in_flight must be at least 1')
+
+    inputs = enumerate(calls)
+    in_flight = deque() if ordered else {}
+
+    def fill():
+        for index, kwargs in itertools.islice(inputs, max_in_flight - len(in_flight)):
+            try:
+                future = submit(kwargs)
+            except Exception as e:
+                future = concurrent.futures.Future()
+                future.set_exception(e)
+
+            if ordered:
+                in_flight.append((index, kwargs, future))
+            else:
+                in_flight[future] = (index, kwargs)
+
+    try:
+        fill()
+        while in_flight:
+            if ordered:
+                index, kwargs, future = in_flight.popleft()
+                concurrent.futures.wait([future])
+                done = [_batch_result(index, kwargs, future)]
+            else:
+                finished, _ = concurrent.futures.wait(
+                    in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                done = [_batch_result(*(in_flight.pop(f) + (f,))) for f in finished]
+
+            # Top the window back up before handing results to the caller
+            # so the calls keep running while the results are consumed.
+            fill()
+            for result in done:
+                yield result
+
+    finally:
+        # The generator was closed early, abandon whatever has not started
+        futures = (item[2] for item in in_flight) if ordered else in_flight
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,206 @@
+"""
+Per resource circuit breakers for generated clients.
+
+A breaker watches the outcome and latency of the calls to one resource.
+Once too many of the recent calls failed or were slow it opens and
+calls to the resource fail fast with CircuitOpenError, instead of tying
+up threads waiting on an upstream that is down. After a cool-down it
+lets a few trial calls through (half open) and closes again if they
+succeed.
+"""
+import time
+import threading
+
+from enum import Enum
+from collections import namedtuple, deque
+
+from rekt.httputils import HTTPStatus
+from rekt.exceptions import CircuitOpenError
+
+__all__ = ['BreakerState', 'BreakerStats', 'CircuitBreaker', 'create_circuit_breakers']
+
+_SPEC_FIELDS = ('failure_rate', 'slow_call_duration', 'slow_call_rate', 'window',
+                'min_calls', 'cooldown', 'half_open_calls')
+
+
+class BreakerState(Enum):
+    closed = 'closed'
+    open = 'open'
+    half_open = 'half_open'
+
+
+#: Snapshot of a breaker. calls, failures and slow_calls cover the
+#: current window, opened counts every time the breaker tripped.
+BreakerStats = namedtuple('BreakerStats',
+    ('state', 'calls', 'failures', 'slow_calls', 'opened', 'rejected'))
+
+
+def is_failure(status_code):
+    """
+    Whether a response status counts against the upstream, client
+    errors other than throttling are the caller's fault.
+    """
+    return (status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+            or status_code == HTTPStatus.TOO_MANY_REQUESTS)
+
+
+class CircuitBreaker(object):
+    """
+    :param failure_rate: fraction of failed calls in the window that
+        opens the breaker
+    :param slow_call_duration: seconds after which a call counts as
+        slow, None to ignore latency
+    :param slow_call_rate: fraction of slow calls in the window that
+        opens the breaker
+    :param window: number of most recent calls considered
+    :param min_calls: calls needed in the window before it can trip
+    :param cooldown: seconds the breaker stays open before trial calls
+    :param half_open_calls: trial calls allowed through while half open,
+        all of which must succeed to close the breaker
+    """
+    def __init__(self, failure_rate=0.5, slow_call_duration=None, slow_call_rate=0.5,
+                 window=20, min_calls=10, cooldown=30.0, half_open_calls=1):
+        self.failure_rate = failure_rate
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate = slow_call_rate
+        self.window = window
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.half_open_calls = half_open_calls
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)
+        self._state = BreakerState.closed
+        self._opened_at = None
+        self._trials = 0
+        self._successes = 0
+        self._opened = 0
+        self._rejected = 0
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__, self.state.name)
+
+    def replace(self, **overrides):
+        """
+        A new breaker, in the closed state, with the settings of this one
+        and some of them replaced.
+        """
+        settings = dict([(k, getattr(self, k)) for k in _SPEC_FIELDS])
+        settings.update(overrides)
+        return self.__class__(**settings)
+
+    def _update(self):
+        if (self._state is BreakerState.open
+            and time.monotonic() - self._opened_at >= self.cooldown):
+            self._state = BreakerState.half_open
+            self._trials = self._successes = 0
+
+    def _trip(self):
+        self._state = BreakerState.open
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._opened += 1
+
+    @property
+    def state(self):
+        with self._lock:
+            self._update()
+            return self._state
+
+    @property
+    def stats(self):
+        with self._lock:
+            self._update()
+            return BreakerStats(self._state, len(self._outcomes),
+                                sum(1 for failed, _ in self._outcomes if failed),
+                                sum(1 for _, slow in self._outcomes if slow),
+                                self._opened, self._rejected)
+
+    def check(self):
+        """
+        Raise CircuitOpenError while the breaker is open. Unlike allow
+        this does not take a trial call when half open.
+        """
+        with self._lock:
+            self._update()
+            if self._state is not BreakerState.open:
+                return
+            self._rejected += 1
+
+        raise CircuitOpenError('Circuit breaker is open')
+
+    def allow(self):
+        """
+        Raise CircuitOpenError unless a call may go through right now.
+        Every allowed call must be followed by a call to record or
+        release.
+        """
+        with self._lock:
+            self._update()
+            if self._state is BreakerState.closed:
+                return
+            if self._state is BreakerState.half_open and self._trials < self.half_open_calls:
+                self._trials += 1
+                return
+            self._rejected += 1
+
+        raise CircuitOpenError('Circuit breaker is {}'.format(self._state.name))
+
+    def release(self):
+        """
+        Give back an allowed call that ends without an outcome to record,
+        e.g. one that failed before it was sent, so that a half open
+        breaker does not wait on it forever.
+        """
+        with self._lock:
+            if self._state is BreakerState.half_open and self._trials > 0:
+                self._trials -= 1
+
+    def record(self, failed, duration):
+        """
+        Record the outcome of an allowed call.
+        """
+        slow = self.slow_call_duration is not None and duration >= self.slow_call_duration
+
+        with self._lock:
+            if self._state is BreakerState.half_open:
+                if failed or slow:
+                    self._trip()
+                else:
+                    self._successes += 1
+                    if self._successes >= self.half_open_calls:
+                        self._state = BreakerState.closed
+                return
+
+            if self._state is not BreakerState.closed:
+                return
+
+            self._outcomes.append((failed, slow))
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+
+            failures = sum(1 for f, _ in self._outcomes if f)
+            slow_calls = sum(1 for _, s in self._outcomes if s)
+            if (failures >= calls * self.failure_rate
+                or (self.slow_call_duration is not None
+                    and slow_calls >= calls * self.slow_call_rate)):
+                self._trip()
+
+
+def create_circuit_breakers(breaker, apis):
+    """
+    A CircuitBreaker for each resource name, copied from the client
+    breaker with the circuit_breaker settings of the resource spec
+    applied on top. A resource gets no breaker when neither sets one.
+    """
+    breakers = {}
+    for api in apis:
+        spec = api.options.get('circuit_breaker')
+        if spec is False or (spec is None and breaker is None):
+            continue
+
+        overrides = dict([(k, v) for k, v in (spec or {}).items() if k in _SPEC_FIELDS])
+        breakers[api.name] = (breaker or CircuitBreaker()).replace(**overrides)
+
+    return breakers
@@ -0,0 +1,399 @@
+"""
+Response caches for generated clients.
+
+A cache stores the raw body of successful GET responses keyed on the
+normalized request, so a hit skips the network and only pays for
+decoding the body again. Keys leave out credentials such as the api key
+so callers with different keys share entries. Google apis answer quota
+errors and denials with a 200 and a json status such as
+OVER_QUERY_LIMIT, so only bodies whose status is cacheable, OK and
+ZERO_RESULTS unless the spec says otherwise, are stored:
+
+    cache : { ttl : 3600, statuses : [OK, ZERO_RESULTS, NOT_FOUND] }
+
+With Client(cache=..., http_cache=True) the caching headers of the
+responses are honored as well. Cache-Control max-age, no-cache and
+no-store, or else Expires, decide how long a response stays fresh, the
+ttl of the resource applying when they say nothing. The ETag and
+Last-Modified validators are kept with the body, and once the entry is
+stale the call is sent with If-None-Match and If-Modified-Since. A 304
+Not Modified answer counts as a hit: the cached body is used and is
+fresh again for as long as the 304 allows, without transferring it.
+"""
+import time
+import sqlite3
+import hashlib
+import threading
+import email.utils
+
+from collections import namedtuple, OrderedDict
+from collections.abc import Mapping
+from urllib.parse import urlencode
+
+__all__ = ['Cache', 'CacheStats', 'CacheEntry', 'MemoryCache', 'SqliteCache', 'cache_key',
+           'resource_ttl', 'resource_statuses', 'cacheable', 'http_ttl', 'conditional_headers']
+
+#: Params that never take part in a cache key
+SECRET_PARAMS = frozenset(('key', 'signature'))
+
+#: Json status of the bodies cached when the spec does not list them
+CACHEABLE_STATUSES = frozenset(('OK', 'ZERO_RESULTS'))
+
+#: Snapshot of the counters and size of a cache
+CacheStats = namedtuple('CacheStats', ('hits', 'misses', 'evictions', 'entries', 'bytes'))
+
+
+class CacheEntry(namedtuple('CacheEntry', ('content', 'expires', 'etag', 'last_modified'))):
+    """
+    A cached body with the time.time() at which it goes stale and the
+    validators of the response it came from.
+    """
+    __slots__ = ()
+
+    @property
+    def fresh(self):
+        return self.expires > time.time()
+
+    @property
+    def validated(self):
+        """
+        Whether the entry can be revalidated once stale.
+        """
+        return self.etag is not None or self.last_modified is not None
+
+
+def cache_key(url, verb, params, exclude=SECRET_PARAMS):
+    """
+    Normalize a request into a cache key: the verb and url followed by
+    the non-None params, minus the excluded ones, in sorted order.
+    """
+    items = sorted((k, str(v)) for k, v in params.items()
+                   if v is not None and k not in exclude)
+    return '{} {}?{}'.format(verb.name, url, urlencode(items))
+
+
+def resource_ttl(options, cache):
+    """
+    The ttl for a resource given its spec options, falling back to the
+    cache default. `cache : { ttl : 300 }` sets it, `cache : false`
+    disables caching for the resource. None means do not cache.
+    """
+    spec = options.get('cache', {})
+    if spec is False:
+        return None
+    ttl = spec.get('ttl') if isinstance(spec, dict) else None
+    return cache.ttl if ttl is None else ttl
+
+
+def resource_statuses(options):
+    """
+    The json status values of the bodies of a resource that may be
+    cached, `cache : { statuses : [OK] }` in its spec or else
+    CACHEABLE_STATUSES.
+    """
+    spec = options.get('cache')
+    statuses = spec.get('statuses') if isinstance(spec, dict) else None
+    return CACHEABLE_STATUSES if statuses is None else frozenset(statuses)
+
+
+def cacheable(response, statuses):
+    """
+    Whether a decoded response body may be cached: json objects with a
+    status only when it is one of statuses, any other body always.
+    """
+    status = response.get('status') if isinstance(response, Mapping) else None
+    return status is None or status in statuses
+
+
+def _parse_date(value):
+    try:
+        return email.utils.mktime_tz(email.utils.parsedate_tz(value))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def http_ttl(headers, default=None):
+    """
+    Seconds a response stays fresh according to its Cache-Control or
+    Expires headers, default when they do not say, and None when it
+    must not be stored at all.
+    """
+    directives = {}
+    for directive in (headers.get('Cache-Control') or '').split(','):
+        name, _, value = directive.strip().partition('=')
+        directives[name.lower()] = value.strip('"')
+
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0
+    if 'max-age' in directives:
+        try:
+            age = float(headers.get('Age') or 0)
+            return max(float(directives['max-age']) - age, 0)
+        except ValueError:
+            return 0
+
+    expires = headers.get('Expires')
+    if expires is not None:
+        # An invalid date, e.g. 0, means already expired
+        expires = _parse_date(expires)
+        if expires is None:
+            return 0
+        now = _parse_date(headers.get('Date')) or time.time()
+        return max(expires - now, 0)
+
+    return default
+
+
+def conditional_headers(entry):
+    """
+    The headers revalidating a stale cache entry.
+    """
+    headers = {}
+    if entry.etag is not None:
+        headers['If-None-Match'] = entry.etag
+    if entry.last_modified is not None:
+        headers['If-Modified-Since'] = entry.last_modified
+    return headers
+
+
+class Cache(object):
+    """
+    Base class for cache backends. ttl is the default time to live in
+    seconds for resources whose spec does not set one, None means only
+    resources with a ttl in the spec are cached. Entries beyond
+    max_entries or max_bytes are evicted least recently used first.
+    """
+    def __init__(self, ttl=None, max_entries=None, max_bytes=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _over_limit(self, entries, size):
+        return ((self.max_entries is not None and entries > self.max_entries)
+                or (self.max_bytes is not None and size > self.max_bytes))
+
+    @property
+    def stats(self):
+        with self._lock:
+            entries, size = self._size()
+            return CacheStats(self._hits, self._misses, self._evictions, entries, size)
+
+    def count(self, hit):
+        """
+        Count a hit or a miss decided by the caller, e.g. a lookup
+        revalidated with a 304.
+        """
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def get(self, key):
+        """
+        Returns the cached content for key or None when it is missing or
+        has expired.
+        """
+        raise NotImplementedError
+
+    def lookup(self, key):
+        """
+        Returns the CacheEntry for key, stale ones included as long as
+        they can be revalidated, or None. Lookups are not counted.
+        """
+        raise NotImplementedError
+
+    def set(self, key, content, ttl, etag=None, last_modified=None):
+        raise NotImplementedError
+
+    def refresh(self, key, ttl, etag=None, last_modified=None):
+        """
+        Make the entry for key fresh for another ttl seconds, replacing
+        the validators that are given.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def _size(self):
+        raise NotImplementedError
+
+
+class MemoryCache(Cache):
+    """
+    In process LRU cache.
+    """
+    def __init__(self, ttl=None, max_entries=1024, max_bytes=None):
+        super(MemoryCache, self).__init__(ttl, max_entries, max_bytes)
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not entry.fresh:
+                self._discard(key)
+                entry = None
+
+            if entry is None:
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.content
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not entry.fresh and not entry.validated:
+                self._discard(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, content, ttl, etag=None, last_modified=None):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = CacheEntry(content, time.time() + ttl, etag, last_modified)
+            self._bytes += len(content)
+
+            while self._entries and self._over_limit(len(self._entries), self._bytes):
+                self._discard(next(iter(self._entries)))
+                self._evictions += 1
+
+    def refresh(self, key, ttl, etag=None, last_modified=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = entry._replace(
+                    expires=time.time() + ttl,
+                    etag=entry.etag if etag is None else etag,
+                    last_modified=entry.last_modified if last_modified is None else last_modified)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.content)
+
+    def _size(self):
+        return len(self._entries), self._bytes
+
+
+class SqliteCache(Cache):
+    """
+    On disk LRU cache in a sqlite database at path, which can be shared
+    between processes and survives restarts. The hit, miss and eviction
+    counters are for this process only.
+    """
+    _SCHEMA = ('CREATE TABLE IF NOT EXISTS entries ('
+               ' key TEXT PRIMARY KEY, content BLOB, size INTEGER,'
+               ' expires REAL, accessed REAL, etag TEXT, last_modified TEXT)',
+               'CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+    # Columns added since the first schema, for databases created by
+    # older versions
+    _MIGRATIONS = ('ALTER TABLE entries ADD COLUMN etag TEXT',
+                   'ALTER TABLE entries ADD COLUMN last_modified TEXT')
+
+    def __init__(self, path, ttl=None, max_entries=None, max_bytes=None):
+        super(SqliteCache, self).__init__(ttl, max_entries, max_bytes)
+        self.path = str(path)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        for statement in self._SCHEMA:
+            self._db.execute(statement)
+        for statement in self._MIGRATIONS:
+            try:
+                self._db.execute(statement)
+            except sqlite3.OperationalError:
+                # The column exists already
+                pass
+
+    @staticmethod
+    def _hash(key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        key = self._hash(key)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT content, expires FROM entries WHERE key = ?',
+                                   (key,)).fetchone()
+            if row is not None and row[1] <= now:
+                self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                row = None
+
+            if row is None:
+                self._misses += 1
+                return None
+
+            self._db.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            self._hits += 1
+            return bytes(row[0])
+
+    def lookup(self, key):
+        key = self._hash(key)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT content, expires, etag, last_modified FROM entries'
+                                   ' WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            entry = CacheEntry(bytes(row[0]), *row[1:])
+            if not entry.fresh and not entry.validated:
+                self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                return None
+
+            self._db.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            return entry
+
+    def set(self, key, content, ttl, etag=None, last_modified=None):
+        now = time.time()
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO entries (key, content, size, expires,'
+                             ' accessed, etag, last_modified) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (self._hash(key), content, len(content), now + ttl, now, etag,
+                              last_modified))
+
+            entries, size = self._size()
+            while entries and self._over_limit(entries, size):
+                key, evicted = self._db.execute(
+                    'SELECT key, size FROM entries ORDER BY accessed LIMIT 1').fetchone()
+                self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                entries, size = entries - 1, size - evicted
+                self._evictions += 1
+
+    def refresh(self, key, ttl, etag=None, last_modified=None):
+        with self._lock:
+            self._db.execute('UPDATE entries SET expires = ?, etag = COALESCE(?, etag),'
+                             ' last_modified = COALESCE(?, last_modified) WHERE key = ?',
+                             (time.time() + ttl, etag, last_modified, self._hash(key)))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM entries')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _size(self):
+        entries, size = self._db.execute('SELECT COUNT(*), SUM(size) FROM entries').fetchone()
+        return entries, size or 0
@@ -0,0 +1,114 @@
+import threading
+import concurrent.futures
+
+__all__ = ['SingleFlight']
+
+
+class SingleFlight(object):
+    """
+    Coalesces identical concurrent calls. While a call for some key is
+    in flight, every other call for the same key waits for it and gets
+    its result (or exception) instead of doing the work again. Once the
+    call finishes the key is forgotten, so later calls run anew.
+
+    Waiters share the very same result object, so it should be treated
+    as read only.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._coalesced = 0
+
+    @property
+    def coalesced(self):
+        """
+        Number of calls that were served by a call already in flight.
+        """
+        return self._coalesced
+
+    @property
+    def in_flight(self):
+        return len(self._calls)
+
+    def _join(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._coalesced += 1
+                return future, False
+
+            future = concurrent.futures.Future()
+            future.set_running_or_notify_cancel()
+            self._calls[key] = future
+            return future, True
+
+    def _resolve(self, key, future, outcome):
+        with self._lock:
+            del self._calls[key]
+
+        if outcome.cancelled():
+            future.set_exception(concurrent.futures.CancelledError())
+        elif outcome.exception() is not None:
+            future.set_exception(outcome.exception())
+        else:
+            future.set_result(outcome.result())
+
+    def do(self, key, func, timeout=None):
+        """
+        Run func() unless a call for key is already in flight, in which
+        case block until it is done and return its result, for at most
+        timeout seconds before raising concurrent.futures.TimeoutError.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(timeout)
+
+        outcome = concurrent.futures.Future()
+        try:
+            outcome.set_result(func())
+        except BaseException as e:
+            outcome.set_exception(e)
+
+        self._resolve(key, future, outcome)
+        return outcome.result()
+
+    def submit(self, key, executor, func):
+        """
+        Non blocking version of do. Submits func to the executor unless a
+        call for key is already in flight, and returns a Future for the
+        result. Calls joining an in-flight call do not take up a worker.
+
+        Every caller, the one starting the call included, gets a Future of
+        its own, so cancelling it only detaches that caller and the shared
+        call keeps running for the others.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return _child(future)
+
+        try:
+            outcome = executor.submit(func)
+        except BaseException as e:
+            outcome = concurrent.futures.Future()
+            outcome.set_exception(e)
+            self._resolve(key, future, outcome)
+            raise
+
+        outcome.add_done_callback(lambda f: self._resolve(key, future, f))
+        return _child(future)
+
+
+def _child(shared):
+    child = concurrent.futures.Future()
+    shared.add_done_callback(lambda f: _copy_outcome(child, f))
+    return child
+
+
+def _copy_outcome(child, shared):
+    if not child.set_running_or_notify_cancel():
+        # Cancelled by its caller
+        return
+    if shared.exception() is not None:
+        child.set_exception(shared.exception())
+    else:
+        child.set_result(shared.result())
@@ -0,0 +1,179 @@
+"""
+Fast loading of service specs.
+
+Parsing the YAML of a spec dominates the cost of load_service, so there
+are two ways to skip it on every process start:
+
+* a spec cache. load_service(path, cache_dir=...) keeps the parsed spec
+  marshalled under cache_dir, keyed by the sha256 of the spec file and
+  stamped with the rekt and python versions. Editing the spec (or
+  upgrading either) changes the key, so stale entries are never read and
+  are replaced by the next load. Entries are named after the spec and a
+  hash of its path, so specs sharing a name, or whose name starts with
+  the name of another, keep entries of their own.
+
+* a generated module. python -m rekt.codegen googleplaces -o places.py
+  writes an importable module holding the spec as a python literal,
+  which python compiles and caches like any other module, and exposing
+  the Client, AsyncClient and resources of the service. --check tells
+  whether a generated module is still up to date with its spec.
+
+The client classes are still built when the spec is loaded since their
+methods are closures over the resources, which cannot be serialized.
+"""
+import os
+import sys
+import ast
+import glob
+import marshal
+import hashlib
+import pprint
+import pathlib
+import argparse
+import tempfile
+
+import rekt
+
+from rekt.utils import parse_config
+
+__all__ = ['spec_digest', 'load_cached_config', 'generate_module']
+
+_CACHE_SUFFIX = '.spec'
+_DIGEST_RE_FMT = "SPEC_DIGEST = '{}'"
+
+_MODULE_TEMPLATE = '''\
+# Generated by rekt.codegen from {source}, do not edit.
+"""
+The {name} service, generated from its rekt spec.
+"""
+from rekt.service import load_service as _load_service
+
+#: sha256 of the spec this module was generated from
+SPEC_DIGEST = '{digest}'
+
+SPEC = {spec}
+
+_service = _load_service(SPEC)
+
+{exports}
+'''
+
+
+def spec_digest(data):
+    """
+    The cache key of the bytes of a spec file, which also changes with
+    the rekt and python versions.
+    """
+    stamp = 'rekt {} marshal {} python {}.{}\n'.format(
+        rekt.__version__, marshal.version, *sys.version_info[:2])
+    return hashlib.sha256(stamp.encode('utf-8') + data).hexdigest()
+
+
+def _path_digest(path):
+    # Tells apart the entries of specs with the same file name
+    return hashlib.sha256(str(path.resolve()).encode('utf-8')).hexdigest()[:16]
+
+
+def load_cached_config(path, cache_dir):
+    """
+    Load the spec at path from the cache when an entry for its current
+    contents exists, otherwise parse it and cache it.
+    """
+    path = pathlib.Path(path)
+    cache_dir = pathlib.Path(cache_dir).expanduser()
+    data = path.read_bytes()
+    prefix = '{}-{}-'.format(path.stem, _path_digest(path))
+    entry = cache_dir / '{}{}{}'.format(prefix, spec_digest(data)[:32], _CACHE_SUFFIX)
+
+    try:
+        return marshal.loads(entry.read_bytes())
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    config = parse_config(data, path.suffix.lower() or None)
+    try:
+        payload = marshal.dumps(config)
+    except ValueError:
+        # Values marshal cannot store, e.g. yaml timestamps
+        return config
+
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Entries for older versions of the spec are dropped as the new
+        # one replaces them
+        for stale in cache_dir.glob('{}*{}'.format(glob.escape(prefix), _CACHE_SUFFIX)):
+            try:
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+        fd, tmp = tempfile.mkstemp(dir=str(cache_dir), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as outfile:
+            outfile.write(payload)
+        os.replace(tmp, str(entry))
+    except OSError:
+        # Caching is best effort, a read only cache dir only costs time
+        pass
+
+    return config
+
+
+def generate_module(data, source='<spec>'):
+    """
+    The source of a python module for the spec file bytes in data.
+    """
+    config = parse_config(data, pathlib.PurePath(source).suffix.lower() or None)
+    literal = pprint.pformat(config, indent=4)
+    if ast.literal_eval(literal) != config:
+        raise ValueError('{} holds values that are not python literals'.format(source))
+
+    # Names that load_service sets on the service module
+    names = ['{}Resource'.format(name) for name in sorted(config['apis'])]
+    names.extend(['resources', 'options', 'Client'])
+    exports = ['{0} = _service.{0}'.format(name) for name in names]
+    exports.append("AsyncClient = getattr(_service, 'AsyncClient', None)")
+
+    return _MODULE_TEMPLATE.format(source=source, name=config['name'], digest=spec_digest(data),
+                                   spec=literal, exports='\n'.join(exports))
+
+
+def is_current(module_path, data):
+    """
+    Whether the module generated at module_path matches the spec bytes.
+    """
+    try:
+        source = pathlib.Path(module_path).read_text()
+    except OSError:
+        return False
+    return _DIGEST_RE_FMT.format(spec_digest(data)) in source
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser('rekt.codegen')
+    parser.add_argument('spec', help='path or name of a builtin spec, e.g. googleplaces')
+    parser.add_argument('-o', '--output', help='module file to write, stdout by default')
+    parser.add_argument('--check', action='store_true',
+                        help='exit with status 1 when --output is out of date with the spec')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from rekt.mock import resolve_spec
+
+    args = parse_args(argv)
+    path = resolve_spec(args.spec)
+    data = path.read_bytes()
+
+    if args.check:
+        if not args.output:
+            sys.exit('--check needs the --output module')
+        sys.exit(0 if is_current(args.output, data) else 1)
+
+    source = generate_module(data, path.name)
+    if args.output:
+        pathlib.Path(args.output).write_text(source)
+    else:
+        sys.stdout.write(source)
+
+
+if __name__ == '__main__':
+    main()
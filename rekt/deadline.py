@@ -0,0 +1,164 @@
+"""
+Deadlines and cancellation of generated calls.
+
+Every generated method takes a _timeout in seconds covering the whole
+call: the wait in the executor queue, the rate limiter, every attempt
+and the backoff between retries, and every page of a paginated
+iteration. The Deadline created for the call is checked at each of
+these steps, attempts are sent with the time left as their requests
+timeout, and waits stop short of the deadline. A call that runs out of
+time fails with DeadlineExceededError.
+
+A Deadline can also be cancelled. Cancelling the future of an async_*
+call cancels its deadline, so a call that already started stops at its
+next check, at the latest after the body chunk being read, with
+concurrent.futures.CancelledError.
+"""
+import time
+import threading
+import concurrent.futures
+
+from rekt.exceptions import DeadlineExceededError
+
+__all__ = ['Deadline', 'as_deadline', 'cancellable']
+
+# Raised when completing a future that was cancelled, on python 3.8+
+_INVALID_STATE = getattr(concurrent.futures, 'InvalidStateError', RuntimeError)
+
+
+class Deadline(object):
+    """
+    The time budget of a call, timeout seconds from now or unlimited
+    when it is None, and its cancellation flag.
+    """
+    __slots__ = ('expires', '_cancelled', '_parent')
+
+    def __init__(self, timeout=None):
+        self.expires = None if timeout is None else time.monotonic() + timeout
+        self._cancelled = threading.Event()
+        self._parent = None
+
+    def __repr__(self):
+        return '<{} remaining={} cancelled={}>'.format(
+            self.__class__.__name__,
+            None if self.expires is None else max(self.expires - time.monotonic(), 0),
+            self.cancelled)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set() or (self._parent is not None and self._parent.cancelled)
+
+    @property
+    def expired(self):
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def child(self):
+        """
+        A deadline for part of the call, e.g. one of several concurrent
+        attempts, expiring and cancelled with this one, which can also be
+        cancelled on its own.
+        """
+        child = Deadline()
+        child.expires = self.expires
+        child._parent = self
+        return child
+
+    def remaining(self):
+        """
+        Seconds left, None without a timeout. Raises CancelledError once
+        cancelled and DeadlineExceededError once expired.
+        """
+        if self.cancelled:
+            raise concurrent.futures.CancelledError()
+        if self.expires is None:
+            return None
+
+        left = self.expires - time.monotonic()
+        if left <= 0:
+            raise DeadlineExceededError('Deadline exceeded')
+        return left
+
+    def fits(self, seconds):
+        """
+        Whether the call would still have time left after waiting seconds.
+        """
+        return self.expires is None or time.monotonic() + seconds < self.expires
+
+    def sleep(self, seconds):
+        """
+        Sleep for seconds, failing right away when that would overrun the
+        deadline and as soon as the call is cancelled.
+        """
+        if not self.fits(seconds):
+            raise DeadlineExceededError('Waiting {:.3f}s would exceed the deadline'.format(seconds))
+        # A child only wakes up early when cancelled itself, a cancelled
+        # parent is seen once the wait is over
+        if self._cancelled.wait(seconds) or self.cancelled:
+            raise concurrent.futures.CancelledError()
+
+    def timeout(self, timeout=None):
+        """
+        The requests timeout of an attempt, the configured one capped by
+        the time left.
+        """
+        left = self.remaining()
+        if left is None:
+            return timeout
+        elif isinstance(timeout, tuple):
+            return tuple([left if t is None else min(t, left) for t in timeout])
+        return left if timeout is None else min(timeout, left)
+
+
+def as_deadline(timeout):
+    """
+    The Deadline of a _timeout argument, which may already be one.
+    """
+    if timeout is None or isinstance(timeout, Deadline):
+        return timeout
+    return Deadline(timeout)
+
+
+class _CallFuture(concurrent.futures.Future):
+    def __init__(self, deadline):
+        super(_CallFuture, self).__init__()
+        self._deadline = deadline
+        self._inner = None
+
+    def cancel(self):
+        # Stop the work wherever it is, the future itself reports
+        # cancelled right away
+        self._deadline.cancel()
+        if self._inner is not None:
+            self._inner.cancel()
+        return super(_CallFuture, self).cancel()
+
+
+def _copy_outcome(future, inner):
+    if future.done():
+        return
+    try:
+        if inner.cancelled():
+            future.cancel()
+        elif inner.exception() is not None:
+            future.set_exception(inner.exception())
+        else:
+            future.set_result(inner.result())
+    except _INVALID_STATE:
+        # Cancelled by the caller in the meantime
+        pass
+
+
+def cancellable(submit, deadline):
+    """
+    Call submit() for the future of some work checking deadline, and
+    return a future for its outcome whose cancel() also cancels the
+    deadline, so that the work stops even when it is already running.
+    """
+    future = _CallFuture(deadline)
+    inner = submit()
+    future._inner = inner
+    inner.add_done_callback(lambda f: _copy_outcome(future, f))
+    return future
@@ -0,0 +1,79 @@
+"""
+Pluggable json decoders for response bodies.
+
+The stdlib decoder is always available. When orjson is installed it is
+used by default since it parses plain json several times faster. orjson
+has no object hook, and applying one to its output in python is slower
+than the stdlib parser calling it, so hooked decoding always goes
+through the stdlib parser.
+"""
+import json
+
+import requests.utils
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+__all__ = ['JSONDecoder', 'StdlibDecoder', 'OrjsonDecoder', 'default_decoder', 'get_decoder']
+
+
+class JSONDecoder(object):
+    """
+    Base class for decoders. loads takes the raw response body as bytes
+    and returns plain python objects, calling object_hook on every json
+    object bottom up when it is given, like json.loads does. Malformed
+    bodies raise ValueError.
+    """
+    name = None
+
+    def loads(self, content, object_hook=None):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return '<{}>'.format(self.__class__.__name__)
+
+
+class StdlibDecoder(JSONDecoder):
+    name = 'stdlib'
+
+    def loads(self, content, object_hook=None):
+        encoding = requests.utils.guess_json_utf(content) or 'utf-8'
+        return json.loads(content.decode(encoding), object_hook=object_hook)
+
+
+class OrjsonDecoder(StdlibDecoder):
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError('orjson is not installed')
+
+    def loads(self, content, object_hook=None):
+        if object_hook is not None:
+            return super(OrjsonDecoder, self).loads(content, object_hook)
+        return orjson.loads(content)
+
+
+_DECODERS = dict([(cls.name, cls) for cls in (StdlibDecoder, OrjsonDecoder)])
+
+
+def default_decoder():
+    """
+    The fastest decoder available.
+    """
+    return OrjsonDecoder() if orjson is not None else StdlibDecoder()
+
+
+def get_decoder(decoder=None):
+    """
+    Resolve a decoder given by name or instance, None is the default.
+    """
+    if decoder is None:
+        return default_decoder()
+    elif isinstance(decoder, JSONDecoder):
+        return decoder
+    elif decoder in _DECODERS:
+        return _DECODERS[decoder]()
+    raise ValueError('Unknown decoder: {}'.format(decoder))
@@ -0,0 +1,47 @@
+import requests.exceptions
+
+__all__ = ['RektError', 'QuotaExceededError', 'CircuitOpenError', 'QueueFullError',
+           'DeadlineExceededError', 'ReplayMissError']
+
+
+class RektError(requests.exceptions.RequestException):
+    """
+    Base class for the errors raised by rekt itself rather than by
+    requests. It is a RequestException so a single except clause still
+    covers every failed call.
+    """
+
+
+class QuotaExceededError(RektError):
+    """
+    A call was refused because a daily quota declared for the service or
+    resource has been used up.
+    """
+
+
+class CircuitOpenError(RektError):
+    """
+    A call was failed fast without being sent because the circuit
+    breaker of its resource is open.
+    """
+
+
+class QueueFullError(RektError):
+    """
+    An async call was refused because the bounded queue of the client's
+    executor is full.
+    """
+
+
+class DeadlineExceededError(RektError):
+    """
+    A call was given up because its deadline passed before it could be
+    completed.
+    """
+
+
+class ReplayMissError(RektError):
+    """
+    A call made through a ReplayTransport has no recorded response in
+    its cassette.
+    """
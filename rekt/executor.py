@@ -0,0 +1,384 @@
+"""
+Executors for the async_* methods of generated clients.
+
+By default every client owns a WorkerPool of up to thread_count workers
+whose queue holds up to 100 calls per worker, blocking the callers
+submitting more. Client(executor=...) takes instead
+
+* 'shared', the process wide WorkerPool returned by shared_executor(),
+  so that many short lived clients reuse one set of threads,
+* any concurrent.futures.Executor, e.g. a WorkerPool configured for the
+  workload. Executors that are passed in are not shut down by the
+  client.
+
+A WorkerPool grows from min_workers up to max_workers while calls are
+waiting and the observed call duration says they would wait long, and
+idle workers exit again after idle_timeout. With max_queue set, a full
+queue applies backpressure according to the overflow policy: 'block'
+the submitting thread until there is room, 'reject' the call with
+QueueFullError, or 'caller_runs' it right away on the submitting thread.
+Calls submitted by the workers of the pool itself, e.g. from the done
+callback of another call, run right away instead of blocking, since
+the worker could otherwise wait for room only it would make.
+
+Calls are scheduled with a priority, a tag and a deadline. The
+FairQueue of a WorkerPool runs higher priorities first and shares the
+workers between the tags of a priority by weighted fair queuing, so a
+bulk job cannot hold up calls with other tags. Calls still queued past
+their deadline fail with DeadlineExceededError without being run.
+"""
+import time
+import heapq
+import functools
+import atexit
+import itertools
+import threading
+import concurrent.futures
+
+from collections import namedtuple
+
+from rekt.exceptions import QueueFullError, DeadlineExceededError
+
+__all__ = ['WorkerPool', 'PoolStats', 'FairQueue', 'ScheduledExecutor', 'schedule',
+           'shared_executor', 'BLOCK', 'REJECT', 'CALLER_RUNS', 'QUEUE_PER_WORKER']
+
+#: Overflow policies of a bounded WorkerPool queue
+BLOCK, REJECT, CALLER_RUNS = 'block', 'reject', 'caller_runs'
+_OVERFLOW_POLICIES = (BLOCK, REJECT, CALLER_RUNS)
+
+#: Calls the default pools queue for each of their workers
+QUEUE_PER_WORKER = 100
+
+#: Snapshot of a WorkerPool. duration is the moving average of the run
+#: time of the calls in seconds.
+PoolStats = namedtuple('PoolStats', ('workers', 'idle', 'queued', 'completed', 'rejected',
+                                     'expired', 'duration'))
+
+# Weight of the latest call in the moving average of call durations
+_DURATION_WEIGHT = 0.1
+_EXPIRED = object()
+
+
+class _WorkItem(object):
+    __slots__ = ('future', 'fn', 'args', 'kwargs', 'deadline')
+
+    def __init__(self, future, fn, args, kwargs, deadline=None):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline
+
+    def expired(self, now):
+        return self.deadline is not None and now >= self.deadline
+
+    def expire(self):
+        if self.future.set_running_or_notify_cancel():
+            self.future.set_exception(DeadlineExceededError('Call expired in the queue'))
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+
+class FairQueue(object):
+    """
+    The queue of a WorkerPool. Calls of a higher priority always run
+    first. Within a priority every tag gets a share of the workers in
+    proportion to its weight: each call is stamped with the virtual time
+    at which its tag would have finished it, 1 / weight after the
+    previous call of the tag, and the call with the earliest stamp runs
+    next. Calls with the same tag run in submission order.
+
+    :param weights: weight of each tag, overriding the weight the calls
+        are scheduled with
+    """
+    def __init__(self, weights=None):
+        self.weights = dict(weights or {})
+        self._heap = []
+        self._counter = itertools.count()
+        # Virtual time of each priority and the last stamp of each tag
+        self._vtime = {}
+        self._finish = {}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, item, priority=0, tag=None, weight=1.0):
+        weight = self.weights.get(tag, weight)
+        if weight <= 0:
+            raise ValueError('weight must be positive')
+
+        flow = (priority, tag)
+        start = max(self._vtime.get(priority, 0.0), self._finish.get(flow, 0.0))
+        finish = start + 1.0 / weight
+        self._finish[flow] = finish
+        heapq.heappush(self._heap, (-priority, finish, next(self._counter), start, tag, item))
+
+    def pop(self):
+        priority, finish, _, start, tag, item = heapq.heappop(self._heap)
+        self._vtime[-priority] = start
+        # Forget tags whose calls have all been popped
+        if self._finish.get((-priority, tag)) == finish:
+            del self._finish[(-priority, tag)]
+        return item
+
+
+class WorkerPool(concurrent.futures.Executor):
+    """
+    Thread pool executor whose size adapts to the load and whose queue
+    can be bounded.
+
+    :param max_workers: most threads running calls
+    :param min_workers: threads kept even when idle
+    :param max_queue: most calls waiting for a thread, None for no limit
+    :param overflow: what submit does when the queue is full, one of
+        BLOCK, REJECT or CALLER_RUNS. BLOCK runs the calls submitted by
+        the workers of the pool on the worker instead.
+    :param idle_timeout: seconds an idle thread above min_workers waits
+        for work before it exits
+    :param grow_wait: only start another thread when the calls already
+        queued would keep it waiting longer than this many seconds, going
+        by the average call duration, which is checked as calls are queued
+        and as they finish. 0 grows whenever a call waits.
+    :param queue: the FairQueue ordering the calls
+    """
+    def __init__(self, max_workers=32, min_workers=0, max_queue=None, overflow=BLOCK,
+                 idle_timeout=60.0, grow_wait=0.0, queue=None, thread_name_prefix='rekt-worker'):
+        if max_workers < 1 or not 0 <= min_workers <= max_workers:
+            raise ValueError('Need 0 <= min_workers <= max_workers and max_workers >= 1')
+        if overflow not in _OVERFLOW_POLICIES:
+            raise ValueError('overflow must be one of {}'.format(_OVERFLOW_POLICIES))
+
+        self.max_workers = max_workers
+        self.min_workers = min_workers
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.idle_timeout = idle_timeout
+        self.grow_wait = grow_wait
+        self.thread_name_prefix = thread_name_prefix
+
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._room = threading.Condition(self._lock)
+        self._queue = FairQueue() if queue is None else queue
+        self._workers = set()
+        self._idle = 0
+        self._busy = 0
+        self._completed = 0
+        self._rejected = 0
+        self._expired = 0
+        self._duration = 0.0
+        self._shutdown = False
+
+        with self._lock:
+            for _ in range(min_workers):
+                self._start_worker()
+
+    def __repr__(self):
+        return '<{} max_workers={} max_queue={} overflow={}>'.format(
+            self.__class__.__name__, self.max_workers, self.max_queue, self.overflow)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return PoolStats(len(self._workers), self._idle, len(self._queue), self._completed,
+                             self._rejected, self._expired, self._duration)
+
+    def submit(self, fn, *args, **kwargs):
+        return self._submit(fn, args, kwargs)
+
+    def schedule(self, fn, priority=0, tag=None, weight=1.0, deadline=None):
+        """
+        Submit fn() to run with a priority, higher first, under a tag
+        with a weight for fair queuing. Unless it starts before the
+        time.monotonic() deadline it fails with DeadlineExceededError.
+        """
+        return self._submit(fn, (), {}, deadline, priority=priority, tag=tag, weight=weight)
+
+    def _submit(self, fn, args, kwargs, deadline=None, **options):
+        future = concurrent.futures.Future()
+        item = _WorkItem(future, fn, args, kwargs, deadline)
+
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new calls after shutdown')
+
+            while self.max_queue is not None and self._backlog() >= self.max_queue:
+                if len(self._workers) < self.max_workers:
+                    self._start_worker()
+                    continue
+                if self.overflow == REJECT:
+                    self._rejected += 1
+                    raise QueueFullError('{} calls are already queued'.format(len(self._queue)))
+                elif self.overflow == CALLER_RUNS or threading.current_thread() in self._workers:
+                    # A worker blocking on its own queue may never wake up
+                    break
+                self._room.wait()
+                if self._shutdown:
+                    raise RuntimeError('cannot schedule new calls after shutdown')
+            else:
+                self._queue.push(item, **options)
+                self._grow()
+                self._work.notify()
+                return future
+
+        # Caller runs: the submitting thread does the work itself
+        if item.expired(time.monotonic()):
+            item.expire()
+        else:
+            item.run()
+        return future
+
+    def _backlog(self):
+        # Queued calls that no started worker is free to pick up
+        return len(self._queue) - (len(self._workers) - self._busy)
+
+    def _grow(self):
+        # Called with the lock held when calls are queued or finished
+        backlog = self._backlog()
+        if len(self._workers) >= self.max_workers or backlog <= 0:
+            return
+        if self._workers and self.grow_wait:
+            if backlog * self._duration / len(self._workers) <= self.grow_wait:
+                return
+        self._start_worker()
+
+    def _start_worker(self):
+        thread = threading.Thread(target=self._work_loop, daemon=True, name='{}-{}'.format(
+            self.thread_name_prefix, len(self._workers)))
+        self._workers.add(thread)
+        thread.start()
+
+    def _next_item(self, expired):
+        # The next call to run, None when the worker should exit, or
+        # _EXPIRED after moving calls past their deadline to expired
+        with self._lock:
+            while not self._queue:
+                if self._shutdown:
+                    self._workers.discard(threading.current_thread())
+                    return None
+
+                self._idle += 1
+                notified = self._work.wait(self.idle_timeout)
+                self._idle -= 1
+                if (not notified and not self._queue
+                    and len(self._workers) > self.min_workers):
+                    self._workers.discard(threading.current_thread())
+                    return None
+
+            now = time.monotonic()
+            while self._queue:
+                item = self._queue.pop()
+                self._room.notify()
+                if not item.expired(now):
+                    self._busy += 1
+                    return item
+                self._expired += 1
+                expired.append(item)
+
+            return _EXPIRED
+
+    def _work_loop(self):
+        expired = []
+        while True:
+            item = self._next_item(expired)
+            for dropped in expired:
+                dropped.expire()
+            del expired[:]
+            if item is None:
+                return
+            elif item is _EXPIRED:
+                continue
+
+            started = time.monotonic()
+            item.run()
+            duration = time.monotonic() - started
+            del item
+
+            with self._lock:
+                self._busy -= 1
+                self._completed += 1
+                if self._completed == 1:
+                    self._duration = duration
+                else:
+                    self._duration += (duration - self._duration) * _DURATION_WEIGHT
+                self._grow()
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting calls. Workers finish the queued calls and exit,
+        and with wait set this blocks until they have.
+        """
+        with self._lock:
+            self._shutdown = True
+            workers = list(self._workers)
+            self._work.notify_all()
+            self._room.notify_all()
+
+        if wait:
+            for thread in workers:
+                if thread is not threading.current_thread():
+                    thread.join()
+
+
+def _expiring(fn, deadline):
+    def run():
+        if time.monotonic() >= deadline:
+            raise DeadlineExceededError('Call expired in the queue')
+        return fn()
+    return run
+
+
+def schedule(executor, fn, priority=0, tag=None, weight=1.0, deadline=None):
+    """
+    Submit fn() to any executor with the scheduling options of a call.
+    Executors without a schedule method run calls in their own order
+    and only the deadline is honored, checked when the call starts.
+    """
+    method = getattr(executor, 'schedule', None)
+    if method is not None:
+        return method(fn, priority=priority, tag=tag, weight=weight, deadline=deadline)
+    if deadline is not None:
+        fn = _expiring(fn, deadline)
+    return executor.submit(fn)
+
+
+class ScheduledExecutor(object):
+    """
+    View of an executor whose submit schedules every call with the same
+    options.
+    """
+    __slots__ = ('executor', 'options')
+
+    def __init__(self, executor, **options):
+        self.executor = executor
+        self.options = options
+
+    def submit(self, fn, *args, **kwargs):
+        if args or kwargs:
+            fn = functools.partial(fn, *args, **kwargs)
+        return schedule(self.executor, fn, **self.options)
+
+
+_SHARED_LOCK = threading.Lock()
+_SHARED_EXECUTOR = None
+
+def shared_executor():
+    """
+    The process wide WorkerPool used by clients made with
+    executor='shared', created on first use.
+    """
+    global _SHARED_EXECUTOR
+    with _SHARED_LOCK:
+        if _SHARED_EXECUTOR is None:
+            _SHARED_EXECUTOR = WorkerPool(max_workers=32, max_queue=32 * QUEUE_PER_WORKER,
+                                          thread_name_prefix='rekt-shared')
+            atexit.register(_SHARED_EXECUTOR.shutdown, wait=False)
+        return _SHARED_EXECUTOR
@@ -0,0 +1,155 @@
+"""
+Request hedging for generated clients.
+
+GET calls to resources marked idempotent in the spec can be hedged: when
+the first attempt has been outstanding longer than a threshold, by
+default the observed 95th percentile latency of the resource, a second
+identical attempt is sent and whichever answers first is used. The
+slower attempt is cancelled. A client opts in with
+Client(hedge=HedgePolicy(...)) and resources can override any of its
+settings in the spec:
+
+    idempotent : true
+    hedge : { quantile : 0.99, max_rate : 0.02 }
+
+Hedges may add at most max_rate extra requests on top of the calls made
+to the resource in the last window seconds, so that quota use stays
+predictable and hedging cannot double the load on a slow upstream.
+"""
+import threading
+
+from collections import namedtuple, deque
+
+from rekt.retry import RetryBudget
+
+__all__ = ['HedgePolicy', 'HedgeStats', 'create_hedge_policies']
+
+#: Counters of a HedgePolicy. calls are the calls that could be hedged,
+#: hedged those that sent a second attempt and won the ones it answered
+#: first, rejected the hedges refused by the max_rate budget. threshold
+#: is the current delay in seconds, None until enough calls were seen.
+HedgeStats = namedtuple('HedgeStats', ('calls', 'hedged', 'won', 'rejected', 'threshold'))
+
+_SPEC_FIELDS = ('delay', 'quantile', 'min_samples', 'samples', 'max_rate', 'window')
+
+# Recomputing the quantile on every call would sort the samples each time
+_UPDATE_EVERY = 16
+
+
+class HedgePolicy(object):
+    """
+    When to send a hedged attempt for the calls to one resource.
+
+    :param delay: fixed seconds after which to hedge, None to use the
+        observed quantile of the call latency instead
+    :param quantile: the latency quantile used as the delay
+    :param min_samples: calls seen before the observed delay is used,
+        calls are not hedged until then
+    :param samples: number of most recent call latencies considered
+    :param max_rate: hedges allowed as a fraction of the calls made in
+        the last window seconds
+    :param window: seconds of calls considered by max_rate
+    """
+    def __init__(self, delay=None, quantile=0.95, min_samples=20, samples=1000,
+                 max_rate=0.05, window=10.0):
+        if not 0 < quantile < 1:
+            raise ValueError('quantile must be between 0 and 1')
+        self.delay = delay
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.samples = samples
+        self.max_rate = max_rate
+        self.window = window
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=samples)
+        self._pending = 0
+        self._threshold = delay
+        self._budget = RetryBudget(ratio=max_rate, min_per_second=0.0, window=window)
+        self._hedged = 0
+        self._won = 0
+
+    def __repr__(self):
+        return '<{} threshold={} max_rate={}>'.format(
+            self.__class__.__name__, self.threshold, self.max_rate)
+
+    def replace(self, **overrides):
+        """
+        A new policy, with no observed latencies, with the settings of
+        this one and some of them replaced.
+        """
+        settings = dict([(k, getattr(self, k)) for k in _SPEC_FIELDS])
+        settings.update(overrides)
+        return self.__class__(**settings)
+
+    @property
+    def threshold(self):
+        """
+        Seconds a call may be outstanding before it is hedged, None while
+        too few calls were seen.
+        """
+        return self._threshold
+
+    @property
+    def stats(self):
+        budget = self._budget.stats
+        with self._lock:
+            return HedgeStats(budget.calls, self._hedged, self._won, budget.rejected,
+                              self._threshold)
+
+    def record_call(self):
+        self._budget.record_call()
+
+    def observe(self, duration):
+        """
+        Record the latency of a call, from its first attempt to the
+        response used.
+        """
+        if self.delay is not None:
+            return
+
+        with self._lock:
+            self._latencies.append(duration)
+            self._pending += 1
+            if len(self._latencies) < self.min_samples or (
+                    self._threshold is not None and self._pending < _UPDATE_EVERY):
+                return
+            self._pending = 0
+            ordered = sorted(self._latencies)
+            self._threshold = ordered[min(int(len(ordered) * self.quantile), len(ordered) - 1)]
+
+    def try_hedge(self):
+        """
+        Withdraw a hedge from the budget, returns False when it is spent.
+        """
+        allowed = self._budget.try_retry()
+        if allowed:
+            with self._lock:
+                self._hedged += 1
+        return allowed
+
+    def record_win(self):
+        with self._lock:
+            self._won += 1
+
+
+def create_hedge_policies(policy, apis):
+    """
+    The HedgePolicy for each resource name marked idempotent in its spec,
+    made from the client policy with the hedge settings of the resource
+    spec applied on top. A resource gets no policy unless the client has
+    one and the resource is idempotent.
+    """
+    policies = {}
+    if policy is None:
+        return policies
+
+    for api in apis:
+        spec = api.options.get('hedge')
+        if not api.options.get('idempotent') or spec is False:
+            continue
+
+        overrides = dict([(k, v) for k, v in (spec or {}).items() if k in _SPEC_FIELDS])
+        policies[api.name] = policy.replace(**overrides)
+
+    return policies
@@ -13,8 +13,11 @@ class ArgsLocation(Enum):
     body = 'data'
 
 _ARGS_LOCATION_BY_VERB = read_only_dict({
-        HTTPVerb.GET  : ArgsLocation.query_string,
-        HTTPVerb.POST : ArgsLocation.body
+        HTTPVerb.GET    : ArgsLocation.query_string,
+        HTTPVerb.DELETE : ArgsLocation.query_string,
+        HTTPVerb.POST   : ArgsLocation.body,
+        HTTPVerb.PUT    : ArgsLocation.body,
+        HTTPVerb.PATCH  : ArgsLocation.body,
 })
 
 # Backported from python3.5 via taking it from the codebase.
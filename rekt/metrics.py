@@ -0,0 +1,314 @@
+"""
+Metrics and tracing hooks for generated clients.
+
+A client made with Client(metrics=hook) reports every request attempt,
+cache, retry and hedging events and the state of its executor to the
+hook. With the default of metrics=None nothing is measured and each
+call only pays for a few `is None` checks.
+
+Metrics is the built in hook aggregating counters and latency
+histograms in process. Its snapshot() can be exported with
+prometheus_text or a LoggingExporter, and any other object implementing
+the MetricsHook methods, e.g. one opening tracing spans, can be passed
+to the client instead.
+"""
+import bisect
+import logging
+import threading
+
+from collections import namedtuple, defaultdict
+
+from rekt.executor import schedule
+
+__all__ = ['MetricsHook', 'Metrics', 'MetricsSnapshot', 'HistogramSnapshot',
+           'InstrumentedExecutor', 'prometheus_text', 'LoggingExporter']
+
+log = logging.getLogger(__name__)
+
+#: Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#: Events reported through MetricsHook.on_event
+CACHE_HIT, CACHE_MISS = 'cache_hit', 'cache_miss'
+RETRY, RETRY_REJECTED = 'retry', 'retry_rejected'
+CIRCUIT_OPEN = 'circuit_open'
+HEDGE, HEDGE_REJECTED, HEDGE_WON = 'hedge', 'hedge_rejected', 'hedge_won'
+
+#: Executor task transitions reported through MetricsHook.on_task,
+#: calls dropped from the queue before they started are cancelled
+TASK_QUEUED, TASK_STARTED, TASK_FINISHED, TASK_CANCELLED = (
+    'queued', 'started', 'finished', 'cancelled')
+
+
+class MetricsHook(object):
+    """
+    The instrumentation surface of a client, every method is a no-op.
+    Hooks are called on the calling or worker thread and must be thread
+    safe and quick.
+    """
+    def on_request(self, resource, verb, status, duration, ttfb, bytes_out, bytes_in):
+        """
+        A request attempt finished. status is the http status code, or
+        the name of the exception raised by the transport. duration is
+        the total time in seconds and ttfb the time until the response
+        headers arrived, None on errors. bytes_out counts the url and
+        body sent and bytes_in the body received, its Content-Length
+        when the response has one and else its size once decoded.
+        Headers are left out of both.
+        """
+
+    def on_event(self, resource, event):
+        """
+        A cache, retry or circuit breaker event for a resource, one of
+        the event constants of this module.
+        """
+
+    def on_task(self, transition):
+        """
+        An async call moved through the client executor, one of the
+        TASK_* constants of this module.
+        """
+
+
+class HistogramSnapshot(namedtuple('HistogramSnapshot', ('buckets', 'counts', 'sum', 'count'))):
+    """
+    Observations per bucket, counts[i] are the observations no greater
+    than buckets[i] and counts[-1] the ones above every bucket.
+    """
+    __slots__ = ()
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q quantile, None when
+        nothing was observed or it is above the last bucket.
+        """
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+#: Point in time copy of a Metrics. requests are keyed by (resource,
+#: verb, status), latency by (resource, verb, phase) with phase 'total'
+#: or 'ttfb', bytes by (resource, verb, direction) with direction 'out'
+#: or 'in' and events by (resource, event). executor holds the queued
+#: and active task counts.
+MetricsSnapshot = namedtuple('MetricsSnapshot', ('requests', 'latency', 'bytes', 'events',
+                                                 'executor'))
+
+
+class _Histogram(object):
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Metrics(MetricsHook):
+    """
+    Aggregates the hook calls of one or more clients into counters,
+    gauges and latency histograms.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._requests = defaultdict(int)
+            self._latency = {}
+            self._bytes = defaultdict(int)
+            self._events = defaultdict(int)
+            self._queued = 0
+            self._active = 0
+
+    def _observe(self, key, value):
+        histogram = self._latency.get(key)
+        if histogram is None:
+            histogram = self._latency[key] = _Histogram(self.buckets)
+        histogram.counts[bisect.bisect_left(self.buckets, value)] += 1
+        histogram.sum += value
+        histogram.count += 1
+
+    def on_request(self, resource, verb, status, duration, ttfb, bytes_out, bytes_in):
+        with self._lock:
+            self._requests[(resource, verb, status)] += 1
+            self._observe((resource, verb, 'total'), duration)
+            if ttfb is not None:
+                self._observe((resource, verb, 'ttfb'), ttfb)
+            self._bytes[(resource, verb, 'out')] += bytes_out
+            self._bytes[(resource, verb, 'in')] += bytes_in
+
+    def on_event(self, resource, event):
+        with self._lock:
+            self._events[(resource, event)] += 1
+
+    def on_task(self, transition):
+        with self._lock:
+            if transition == TASK_QUEUED:
+                self._queued += 1
+            elif transition == TASK_STARTED:
+                self._queued -= 1
+                self._active += 1
+            elif transition == TASK_FINISHED:
+                self._active -= 1
+            elif transition == TASK_CANCELLED:
+                self._queued -= 1
+
+    def snapshot(self):
+        with self._lock:
+            latency = dict([(key, HistogramSnapshot(self.buckets, tuple(h.counts), h.sum, h.count))
+                            for key, h in self._latency.items()])
+            return MetricsSnapshot(dict(self._requests), latency, dict(self._bytes),
+                                   dict(self._events),
+                                   {'queued' : self._queued, 'active' : self._active})
+
+
+class InstrumentedExecutor(object):
+    """
+    Wraps the executor of a client to report the tasks it queues, runs
+    and finishes to a MetricsHook.
+    """
+    def __init__(self, executor, metrics):
+        self.executor = executor
+        self.metrics = metrics
+
+    def submit(self, func, *args, **kwargs):
+        return self._track(lambda run: self.executor.submit(run), func, args, kwargs)
+
+    def schedule(self, func, **options):
+        """
+        Schedule with the options of the executor when it supports them.
+        """
+        return self._track(lambda run: schedule(self.executor, run, **options), func, (), {})
+
+    def _track(self, submit, func, args, kwargs):
+        metrics = self.metrics
+        started = []
+
+        def run():
+            started.append(True)
+            metrics.on_task(TASK_STARTED)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.on_task(TASK_FINISHED)
+
+        metrics.on_task(TASK_QUEUED)
+        try:
+            future = submit(run)
+        except BaseException:
+            metrics.on_task(TASK_CANCELLED)
+            raise
+
+        # Calls cancelled or expired in the queue never start
+        future.add_done_callback(lambda f: started or metrics.on_task(TASK_CANCELLED))
+        return future
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+def _labels(**labels):
+    return ','.join(['{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                     for k, v in sorted(labels.items())])
+
+
+def prometheus_text(snapshot, namespace='rekt'):
+    """
+    Render a MetricsSnapshot in the Prometheus text exposition format.
+    """
+    lines = []
+
+    def family(name, kind, doc):
+        lines.append('# HELP {}_{} {}'.format(namespace, name, doc))
+        lines.append('# TYPE {}_{} {}'.format(namespace, name, kind))
+
+    def sample(name, value, **labels):
+        lines.append('{}_{}{{{}}} {}'.format(namespace, name, _labels(**labels), value))
+
+    family('requests_total', 'counter', 'Request attempts by resource, verb and status.')
+    for (resource, verb, status), count in sorted(snapshot.requests.items(), key=str):
+        sample('requests_total', count, resource=resource, verb=verb, status=status)
+
+    for phase, name, doc in (('total', 'request_duration_seconds', 'Total request latency.'),
+                             ('ttfb', 'request_ttfb_seconds', 'Time until the response headers.')):
+        family(name, 'histogram', doc)
+        for (resource, verb, p), histogram in sorted(snapshot.latency.items()):
+            if p != phase:
+                continue
+            seen = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                seen += count
+                sample(name + '_bucket', seen, resource=resource, verb=verb, le=bound)
+            sample(name + '_sum', histogram.sum, resource=resource, verb=verb)
+            sample(name + '_count', histogram.count, resource=resource, verb=verb)
+
+    family('bytes_total', 'counter', 'Bytes sent (out) and received (in).')
+    for (resource, verb, direction), count in sorted(snapshot.bytes.items()):
+        sample('bytes_total', count, resource=resource, verb=verb, direction=direction)
+
+    family('events_total', 'counter', 'Cache, retry, circuit breaker and hedging events.')
+    for (resource, event), count in sorted(snapshot.events.items()):
+        sample('events_total', count, resource=resource, event=event)
+
+    for gauge, value in sorted(snapshot.executor.items()):
+        family('executor_' + gauge, 'gauge', 'Async calls {} on the executor.'.format(gauge))
+        lines.append('{}_executor_{} {}'.format(namespace, gauge, value))
+
+    return '\n'.join(lines) + '\n'
+
+
+class LoggingExporter(object):
+    """
+    Logs a summary line per resource and verb of a Metrics, on demand
+    with export() or every interval seconds from a daemon thread once
+    started.
+    """
+    def __init__(self, metrics, logger=log, level=logging.INFO):
+        self.metrics = metrics
+        self.logger = logger
+        self.level = level
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def export(self):
+        snapshot = self.metrics.snapshot()
+        calls = defaultdict(dict)
+        for (resource, verb, status), count in snapshot.requests.items():
+            calls[(resource, verb)][status] = count
+
+        for (resource, verb), statuses in sorted(calls.items()):
+            total = snapshot.latency.get((resource, verb, 'total'))
+            self.logger.log(self.level, '%s %s requests=%d statuses=%s p50<=%s p99<=%s in=%d out=%d',
+                            verb, resource, sum(statuses.values()),
+                            dict(sorted(statuses.items(), key=str)),
+                            total.quantile(0.5), total.quantile(0.99),
+                            snapshot.bytes.get((resource, verb, 'in'), 0),
+                            snapshot.bytes.get((resource, verb, 'out'), 0))
+
+        if snapshot.events:
+            self.logger.log(self.level, 'events %s', dict(sorted(snapshot.events.items())))
+        self.logger.log(self.level, 'executor %s', snapshot.executor)
+
+    def start(self, interval=60.0):
+        def run():
+            while not self._stopped.wait(interval):
+                self.export()
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=run, name='rekt-metrics-log', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
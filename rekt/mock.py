@@ -0,0 +1,306 @@
+"""
+A local mock of any service spec for tests and benchmarks.
+
+MockService serves every resource url of a spec from a local HTTP/1.1
+server with keep-alive, answering each call with a synthetic json body
+after a configurable latency, and failing a configurable share of calls.
+Resources declaring a pagination scheme hand out next page tokens, and
+the items of every page are listed at the path the stream or paginate
+settings of the resource point at, e.g. within the single element of
+rows for 'rows[*].elements[*]'. Calls whose client hangs up, e.g. on
+its deadline, are dropped quietly.
+
+    with MockService(spec, latency=0.01, items=20) as mock:
+        service = load_service(mock.config)
+        service.Client().get_places(key='k')
+
+or as a separate process, printing its base url on the first line:
+
+    python -m rekt.mock googleplaces --latency 0.01 --error-rate 0.01
+"""
+import sys
+import json
+import time
+import random
+import hashlib
+import pathlib
+import argparse
+import threading
+import socketserver
+
+from collections import defaultdict
+from urllib.parse import urlsplit, parse_qs
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from rekt.utils import load_config, builtin_config_path
+from rekt.httputils import HTTPVerb
+from rekt.stream import parse_path, _ITEM
+
+__all__ = ['MockService']
+
+_ITEM_FIELD = 'results'
+
+
+def _items_path(defn):
+    # The steps of the stream or paginate path to the items
+    paginate = defn.get('paginate') or {}
+    if paginate.get('items'):
+        return (paginate['items'], _ITEM)
+    if defn.get('stream'):
+        return parse_path(defn['stream'])
+    return (_ITEM_FIELD, _ITEM)
+
+
+def _nest(steps, items):
+    # The json holding the items json at the end of the path steps,
+    # arrays along the way holding a single element
+    if steps and steps[-1] == _ITEM:
+        steps = steps[:-1]
+    for step in reversed(steps):
+        if step == _ITEM:
+            items = '[{}]'.format(items)
+        else:
+            items = '{{{}: {}}}'.format(json.dumps(step), items)
+    return items
+
+
+def _item(index, size):
+    return {
+        'id' : '{:012d}'.format(index),
+        'name' : 'Item {}'.format(index),
+        'rating' : 4.2,
+        'types' : ['point_of_interest', 'establishment'],
+        'geometry' : {'location' : {'lat' : 47.6097, 'lng' : -122.3331}},
+        'padding' : 'x' * size,
+    }
+
+
+# Raised when a client hangs up before it has its response
+_HANG_UPS = (BrokenPipeError, ConnectionResetError)
+
+
+class _Server(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # A benchmark opens many connections at once, and a connect dropped
+    # from a full backlog stalls for a second before it is retried
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], _HANG_UPS):
+            super(_Server, self).handle_error(request, client_address)
+
+
+class MockService(object):
+    """
+    :param config: a service spec as accepted by load_service
+    :param latency: seconds to wait before answering each call
+    :param jitter: random extra latency of up to this many seconds
+    :param items: number of items listed by each response
+    :param item_size: bytes of padding in every item
+    :param error_rate: share of calls answered with error_status
+    :param pages: pages served to paginated resources
+    :param seed: seed of the random error and jitter decisions
+    :param max_age: when given, successful responses carry an ETag and
+        a Cache-Control max-age of this many seconds, and calls sending
+        a matching If-None-Match are answered 304 Not Modified
+    :param retry_after: when given, the failed calls carry a Retry-After
+        of this many seconds
+    """
+    def __init__(self, config, latency=0.0, jitter=0.0, items=10, item_size=100,
+                 error_rate=0.0, error_status=503, pages=3, host='127.0.0.1', port=0,
+                 seed=None, max_age=None, retry_after=None):
+        if not isinstance(config, dict):
+            config = load_config(pathlib.Path(config))
+        self.spec = config
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.pages = pages
+        self.max_age = max_age
+        self.retry_after = retry_after
+        self.calls = defaultdict(int)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        base_path = urlsplit(config['base_url']).path.rstrip('/')
+        self._routes = {}
+        for name, defn in config['apis'].items():
+            steps = _items_path(defn)
+            page = json.dumps([_item(i, item_size) for i in range(items)])
+            if steps[0] == _ITEM:
+                # The body is the array itself
+                field, page = None, _nest(steps, page)
+            else:
+                field, page = steps[0], _nest(steps[1:], page)
+            self._routes[base_path + defn['url']] = (name, defn, field, page)
+
+        self._server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        base_path = urlsplit(self.spec['base_url']).path
+        return 'http://{}:{}{}'.format(host, port, base_path)
+
+    @property
+    def config(self):
+        """
+        The spec with its base url pointing at the mock.
+        """
+        config = dict(self.spec)
+        config['base_url'] = self.base_url
+        return config
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='rekt-mock', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _decide(self):
+        with self._lock:
+            failed = self.error_rate and self._random.random() < self.error_rate
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        return failed, delay
+
+    def respond(self, method, path, query):
+        """
+        The status and body answering a call, after sleeping its latency.
+        """
+        route = self._routes.get(path)
+        if route is None or method not in route[1]:
+            return 404, json.dumps({'status' : 'NOT_FOUND'})
+
+        name, defn, field, page = route
+        with self._lock:
+            self.calls[(name, method)] += 1
+
+        failed, delay = self._decide()
+        if delay:
+            time.sleep(delay)
+        if failed:
+            return self.error_status, json.dumps({'status' : 'UNKNOWN_ERROR'})
+
+        if field is None:
+            return 200, page
+
+        extra = ''
+        paginate = defn.get('paginate')
+        if paginate:
+            cursor = query.get(paginate['cursor'])
+            number = int(cursor[0]) if cursor and cursor[0].isdigit() else 1
+            if number < self.pages:
+                extra = ', {}: "{}"'.format(json.dumps(paginate['token']), number + 1)
+
+        return 200, '{{"status": "OK", {}: {}{}}}'.format(json.dumps(field), page, extra)
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _serve(self):
+                try:
+                    self._respond()
+                except _HANG_UPS:
+                    self.close_connection = True
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode('utf-8') if length else ''
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+                query.update(parse_qs(body))
+
+                status, content = mock.respond(self.command, url.path, query)
+                content = content.encode('utf-8')
+                headers = {'Content-Type' : 'application/json; charset=UTF-8'}
+                if mock.max_age is not None and status == 200:
+                    headers['ETag'] = '"{}"'.format(hashlib.sha1(content).hexdigest())
+                    headers['Cache-Control'] = 'max-age={}'.format(mock.max_age)
+                    if self.headers.get('If-None-Match') == headers['ETag']:
+                        status, content = 304, b''
+                if mock.retry_after is not None and status == mock.error_status:
+                    headers['Retry-After'] = str(mock.retry_after)
+
+                self.send_response(status)
+                for name, value in sorted(headers.items()):
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        for verb in HTTPVerb:
+            setattr(Handler, 'do_' + verb.name, Handler._serve)
+
+        return Handler
+
+
+def resolve_spec(name):
+    """
+    Path of a spec file, given as a path or the name of a builtin spec.
+    """
+    path = pathlib.Path(name)
+    if path.exists():
+        return path
+    return builtin_config_path(name)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser('rekt.mock')
+    parser.add_argument('spec', help='path or name of a builtin spec, e.g. googleplaces')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--items', type=int, default=10)
+    parser.add_argument('--item-size', type=int, default=100)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--pages', type=int, default=3)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--max-age', type=float,
+                        help='send ETag and Cache-Control max-age, answer revalidations 304')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mock = MockService(resolve_spec(args.spec), latency=args.latency, jitter=args.jitter,
+                       items=args.items, item_size=args.item_size, error_rate=args.error_rate,
+                       error_status=args.error_status, pages=args.pages, host=args.host,
+                       port=args.port, seed=args.seed, max_age=args.max_age)
+    print(mock.base_url)
+    sys.stdout.flush()
+    try:
+        mock._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
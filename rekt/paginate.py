@@ -0,0 +1,180 @@
+"""
+Iteration over paginated resources.
+
+Resources declare how their pages are chained in the spec:
+
+    paginate : { token : next_page_token, cursor : pagetoken, items : results }
+
+token is the response field holding the cursor of the next page, cursor
+the request parameter it is sent back in, and items the response field
+listing the results of a page. Optionally page_size names the request
+parameter setting the number of results per page, and delay is the
+number of seconds a new token takes to become valid upstream.
+
+With a rekt.deadline.Deadline the iteration stops with
+DeadlineExceededError once it runs out of time, and closing the
+iteration cancels the deadline so that a page fetched ahead is
+abandoned.
+"""
+import time
+import threading
+
+from collections import namedtuple, deque
+
+__all__ = ['PageScheme', 'create_page_scheme', 'iter_pages', 'iter_items']
+
+#: The pagination scheme of a resource, see the module docs.
+PageScheme = namedtuple('PageScheme', ('token', 'cursor', 'items', 'page_size', 'delay'))
+
+_SCHEME_DEFAULTS = {'items' : 'results', 'page_size' : None, 'delay' : 0}
+
+
+def create_page_scheme(api):
+    """
+    The PageScheme declared by the resource spec, or None when the
+    resource is not paginated.
+    """
+    spec = api.options.get('paginate')
+    if not spec:
+        return None
+
+    unknown = set(spec) - set(PageScheme._fields)
+    if unknown:
+        raise ValueError('Unknown paginate settings for {}: {}'.format(api.name, sorted(unknown)))
+
+    settings = dict(_SCHEME_DEFAULTS)
+    settings.update(spec)
+    for field in ('token', 'cursor'):
+        if not settings.get(field):
+            raise ValueError('paginate for {} requires a {}'.format(api.name, field))
+
+    return PageScheme(**settings)
+
+
+class _PageFetcher(object):
+    """
+    Chains page fetches on an executor. A fetch is started as soon as
+    the token of the previous page is known, as long as fewer than
+    max_buffered fetched pages are waiting to be consumed, and never
+    beyond max_pages pages.
+    """
+    def __init__(self, submit, fetch, scheme, params, max_buffered, max_pages=None,
+                 deadline=None):
+        self._submit = submit
+        self._fetch = fetch
+        self._scheme = scheme
+        self._deadline = deadline
+        self.max_buffered = max_buffered
+        self._unstarted = max_pages
+        # Reentrant since a done callback can run inline in submit
+        self._cond = threading.Condition(threading.RLock())
+        self._pages = deque()
+        self._next = (params, 0.0)
+        self._in_flight = None
+        self._closed = False
+
+    def _start(self, force=False):
+        # Called with the lock held
+        if self._closed or self._in_flight is not None or self._next is None:
+            return
+        if self._unstarted == 0:
+            self._next = None
+            return
+        if not force and len(self._pages) >= self.max_buffered:
+            return
+
+        (params, ready), self._next = self._next, None
+        if self._unstarted is not None:
+            self._unstarted -= 1
+        deadline = self._deadline
+
+        def fetch():
+            wait = ready - time.monotonic()
+            if wait > 0:
+                if deadline is None:
+                    time.sleep(wait)
+                else:
+                    deadline.sleep(wait)
+            return self._fetch(params)
+
+        self._in_flight = future = self._submit(fetch)
+        future.add_done_callback(lambda f: self._done(params, f))
+
+    def _done(self, params, future):
+        with self._cond:
+            self._in_flight = None
+            self._pages.append(future)
+            if not future.cancelled() and future.exception() is None:
+                token = future.result().get(self._scheme.token)
+                if token:
+                    params = dict(params)
+                    params[self._scheme.cursor] = token
+                    self._next = (params, time.monotonic() + self._scheme.delay)
+            self._start()
+            self._cond.notify_all()
+
+    def next_page(self):
+        """
+        Block until the next page has been fetched and return it, or None
+        after the last page.
+        """
+        with self._cond:
+            while not self._pages:
+                if self._in_flight is None:
+                    if self._next is None:
+                        return None
+                    self._start(force=True)
+                    continue
+                self._cond.wait()
+
+            future = self._pages.popleft()
+            self._start()
+
+        return future.result()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            if self._in_flight is not None:
+                self._in_flight.cancel()
+                if self._deadline is not None:
+                    self._deadline.cancel()
+
+
+def iter_pages(submit, fetch, scheme, params, max_buffered=1, max_pages=None, deadline=None):
+    """
+    Yield the responses of the pages of a paginated resource starting
+    with the request params, fetching the following pages ahead of the
+    consumer.
+
+    :param submit: callable taking a function and returning a
+        concurrent.futures.Future for running it, e.g. executor.submit
+    :param fetch: callable taking the request params of a page and
+        returning its response
+    :param max_buffered: how many fetched pages may wait to be consumed
+        before fetching ahead pauses
+    :param max_pages: stop after this many pages
+    :param deadline: rekt.deadline.Deadline of the iteration, checked by
+        fetch and cancelled when the iteration is closed
+    """
+    if max_buffered < 0:
+        raise ValueError('max_buffered must not be negative')
+
+    fetcher = _PageFetcher(submit, fetch, scheme, params, max_buffered, max_pages, deadline)
+    try:
+        while True:
+            page = fetcher.next_page()
+            if page is None:
+                return
+            yield page
+    finally:
+        fetcher.close()
+
+
+def iter_items(pages, scheme):
+    """
+    Yield the items listed by each page.
+    """
+    for page in pages:
+        for item in page.get(scheme.items) or ():
+            yield item
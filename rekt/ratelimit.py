@@ -0,0 +1,133 @@
+"""
+Client side rate limiting.
+
+Specs declare limits for the whole service or for a single resource:
+
+    rate_limit : { qps : 50, burst : 50, daily_quota : 100000 }
+
+and the generated Client paces its calls to stay within them instead of
+bursting and failing with OVER_QUERY_LIMIT or 429 responses.
+"""
+import time
+import threading
+
+from collections import namedtuple
+
+from rekt.exceptions import QuotaExceededError
+
+__all__ = ['RateLimitStats', 'TokenBucket', 'create_rate_limits']
+
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+#: Snapshot of a TokenBucket. tokens is negative while callers are
+#: queued for future tokens, daily_remaining is None without a quota.
+RateLimitStats = namedtuple('RateLimitStats',
+    ('qps', 'burst', 'tokens', 'daily_quota', 'daily_remaining', 'throttled', 'throttled_seconds'))
+
+
+class TokenBucket(object):
+    """
+    Token bucket allowing qps calls per second on average with bursts of
+    up to burst calls, and optionally at most daily_quota calls per UTC
+    day.
+
+    Callers reserve a token up front and then sleep until it is due, so
+    concurrent callers are paced evenly in arrival order rather than
+    polling for tokens.
+    """
+    def __init__(self, qps, burst=None, daily_quota=None):
+        if qps <= 0:
+            raise ValueError('qps must be positive')
+
+        self.qps = float(qps)
+        self.burst = float(burst if burst is not None else max(qps, 1))
+        self.daily_quota = daily_quota
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._day = self._today()
+        self._used_today = 0
+        self._throttled = 0
+        self._throttled_seconds = 0.0
+
+    @staticmethod
+    def _today():
+        return int(time.time() // _SECONDS_PER_DAY)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.qps)
+        self._updated = now
+
+        today = self._today()
+        if today != self._day:
+            self._day, self._used_today = today, 0
+
+    def reserve(self):
+        """
+        Take a token and return the number of seconds the caller has to
+        wait before using it.
+        """
+        with self._lock:
+            self._refill()
+            if self.daily_quota is not None and self._used_today >= self.daily_quota:
+                raise QuotaExceededError('Daily quota of {} calls used up'.format(self.daily_quota))
+
+            self._used_today += 1
+            self._tokens -= 1
+            wait = -self._tokens / self.qps if self._tokens < 0 else 0.0
+            if wait > 0:
+                self._throttled += 1
+                self._throttled_seconds += wait
+
+            return wait
+
+    def release(self):
+        """
+        Give back a reserved token that will not be used, along with its
+        share of the daily quota.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.burst, self._tokens + 1)
+            self._used_today = max(self._used_today - 1, 0)
+
+    def acquire(self):
+        """
+        Block until the caller is allowed to make a call.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    @property
+    def stats(self):
+        with self._lock:
+            self._refill()
+            remaining = None
+            if self.daily_quota is not None:
+                remaining = max(self.daily_quota - self._used_today, 0)
+
+            return RateLimitStats(self.qps, self.burst, self._tokens, self.daily_quota,
+                                  remaining, self._throttled, self._throttled_seconds)
+
+
+def _bucket(spec):
+    return TokenBucket(spec['qps'], spec.get('burst'), spec.get('daily_quota'))
+
+
+def create_rate_limits(service_name, service_options, apis):
+    """
+    Create the token buckets declared by the rate_limit options of a
+    service and its resources, keyed by service or resource name.
+    """
+    limits = {}
+    if service_options.get('rate_limit'):
+        limits[service_name] = _bucket(service_options['rate_limit'])
+
+    for api in apis:
+        if api.options.get('rate_limit'):
+            limits[api.name] = _bucket(api.options['rate_limit'])
+
+    return limits
@@ -0,0 +1,353 @@
+"""
+Response representations for generated clients.
+
+By default every json object of a response is turned into a
+DynamicObject by the json object hook while the body is parsed. In lazy
+mode the body is parsed into plain dicts and lists by the C accelerated
+json parser, and LazyObject/LazyList views are only created for the
+nodes that are actually accessed. The dict and raw modes skip the
+wrapping, or the decoding as well, for callers that only pass the
+payload on.
+
+In compact mode every json object becomes a CompactObject holding only
+its values, in slots. The keys are stored once by the class of its
+layout, shared by every object of the response class with the same
+keys. A resource can seed layouts in its spec for objects whose
+optional keys come and go, and any object with a subset of the keys of
+a seeded layout shares it:
+
+    fields : [[place_id, name, geometry, rating, types, vicinity]]
+
+The keys of objects sharing a seeded layout iterate in the seed order.
+
+CompactObjects hold no reference to themselves, so unlike
+DynamicObjects they are freed as soon as they are unused without
+waiting for the cyclic garbage collector.
+"""
+import weakref
+import collections
+import collections.abc
+
+from enum import Enum
+
+__all__ = ['ResponseMode', 'LazyObject', 'LazyList', 'lazy_response_class', 'CompactObject',
+           'Layouts', 'compact_layouts']
+
+# Most key layouts kept per response class, the objects of any further
+# layouts are LazyObject views instead
+_MAX_LAYOUTS = 256
+# Value of the keys of a seeded layout an object does not have
+_MISSING = object()
+
+
+class ResponseMode(Enum):
+    #: every json object becomes a DynamicObject subclass up front
+    object = 'object'
+    #: a read only LazyObject view over the plain parsed body
+    lazy = 'lazy'
+    #: every json object becomes a read only CompactObject up front
+    compact = 'compact'
+    #: the plain dicts and lists from the decoder
+    dict = 'dict'
+    #: the undecoded body as bytes
+    raw = 'raw'
+
+
+def _wrap(value):
+    if isinstance(value, dict):
+        return LazyObject(value)
+    elif isinstance(value, list):
+        return LazyList(value)
+    return value
+
+
+class LazyObject(collections.abc.Mapping):
+    """
+    Read only view of a parsed json object with the same access rules
+    as DynamicObject: .attr and ['key'] both work and keys that are not
+    present are None. Nested objects and arrays are wrapped in views of
+    their own only when they are accessed.
+
+    Unlike DynamicObject this is not a dict subclass, dict(view) or the
+    plain data in view._data can be used where a real dict is needed.
+    As with DynamicObject, keys such as items or get shadow the methods
+    of the same name when accessed with .attr.
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data=None):
+        object.__setattr__(self, '_data', {} if data is None else data)
+
+    def __getitem__(self, key):
+        return _wrap(self._data.get(key))
+
+    def __getattribute__(self, key):
+        if not key.startswith('_'):
+            data = object.__getattribute__(self, '_data')
+            if key in data:
+                return _wrap(data[key])
+        return object.__getattribute__(self, key)
+
+    def __getattr__(self, key):
+        if key.startswith('__'):
+            raise AttributeError(key)
+        return _wrap(self._data.get(key))
+
+    def __setattr__(self, key, value):
+        raise AttributeError('{} is read only'.format(self.__class__.__name__))
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyObject):
+            other = other._data
+        return self._data == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def get(self, key, default=None):
+        return _wrap(self._data[key]) if key in self._data else default
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self._data)
+
+    def __reduce__(self):
+        # Like DynamicObject, generated subclasses cannot be looked up by
+        # pickle so they unpickle as the base class
+        return (LazyObject, (self._data,))
+
+    def __dir__(self):
+        return list(self._data)
+
+
+class LazyList(collections.abc.Sequence):
+    """
+    Read only view of a parsed json array whose items are wrapped in
+    views as they are accessed.
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data=None):
+        self._data = [] if data is None else data
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LazyList(self._data[index])
+        return _wrap(self._data[index])
+
+    def __iter__(self):
+        return (_wrap(item) for item in self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyList):
+            other = other._data
+        return self._data == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self._data)
+
+    def __reduce__(self):
+        return (LazyList, (self._data,))
+
+
+_LAZY_RESPONSE_CLASSES = weakref.WeakKeyDictionary()
+
+def lazy_response_class(ResponseClass):
+    """
+    The LazyObject subclass sharing the name of a generated response
+    class, so lazy responses still report e.g. GetPlacesResponse.
+    """
+    LazyClass = _LAZY_RESPONSE_CLASSES.get(ResponseClass)
+    if LazyClass is None:
+        LazyClass = type(ResponseClass.__name__, (LazyObject,), {'__slots__' : ()})
+        _LAZY_RESPONSE_CLASSES[ResponseClass] = LazyClass
+    return LazyClass
+
+
+class CompactObject(collections.abc.Mapping):
+    """
+    Read only json object with the same access rules as DynamicObject.
+    Its class, one per key layout, stores the values in slots and holds
+    the keys, so an object costs little more than a tuple of its values.
+    Keys such as items or get shadow the methods of the same name when
+    accessed with .attr.
+    """
+    __slots__ = ()
+    #: the keys of the layout and the getter of the value of each
+    _fields = ()
+    _index = {}
+    #: whether every object has all the keys, false for seeded layouts
+    _dense = True
+
+    def __getitem__(self, key):
+        getter = self._index.get(key)
+        if getter is None:
+            return None
+        value = getter(self)
+        return None if value is _MISSING else value
+
+    def __getattribute__(self, key):
+        if not key.startswith('_'):
+            getter = type(self)._index.get(key)
+            if getter is not None:
+                value = getter(self)
+                if value is not _MISSING:
+                    return value
+        return object.__getattribute__(self, key)
+
+    def __getattr__(self, key):
+        if key.startswith('__'):
+            raise AttributeError(key)
+        return self[key]
+
+    def __contains__(self, key):
+        getter = self._index.get(key)
+        return getter is not None and getter(self) is not _MISSING
+
+    def __iter__(self):
+        if self._dense:
+            return iter(self._fields)
+        return (k for k in self._fields if self._index[k](self) is not _MISSING)
+
+    def __len__(self):
+        if self._dense:
+            return len(self._fields)
+        return sum([1 for k in self])
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, dict(self))
+
+    def __reduce__(self):
+        # Unpickled objects share the layouts of their class name again
+        keys = tuple(self)
+        return (_restore_compact, (self.__class__.__name__, keys, tuple([self[k] for k in keys])))
+
+    def __dir__(self):
+        return list(self)
+
+
+def _layout_class(name, fields, dense=True):
+    # Keys need not be identifiers so the slots are numbered, and like
+    # namedtuple the constructor is compiled to fill them all at once
+    slots = tuple(['_{}'.format(i) for i in range(len(fields))])
+    if slots:
+        source = 'def __init__(self, values):\n    {}, = values\n'.format(
+            ', '.join(['self.' + slot for slot in slots]))
+    else:
+        source = 'def __init__(self, values):\n    pass\n'
+    namespace = {}
+    exec(source, namespace)
+
+    Layout = type(name, (CompactObject,), {
+        '__slots__' : slots, '__init__' : namespace['__init__'],
+        '_fields' : fields, '_dense' : dense})
+    Layout._index = dict([(k, getattr(Layout, slot).__get__) for k, slot in zip(fields, slots)])
+    return Layout
+
+
+# The layouts of unpickled objects by class name, bounded like Layouts
+_RESTORED_LAYOUTS = collections.defaultdict(dict)
+
+def _restore_compact(name, fields, values):
+    layouts = _RESTORED_LAYOUTS[name]
+    Layout = layouts.get(fields)
+    if Layout is None:
+        if len(layouts) >= _MAX_LAYOUTS:
+            return LazyObject(dict(zip(fields, values)))
+        Layout = layouts.setdefault(fields, _layout_class(name, fields))
+    return Layout(values)
+
+
+class Layouts(object):
+    """
+    The key layouts of the CompactObjects of one response class. make is
+    the json object hook turning each parsed dict into a CompactObject.
+
+    :param name: class name of the objects
+    :param seeds: lists of keys of the seeded layouts
+    :param fallback: called with the dicts past max_layouts layouts
+    """
+    def __init__(self, name, seeds=(), fallback=dict, max_layouts=_MAX_LAYOUTS):
+        self.name = name
+        self.fallback = fallback
+        self.max_layouts = max_layouts
+        self._seeds = [_layout_class(name, tuple(fields), dense=False) for fields in seeds]
+        # Object keys, in order, to their layout class and, for seeded
+        # layouts, a dict of every key of the layout set to _MISSING
+        self._layouts = {}
+
+    def __len__(self):
+        return len(self._layouts)
+
+    def make(self, obj):
+        # The object hook runs for every json object, so the common case
+        # of a known dense layout stays inline
+        keys = tuple(obj)
+        layout = self._layouts.get(keys)
+        if layout is None:
+            layout = self._layout(keys)
+            if layout is None:
+                return self.fallback(obj)
+
+        Layout, missing = layout
+        if missing is None:
+            return Layout(obj.values())
+
+        # Updating keeps the order of the layout keys
+        values = missing.copy()
+        values.update(obj)
+        return Layout(values.values())
+
+    def _layout(self, keys):
+        for Layout in self._seeds:
+            if Layout._index.keys() >= set(keys):
+                layout = (Layout, dict.fromkeys(Layout._fields, _MISSING))
+                break
+        else:
+            if len(self._layouts) >= self.max_layouts:
+                return None
+            layout = (_layout_class(self.name, keys), None)
+
+        # Racing threads may both add a layout for the same keys, which
+        # only costs a class
+        self._layouts[keys] = layout
+        return layout
+
+
+_COMPACT_LAYOUTS = weakref.WeakKeyDictionary()
+
+def compact_layouts(ResponseClass, fields=None):
+    """
+    The Layouts of a generated response class, seeded with the fields
+    from its resource spec: a list of keys, or a list of lists of keys
+    for several layouts.
+    """
+    layouts = _COMPACT_LAYOUTS.get(ResponseClass)
+    if layouts is None:
+        seeds = fields or ()
+        if seeds and all([isinstance(f, str) for f in seeds]):
+            seeds = [seeds]
+        layouts = Layouts(ResponseClass.__name__, seeds, lazy_response_class(ResponseClass))
+        _COMPACT_LAYOUTS[ResponseClass] = layouts
+    return layouts
@@ -0,0 +1,189 @@
+"""
+Retries with exponential backoff for generated clients.
+
+A client wide RetryPolicy can be passed to the Client and resources can
+override any of its settings in the spec:
+
+    retry : { max_attempts : 5, statuses : [429, 503], backoff : 0.5 }
+
+Every retry is paid for out of a RetryBudget shared by the whole client,
+which caps retries at a fraction of the calls made so that retrying
+cannot multiply the load on an upstream that is already struggling.
+"""
+import time
+import random
+import threading
+import email.utils
+
+from collections import namedtuple, deque
+
+import requests.exceptions
+
+from rekt.httputils import HTTPStatus
+
+__all__ = ['RetryPolicy', 'RetryBudget', 'RetryStats', 'create_retry_policies']
+
+#: Counters of a RetryBudget. calls are first attempts, retries the
+#: extra attempts made, and rejected the retries refused by the budget.
+RetryStats = namedtuple('RetryStats', ('calls', 'retries', 'rejected'))
+
+_RETRY_STATUSES = (HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.INTERNAL_SERVER_ERROR,
+                   HTTPStatus.BAD_GATEWAY, HTTPStatus.SERVICE_UNAVAILABLE,
+                   HTTPStatus.GATEWAY_TIMEOUT)
+_RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+_RETRY_VERBS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+_SPEC_FIELDS = ('max_attempts', 'statuses', 'verbs', 'backoff', 'max_backoff',
+                'jitter', 'respect_retry_after')
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait according to a Retry-After header holding either a
+    number of seconds or an HTTP date, or None if it cannot be parsed.
+    """
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.mktime_tz(email.utils.parsedate_tz(value)) - time.time(), 0.0)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+class RetryPolicy(object):
+    """
+    Which failures of a call are retried and how long to wait between
+    attempts.
+
+    :param max_attempts: total attempts including the first one
+    :param statuses: response status codes to retry
+    :param exceptions: exception types raised by the transport to retry
+    :param verbs: names of the http verbs that are safe to retry
+    :param backoff: base delay, the nth retry waits up to backoff * 2**n
+    :param max_backoff: upper bound of any delay, Retry-After included
+    :param jitter: wait a uniformly random part of the delay ("full
+        jitter") so that failed clients do not retry in lock step
+    :param respect_retry_after: wait at least as long as the
+        Retry-After header of the response asks, and do not retry at
+        all when it asks for longer than max_backoff
+    """
+    def __init__(self, max_attempts=3, statuses=_RETRY_STATUSES, exceptions=_RETRY_EXCEPTIONS,
+                 verbs=_RETRY_VERBS, backoff=0.1, max_backoff=10.0, jitter=True,
+                 respect_retry_after=True):
+        self.max_attempts = max_attempts
+        self.statuses = frozenset(statuses)
+        self.exceptions = tuple(exceptions)
+        self.verbs = frozenset(verbs)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+
+    def __repr__(self):
+        return '<{} max_attempts={} statuses={}>'.format(
+            self.__class__.__name__, self.max_attempts, sorted(self.statuses))
+
+    def replace(self, **overrides):
+        """
+        A copy of the policy with some of its settings replaced.
+        """
+        settings = dict(self.__dict__)
+        settings.update(overrides)
+        return self.__class__(**settings)
+
+    def retries(self, verb):
+        return self.max_attempts > 1 and verb.name in self.verbs
+
+    def delay(self, retry, response=None):
+        """
+        Seconds to wait before the retry numbered from 0, None when the
+        response asks to retry only after max_backoff.
+        """
+        delay = min(self.max_backoff, self.backoff * (2 ** retry))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        if self.respect_retry_after and response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                # Retrying sooner than asked would fail again, so a long
+                # Retry-After fails fast instead of holding the thread
+                if retry_after > self.max_backoff:
+                    return None
+                delay = max(delay, retry_after)
+
+        return delay
+
+
+class RetryBudget(object):
+    """
+    Allows retries to add at most ratio extra calls on top of the calls
+    made in the last window seconds, plus min_per_second retries a
+    second so that a client making few calls can still retry.
+    """
+    def __init__(self, ratio=0.1, min_per_second=1.0, window=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        self._lock = threading.Lock()
+        self._slots = deque()
+        self._calls = 0
+        self._retries = 0
+        self._rejected = 0
+
+    def _slot(self):
+        # Per second [second, calls, retries] counters covering the window
+        now = int(time.monotonic())
+        while self._slots and self._slots[0][0] <= now - self.window:
+            self._slots.popleft()
+        if not self._slots or self._slots[-1][0] != now:
+            self._slots.append([now, 0, 0])
+        return self._slots[-1]
+
+    def record_call(self):
+        with self._lock:
+            self._slot()[1] += 1
+            self._calls += 1
+
+    def try_retry(self):
+        """
+        Withdraw a retry from the budget, returns False when it is spent.
+        """
+        with self._lock:
+            slot = self._slot()
+            calls = sum(s[1] for s in self._slots)
+            retries = sum(s[2] for s in self._slots)
+            if retries >= calls * self.ratio + self.min_per_second * self.window:
+                self._rejected += 1
+                return False
+
+            slot[2] += 1
+            self._retries += 1
+            return True
+
+    @property
+    def stats(self):
+        with self._lock:
+            return RetryStats(self._calls, self._retries, self._rejected)
+
+
+def create_retry_policies(policy, apis):
+    """
+    The RetryPolicy for each resource name, made from the client policy
+    with the retry settings of the resource spec applied on top. A
+    resource gets no policy when neither sets one.
+    """
+    policies = {}
+    for api in apis:
+        spec = api.options.get('retry')
+        if spec is False or (spec is None and policy is None):
+            policies[api.name] = None
+            continue
+
+        overrides = dict([(k, v) for k, v in (spec or {}).items() if k in _SPEC_FIELDS])
+        policies[api.name] = (policy or RetryPolicy()).replace(**overrides)
+
+    return policies
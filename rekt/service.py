@@ -1,5 +1,6 @@
 import sys
 import imp
+import time
 import itertools
 import collections.abc
 import pathlib
@@ -19,19 +20,45 @@ else:
 
 from rekt.httputils import HTTPVerb, ArgsLocation, _ARGS_LOCATION_BY_VERB
 from rekt.utils import (_NULL_OBJECT, read_only_dict, camel_case_to_snake_case, load_config,
-                        api_method_name, async_api_method_name)
+                        api_method_name, async_api_method_name, batch_api_method_name,
+                        iter_api_method_name)
+from rekt.batch import iter_batch
+from rekt.cache import (cache_key, resource_ttl, resource_statuses, cacheable, http_ttl,
+                        conditional_headers)
+from rekt.coalesce import SingleFlight
+from rekt.ratelimit import create_rate_limits
+from rekt.retry import RetryBudget, create_retry_policies
+from rekt.breaker import create_circuit_breakers, is_failure
+from rekt.session import PoolConfig, create_session
+from rekt.exceptions import CircuitOpenError, DeadlineExceededError, QueueFullError
+from rekt.executor import (WorkerPool, ScheduledExecutor, shared_executor, REJECT,
+                           QUEUE_PER_WORKER)
+from rekt.deadline import Deadline, as_deadline, cancellable
+from rekt.response import ResponseMode, LazyList, lazy_response_class, compact_layouts
+from rekt.decoders import StdlibDecoder, get_decoder
+from rekt.stream import iter_path, parse_path
+from rekt.paginate import create_page_scheme, iter_pages, iter_items
+from rekt.hedge import create_hedge_policies
+from rekt.metrics import (InstrumentedExecutor, CACHE_HIT, CACHE_MISS, RETRY, RETRY_REJECTED,
+                          CIRCUIT_OPEN, HEDGE, HEDGE_REJECTED, HEDGE_WON)
 
 __all__ = ['load_service']
 
 _RESOURCE_NAME_FMT = '{}Resource'
-_RESOURCE_ATTRIBUTES = ('name', 'url', 'actions', 'request_classes', 'response_classes')
+_RESOURCE_ATTRIBUTES = ('name', 'url', 'actions', 'request_classes', 'response_classes', 'options',
+                        'request_builders')
 _REQUEST_NAME_FMT = '{}{}Request'
 _RESPONSE_NAME_FMT = '{}{}Response'
 _CLIENT_NAME_FMT = '{}Client'
+_SERVICE_KEYS = ('name', 'base_url', 'apis')
+_DEFAULT_DECODER = StdlibDecoder()
+_STREAM_CHUNK_SIZE = 2 ** 16
 
-# TODO: make configurable in the client
 _ASYNC_WORKER_THREAD_COUNT = 6
 
+#: Base class of the definition of every resource
+Resource = namedtuple('Resource', _RESOURCE_ATTRIBUTES)
+
 class DynamicObject(dict):
     """
     Base class for all response types. It acts like hybrid between a
@@ -75,6 +102,24 @@ class RestClient(object):
     def __repr__(self):
         return '<{}>'.format(self.__class__.__name__)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Wait for outstanding async calls, then shutdown the executor unless
+        it was passed in, and close every pooled connection held by the
+        client's session.
+        """
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=True)
+        self._session.close()
+
 
 def create_request_class(api, verb, args, defaults, BaseClass=DynamicObject):
     """
@@ -115,6 +160,71 @@ def create_request_class(api, verb, args, defaults, BaseClass=DynamicObject):
     return RequestClass
 
 
+#: A request compiled from the spec of a resource and verb. build(kwargs)
+#: validates the call arguments and returns the parameters to send with
+#: the spec defaults applied. location is where the verb sends them, and
+#: moved the parameters the spec sends in the other location.
+RequestBuilder = namedtuple('RequestBuilder', ('name', 'build', 'location', 'moved'))
+
+
+def create_request_builder(api, verb, spec):
+    """
+    Compile the argument spec of a resource and verb into a
+    RequestBuilder, so that calls only pay for a set lookup per argument.
+    """
+    name = _REQUEST_NAME_FMT.format(verb.name.title(), api)
+
+    location = _ARGS_LOCATION_BY_VERB.get(verb)
+    if location is None:
+        raise RuntimeError('{} is not a handled http verb'.format(verb))
+
+    signature = frozenset(spec)
+    defaults = {}
+    moved = set()
+    for arg, arg_spec in spec.items():
+        if not isinstance(arg_spec, dict):
+            continue
+        if arg_spec.get('default') is not None:
+            defaults[arg] = arg_spec['default']
+        if 'location' in arg_spec and ArgsLocation[arg_spec['location']] is not location:
+            moved.add(arg)
+
+    def build(kwargs):
+        if not signature.issuperset(kwargs):
+            invalid = next(k for k in kwargs if k not in signature)
+            raise TypeError('Argument {} not valid for {}'.format(invalid, name))
+
+        if not defaults:
+            return dict([(k, v) for k, v in kwargs.items() if v is not None])
+
+        # Explicitly passing None leaves out an argument with a default
+        params = dict(defaults)
+        for key, value in kwargs.items():
+            if value is None:
+                params.pop(key, None)
+            else:
+                params[key] = value
+        return params
+
+    return RequestBuilder(name, build, location, frozenset(moved))
+
+
+def request_arguments(builder, params):
+    """
+    Split the params of a call into the query string params and the body
+    data arguments of a request.
+    """
+    if builder.moved:
+        located = dict([(k, v) for k, v in params.items() if k not in builder.moved])
+        moved = dict([(k, v) for k, v in params.items() if k in builder.moved])
+    else:
+        located, moved = params, None
+
+    if builder.location is ArgsLocation.query_string:
+        return located, moved
+    return moved, located
+
+
 def create_response_class(api, verb):
     """
     """
@@ -124,10 +234,13 @@ def create_response_class(api, verb):
 
 def create_api_definition(api, defn, baseurl):
 
-    ResourceClass = namedtuple(_RESOURCE_NAME_FMT.format(api), _RESOURCE_ATTRIBUTES)
+    # A subclass named after the resource is much cheaper to create than
+    # another namedtuple
+    ResourceClass = type(_RESOURCE_NAME_FMT.format(api), (Resource,), {'__slots__' : ()})
 
     actions = []
     request_classes = {}
+    request_builders = {}
     response_classes = {}
 
     for verb in HTTPVerb:
@@ -141,50 +254,531 @@ def create_api_definition(api, defn, baseurl):
 
         actions.append(verb)
         request_classes[verb] = create_request_class(api, verb, defn[verb.name].keys(), defaults)
+        request_builders[verb] = create_request_builder(api, verb, defn[verb.name])
         response_classes[verb] = create_response_class(api, verb)
 
 
-    return ResourceClass(api, baseurl + defn['url'], actions, request_classes, response_classes)
+    # Anything besides the url and verbs configures the resource as a
+    # whole, e.g. cache : { ttl : 300 }
+    options = read_only_dict(dict([(k, v) for k, v in defn.items()
+                                   if k != 'url' and k not in HTTPVerb.__members__]))
 
+    return ResourceClass(api, baseurl + defn['url'], actions, request_classes,
+                         response_classes, options, request_builders)
 
-def create_api_call_func(api, verb):
+
+def build_request_params(api, verb, kwargs):
     """
-    From an api definition object create the related api call method
-    that will validate the arguments for the api call and then
-    dynamically dispatch the request to the appropriate requests module
-    convenience method for the specific HTTP verb .
+    Validate the keyword arguments of a call against the request class
+    for the resource and verb, and return the non-None parameters that
+    will be sent.
     """
+    return api.request_builders[verb].build(kwargs)
 
-    # Scopes some local context in which we can build
-    # request functions with reflection that primed with
-    # some static parameters.
-    def api_call_func(self, **kwargs):
 
-        request = api.request_classes[verb](**kwargs)
-        params = dict([ (k,v) for k,v in request.items() if v is not None ])
+def decode_content(api, verb, content, mode=ResponseMode.object, decoder=_DEFAULT_DECODER):
+    """
+    Deserialize a json response body as selected by the response mode:
+    into the response class of the resource and verb, a lazy view of it,
+    compact objects, plain dicts, or not at all.
+    """
+    if mode is ResponseMode.raw:
+        return content
+
+    ResponseClass = api.response_classes[verb]
+    if mode is ResponseMode.object:
+        # The object hook will convert all dictionaries from the json
+        # objects in the response to a . attribute access
+        object_hook = lambda obj: ResponseClass(obj)
+    elif mode is ResponseMode.compact:
+        ResponseClass = object_hook = compact_layouts(ResponseClass, api.options.get('fields')).make
+    else:
+        object_hook = None
+        if mode is ResponseMode.lazy:
+            ResponseClass = lazy_response_class(ResponseClass)
+        else:
+            ResponseClass = dict
 
+    try:
+        response = decoder.loads(content, object_hook)
+    except ValueError as e:
+        return ResponseClass({'content' : content})
 
-        if HTTPVerb.GET == verb:
-            raw_response = requests.get(api.url, params=params, **self.reqargs)
+    if mode is ResponseMode.lazy:
+        if isinstance(response, dict):
+            response = ResponseClass(response)
+        elif isinstance(response, list):
+            response = LazyList(response)
 
-        elif HTTPVerb.POST == verb:
-            raw_response = requests.post(api.url, data=params, **self.reqargs)
+    return response
 
+
+def parse_response(api, verb, raw_response, mode=ResponseMode.object, decoder=_DEFAULT_DECODER):
+    """
+    Raise for error statuses, otherwise deserialize the json body of a
+    requests Response according to the response mode.
+    """
+    if raw_response.status_code != HTTPStatus.OK:
+        raw_response.raise_for_status()
+
+    return decode_content(api, verb, raw_response.content, mode, decoder)
+
+
+def response_mode(client, mode):
+    """
+    The ResponseMode of a call, the client's unless the call overrides it.
+    """
+    return client.response_mode if mode is None else ResponseMode(mode)
+
+
+def send_api(client, api, verb, params, stream=False, deadline=None, headers=None):
+    """
+    Make a single attempt at sending the params for the resource and
+    verb over the client's session, once its rate limits and circuit
+    breaker allow it, and within the deadline when given. headers are
+    sent on top of the client's.
+    """
+    breaker = client.circuit_breakers.get(api.name)
+    if breaker is not None:
+        try:
+            breaker.allow()
+        except CircuitOpenError:
+            if client.metrics is not None:
+                client.metrics.on_event(api.name, CIRCUIT_OPEN)
+            raise
+
+    try:
+        _throttle(client, api, deadline)
+    except BaseException:
+        # The call was allowed but is never sent, a half open breaker
+        # must get its trial back
+        if breaker is not None:
+            breaker.release()
+        raise
+
+    if breaker is None:
+        return _send(client, api, verb, params, stream, deadline, headers)
+
+    started = time.monotonic()
+    try:
+        raw_response = _send(client, api, verb, params, stream, deadline, headers)
+    except concurrent.futures.CancelledError:
+        # Cancelled by the caller or as the losing attempt of a hedged
+        # call, which says nothing about the upstream
+        breaker.release()
+        raise
+    except BaseException:
+        breaker.record(True, time.monotonic() - started)
+        raise
+
+    breaker.record(is_failure(raw_response.status_code), time.monotonic() - started)
+    return raw_response
+
+
+def _throttle(client, api, deadline=None):
+    # Wait for a token of every rate limit of the resource, raises
+    # QuotaExceededError once a daily quota is spent. A call that does
+    # not get to wait for all of its tokens gives back those it took.
+    reserved, wait = [], 0.0
+    try:
+        for bucket in client._throttles[api.name]:
+            wait = max(wait, bucket.reserve())
+            reserved.append(bucket)
+        if wait > 0:
+            if deadline is None:
+                time.sleep(wait)
+            else:
+                deadline.sleep(wait)
+    except BaseException:
+        for bucket in reserved:
+            bucket.release()
+        raise
+
+
+def _send(client, api, verb, params, stream=False, deadline=None, headers=None):
+    query, data = request_arguments(api.request_builders[verb], params)
+    if client.metrics is None:
+        return _request(client, api, verb, query, data, stream, deadline, headers)
+
+    started = time.monotonic()
+    try:
+        raw_response = _request(client, api, verb, query, data, stream, deadline, headers)
+    except concurrent.futures.CancelledError:
+        raise
+    except BaseException as e:
+        client.metrics.on_request(api.name, verb.name, e.__class__.__name__,
+                                  time.monotonic() - started, None, 0, 0)
+        raise
+
+    record_response(client.metrics, api, verb, raw_response, time.monotonic() - started, stream)
+    return raw_response
+
+
+def _request(client, api, verb, query, data, stream=False, deadline=None, headers=None):
+    reqargs = client.reqargs
+    if headers:
+        reqargs = dict(reqargs, headers=dict(reqargs.get('headers') or {}, **headers))
+    if deadline is None:
+        return client._session.request(verb.name, api.url, params=query, data=data,
+                                       stream=stream, **reqargs)
+
+    # The attempt may take no longer than the time left, and the body is
+    # read in chunks so that a cancelled call stops between them
+    reqargs = dict(reqargs, timeout=deadline.timeout(reqargs.get('timeout')))
+    try:
+        raw_response = client._session.request(verb.name, api.url, params=query, data=data,
+                                               stream=True, **reqargs)
+        if not stream:
+            try:
+                raw_response._content = b''.join(
+                    _checked(raw_response.iter_content(_STREAM_CHUNK_SIZE), deadline))
+            except BaseException:
+                raw_response.close()
+                raise
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        if deadline.expired:
+            raise DeadlineExceededError('Deadline exceeded calling {}'.format(api.name)) from e
+        raise
+
+    return raw_response
+
+
+def _checked(chunks, deadline):
+    for chunk in chunks:
+        deadline.remaining()
+        yield chunk
+
+
+def record_response(hook, api, verb, raw_response, duration, streamed=False):
+    """
+    Report a finished request attempt to a metrics hook.
+    """
+    request = raw_response.request
+    bytes_out = len(request.url) + len(request.body or b'')
+    # The Content-Length of the body when the response has one, else the
+    # size of the body read, with the sync and asyncio transports alike.
+    # Streamed bodies are not read yet.
+    bytes_in = raw_response.headers.get('Content-Length')
+    if bytes_in is None:
+        bytes_in = 0 if streamed else len(raw_response.content)
+
+    # elapsed is the time until the response headers arrived
+    hook.on_request(api.name, verb.name, raw_response.status_code, duration,
+                    raw_response.elapsed.total_seconds(), bytes_out, int(bytes_in))
+
+
+def send_attempt(client, api, verb, params, stream=False, deadline=None, headers=None):
+    """
+    send_api, hedged when the client has a hedge policy for the resource
+    and the call is a GET whose response is not streamed.
+    """
+    policy = client.hedge_policies.get(api.name)
+    if policy is None or HTTPVerb.GET != verb or stream:
+        return send_api(client, api, verb, params, stream, deadline, headers)
+    return send_api_hedged(client, api, verb, params, policy, deadline, headers)
+
+
+def send_api_hedged(client, api, verb, params, policy, deadline=None, headers=None):
+    """
+    send_api on the client's hedge pool, sending a second attempt when
+    the first is still outstanding after the threshold of the policy and
+    its budget allows it. The first successful response is returned and
+    the other attempt is cancelled. While the pool is busy the call is
+    sent unhedged on the calling thread.
+    """
+    policy.record_call()
+    threshold = policy.threshold
+    started = time.monotonic()
+    parent = deadline or Deadline()
+    attempt = None
+    if threshold is not None:
+        attempt = _start_attempt(client, api, verb, params, parent, headers)
+
+    if attempt is None:
+        # Too few calls seen yet to know what slow is, or no worker free
+        raw_response = send_api(client, api, verb, params, deadline=deadline, headers=headers)
+        policy.observe(time.monotonic() - started)
+        return raw_response
+
+    attempts = [attempt]
+    done, _ = concurrent.futures.wait([attempt[0]], threshold)
+    if not done and parent.fits(0.0):
+        hedge = _start_attempt(client, api, verb, params, parent, headers) \
+            if policy.try_hedge() else None
+        if hedge is not None:
+            attempts.append(hedge)
+        if client.metrics is not None:
+            client.metrics.on_event(api.name, HEDGE_REJECTED if hedge is None else HEDGE)
+
+    winner = _first_response([future for future, _ in attempts])
+    for future, attempt_deadline in attempts:
+        if future is not winner:
+            attempt_deadline.cancel()
+            future.add_done_callback(_close_response)
+
+    raw_response = winner.result()
+    policy.observe(time.monotonic() - started)
+    if winner is not attempts[0][0]:
+        policy.record_win()
+        if client.metrics is not None:
+            client.metrics.on_event(api.name, HEDGE_WON)
+    return raw_response
+
+
+def _start_attempt(client, api, verb, params, deadline, headers=None):
+    # Each attempt can be cancelled on its own and stops with the call.
+    # None when every worker of the pool is busy, attempts never queue.
+    attempt_deadline = deadline.child()
+    try:
+        future = client._hedge_executor.submit(send_api, client, api, verb, params,
+                                               deadline=attempt_deadline, headers=headers)
+    except QueueFullError:
+        return None
+    return future, attempt_deadline
+
+
+def _first_response(futures):
+    # The first attempt answering with a response that is not a failure,
+    # otherwise the first one to finish
+    first, pending = None, futures
+    while pending:
+        done, pending = concurrent.futures.wait(
+            pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in [f for f in futures if f in done]:
+            if future.exception() is None and not is_failure(future.result().status_code):
+                return future
+            first = first or future
+    return first
+
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def send_api_with_retries(client, api, verb, params, policy, stream=False, deadline=None,
+                          headers=None):
+    """
+    send_api, retrying the failures covered by the retry policy for as
+    long as it has attempts left, the client retry budget allows and the
+    backoff ends before the deadline.
+    """
+    client.retry_budget.record_call()
+
+    for attempt in itertools.count(1):
+        try:
+            raw_response = send_attempt(client, api, verb, params, stream, deadline, headers)
+        except policy.exceptions:
+            delay = policy.delay(attempt - 1)
+            if not _try_retry(client, api, policy, attempt, delay, deadline):
+                raise
         else:
-            raise RuntimeError('{} is not a handled http verb'.format(verb))
+            if raw_response.status_code not in policy.statuses:
+                return raw_response
+            delay = policy.delay(attempt - 1, raw_response)
+            if delay is None or not _try_retry(client, api, policy, attempt, delay, deadline):
+                return raw_response
+            raw_response.close()
+
+        if deadline is None:
+            time.sleep(delay)
+        else:
+            deadline.sleep(delay)
 
-        if raw_response.status_code != HTTPStatus.OK:
-            raw_response.raise_for_status()
 
-        # The object hook will convert all dictionaries from the json
-        # objects in the response to a . attribute access
-        ResponseClass = api.response_classes[verb]
+def _try_retry(client, api, policy, attempt, delay, deadline=None):
+    # Retries that could not start before the deadline are given up
+    # without drawing on the budget
+    if attempt >= policy.max_attempts or (deadline is not None and not deadline.fits(delay)):
+        return False
+
+    allowed = client.retry_budget.try_retry()
+    if client.metrics is not None:
+        client.metrics.on_event(api.name, RETRY if allowed else RETRY_REJECTED)
+    return allowed
+
+
+def request_api(client, api, verb, params, stream=False, deadline=None, headers=None):
+    """
+    Send the params for the resource and verb, with retries when the
+    resource has a retry policy covering the verb.
+    """
+    policy = client._retry_policies[api.name]
+    if policy is not None and policy.retries(verb):
+        return send_api_with_retries(client, api, verb, params, policy, stream, deadline,
+                                     headers)
+    return send_attempt(client, api, verb, params, stream, deadline, headers)
+
+
+def fetch_api(client, api, verb, params, mode, key=None, ttl=None, deadline=None, entry=None):
+    """
+    Send the params for the resource and verb, retrying as configured,
+    and decode the response, caching its body under key when given.
+    With the stale CacheEntry of the call, the request is conditional on
+    its validators and a 304 answer is decoded from the entry.
+    """
+    headers = None if entry is None else conditional_headers(entry)
+    raw_response = request_api(client, api, verb, params, deadline=deadline, headers=headers)
+
+    if entry is not None:
+        revalidated = raw_response.status_code == HTTPStatus.NOT_MODIFIED
+        client.cache.count(revalidated)
+        if client.metrics is not None:
+            client.metrics.on_event(api.name, CACHE_HIT if revalidated else CACHE_MISS)
+        if revalidated:
+            # The 304 may carry new validators for the stored body
+            headers = raw_response.headers
+            client.cache.refresh(key, http_ttl(headers, ttl or 0) or 0, headers.get('ETag'),
+                                 headers.get('Last-Modified'))
+            return decode_content(api, verb, entry.content, mode, client.decoder)
+
+    response = parse_response(api, verb, raw_response, mode, client.decoder)
+    if key is not None and _cacheable(client, api, verb, raw_response, response, mode):
+        if client.http_cache:
+            store_response(client.cache, key, raw_response, ttl)
+        else:
+            client.cache.set(key, raw_response.content, ttl)
+
+    return response
+
+
+def _cacheable(client, api, verb, raw_response, response, mode):
+    # Other callers are served the cached body, which must not be the
+    # quota error or denial of this one
+    if mode is ResponseMode.raw:
+        response = decode_content(api, verb, raw_response.content, ResponseMode.dict,
+                                  client.decoder)
+    return cacheable(response, resource_statuses(api.options))
+
+
+def store_response(cache, key, raw_response, ttl=None):
+    """
+    Cache a response for as long as its caching headers allow, ttl when
+    they do not say, keeping its validators. Responses that are neither
+    fresh for a while nor can be revalidated are not stored.
+    """
+    headers = raw_response.headers
+    ttl = http_ttl(headers, ttl or 0)
+    etag, last_modified = headers.get('ETag'), headers.get('Last-Modified')
+    if ttl is None or (ttl <= 0 and etag is None and last_modified is None):
+        return
+    cache.set(key, raw_response.content, ttl, etag, last_modified)
+
+
+def flight_key(api, verb, params, mode):
+    """
+    The key of the calls that may share one request in flight. Unlike
+    the cache key it keeps the credentials, so that the denial or quota
+    error answering one caller is never handed to callers with another
+    api key.
+    """
+    return (cache_key(api.url, verb, params, exclude=()), mode)
+
+
+def call_api(client, api, verb, params, mode=None, coalesce=True, deadline=None):
+    """
+    Serve a call with validated params from the client's cache when
+    possible, otherwise fetch it, joining an identical call already in
+    flight when the client coalesces calls.
+    """
+    mode = response_mode(client, mode)
+    if HTTPVerb.GET != verb or (client.cache is None and client.coalescer is None):
+        return fetch_api(client, api, verb, params, mode, deadline=deadline)
+
+    key, ttl, entry, store = cache_key(api.url, verb, params), None, None, False
+    if client.cache is not None and client.http_cache:
+        # The response headers decide what is cached, unless the spec
+        # turns caching off for the resource. Stale entries are counted
+        # once revalidated.
+        store = api.options.get('cache') is not False
+        ttl = resource_ttl(api.options, client.cache)
+        entry = client.cache.lookup(key) if store else None
+        if store and (entry is None or entry.fresh):
+            client.cache.count(entry is not None)
+            if client.metrics is not None:
+                client.metrics.on_event(api.name, CACHE_MISS if entry is None else CACHE_HIT)
+        if entry is not None and entry.fresh:
+            return decode_content(api, verb, entry.content, mode, client.decoder)
+    elif client.cache is not None:
+        ttl = resource_ttl(api.options, client.cache)
+        content = client.cache.get(key) if ttl else None
+        store = bool(ttl)
+        if ttl and client.metrics is not None:
+            client.metrics.on_event(api.name, CACHE_MISS if content is None
+                                    else CACHE_HIT)
+        if content is not None:
+            return decode_content(api, verb, content, mode, client.decoder)
+
+    fetch = lambda: fetch_api(client, api, verb, params, mode, key if store else None, ttl,
+                              deadline, entry)
+    if coalesce and client.coalescer is not None:
+        # Calls joining one in flight wait for it no longer than their
+        # own deadline
         try:
-            response = raw_response.json(object_hook=lambda obj: ResponseClass(obj))
-        except ValueError as e:
-            response = ResponseClass({'content' : raw_response.content})
+            return client.coalescer.do(flight_key(api, verb, params, mode), fetch,
+                                       None if deadline is None else deadline.remaining())
+        except concurrent.futures.TimeoutError:
+            raise DeadlineExceededError('Deadline exceeded waiting for {}'.format(api.name))
 
-        return response
+    return fetch()
+
+
+def _iter_stream(api, verb, raw_response, path, mode, decoder, deadline=None):
+    try:
+        chunks = raw_response.iter_content(_STREAM_CHUNK_SIZE)
+        if deadline is not None:
+            chunks = _checked(chunks, deadline)
+        for element in iter_path(chunks, path):
+            yield decode_content(api, verb, element, mode, decoder)
+    finally:
+        raw_response.close()
+
+
+def stream_api(client, api, verb, params, path, mode=None, deadline=None):
+    """
+    Send a call and return a generator over the elements found at path
+    in the response body, decoded one at a time as the body is read.
+    path=True uses the stream path declared by the resource spec.
+    Streamed calls bypass the cache and coalescing, and the deadline
+    also bounds reading the body through the generator.
+    """
+    if path is True:
+        path = api.options.get('stream')
+        if path is None:
+            raise ValueError('{} does not declare a stream path'.format(api.name))
+    path = parse_path(path)
+    mode = response_mode(client, mode)
+
+    raw_response = request_api(client, api, verb, params, stream=True, deadline=deadline)
+    if raw_response.status_code != HTTPStatus.OK:
+        raw_response.close()
+        raw_response.raise_for_status()
+
+    return _iter_stream(api, verb, raw_response, path, mode, client.decoder, deadline)
+
+
+def create_api_call_func(api, verb):
+    """
+    From an api definition object create the related api call method
+    that will validate the arguments for the api call and then
+    dynamically dispatch the request to the appropriate requests module
+    convenience method for the specific HTTP verb .
+    """
+
+    # Scopes some local context in which we can build
+    # request functions with reflection that primed with
+    # some static parameters.
+    build = api.request_builders[verb].build
+
+    def api_call_func(self, **kwargs):
+
+        mode = kwargs.pop('_response_mode', None)
+        stream = kwargs.pop('_stream', None)
+        deadline = as_deadline(kwargs.pop('_timeout', None))
+        params = build(kwargs)
+        if stream:
+            return stream_api(self, api, verb, params, stream, mode, deadline)
+        return call_api(self, api, verb, params, mode, deadline=deadline)
 
     method_name = api_method_name(verb, api)
 
@@ -206,42 +800,258 @@ def create_async_api_call_func(api, verb):
     # Scopes some local context in which we can build
     # request functions with reflection that primed with
     # some static parameters.
+    priority, weight = resource_schedule(api.options)
+
     def api_call_func(self, **kwargs):
 
+        # The deadline is created up front so that it also covers the
+        # wait in the queue, and so that cancelling the future stops it
+        deadline = as_deadline(kwargs.pop('_timeout', None)) or Deadline()
+        executor = ScheduledExecutor(self._executor,
+                                     priority=kwargs.pop('_priority', priority),
+                                     tag=kwargs.pop('_tag', api.name), weight=weight,
+                                     deadline=queue_deadline(kwargs.pop('_deadline', None),
+                                                             deadline))
+
+        # Fail fast while the resource is down rather than filling the
+        # executor with calls that would only wait on it
+        breaker = self.circuit_breakers.get(api.name)
+        if breaker is not None:
+            try:
+                breaker.check()
+            except CircuitOpenError as e:
+                future = concurrent.futures.Future()
+                future.set_exception(e)
+                return future
+
+        if self.coalescer is not None and HTTPVerb.GET == verb and not kwargs.get('_stream'):
+            # Resolve the key up front so that calls joining one already
+            # in flight never take up a worker
+            try:
+                mode = response_mode(self, kwargs.pop('_response_mode', None))
+                params = build_request_params(api, verb, kwargs)
+            except Exception as e:
+                future = concurrent.futures.Future()
+                future.set_exception(e)
+                return future
+
+            # The coalesced fetch is shared, so it runs within the
+            # deadline of the call starting it and is not cancelled:
+            # cancelling the future of any caller only detaches that one
+            return self.coalescer.submit(flight_key(api, verb, params, mode), executor,
+                                         lambda: call_api(self, api, verb, params, mode,
+                                                          coalesce=False, deadline=deadline))
+
+        kwargs['_timeout'] = deadline
+
         def _async_call_handler():
             api_method = getattr(self, api_method_name(verb, api))
             return api_method(**kwargs)
 
-        return self._executor.submit(_async_call_handler)
+        return cancellable(lambda: executor.submit(_async_call_handler), deadline)
 
     method_name = async_api_method_name(verb, api)
 
     api_call_func.__name__ = method_name
-    api_call_func.__doc__ = "{}\nParameters:\n  {}".format(
-        method_name, '\n  '.join(api.request_classes[verb]().keys()))
+    api_call_func.__doc__ = "{}\nParameters:\n  {}\n\n{}".format(
+        method_name, '\n  '.join(api.request_classes[verb]().keys()), _SCHEDULE_DOC)
+
+    return api_call_func
+
+
+
+_SCHEDULE_DOC = """Scheduling:
+  _priority  higher priorities run first
+  _tag       calls share the workers fairly by tag, the resource name by default
+  _deadline  seconds the call may wait to start before it is dropped
+  _timeout   seconds the whole call may take, waiting to start included"""
+
+
+def resource_schedule(options):
+    """
+    The default priority and fair queuing weight of the async calls to a
+    resource, from schedule : { priority : 1, weight : 4 } in its spec.
+    """
+    spec = options.get('schedule') or {}
+    return spec.get('priority', 0), spec.get('weight', 1.0)
+
+
+def queue_deadline(seconds, deadline=None):
+    """
+    The time.monotonic() by which a call must start, seconds from now
+    and no later than the deadline of the whole call.
+    """
+    starts_by = None if seconds is None else time.monotonic() + seconds
+    if deadline is None or deadline.expires is None:
+        return starts_by
+    return deadline.expires if starts_by is None else min(starts_by, deadline.expires)
+
+
+def create_batch_api_call_func(api, verb):
+    """
+    From an api definition object create the related batch api call
+    method, which fans a lazy iterable of keyword argument dicts out to
+    the async api call method while keeping a bounded number in flight.
+    """
+    def api_call_func(self, calls, max_in_flight=None, ordered=False):
+        async_api_method = getattr(self, async_api_method_name(verb, api))
+        return iter_batch(lambda kwargs: async_api_method(**kwargs), calls,
+                          max_in_flight or self._thread_count, ordered)
+
+    method_name = batch_api_method_name(verb, api)
+
+    api_call_func.__name__ = method_name
+    api_call_func.__doc__ = """{}
+Call {} with each dict of keyword arguments from calls, keeping at most
+max_in_flight calls outstanding (defaults to the client thread count).
+
+Returns a generator of rekt.batch.BatchResult in completion order, or
+in the order of calls when ordered is set. Failed calls are yielded
+with the exception set rather than raised.
+""".format(method_name, api_method_name(verb, api))
 
     return api_call_func
 
 
+def create_iter_api_call_func(api, scheme):
+    """
+    From a paginated api definition object create the related iterator
+    method, which yields the items of every page of the GET call,
+    fetching following pages on the executor while the current one is
+    consumed.
+    """
+    verb = HTTPVerb.GET
+
+    def api_call_func(self, _max_buffered=1, _max_pages=None, _page_size=None, _timeout=None,
+                      **kwargs):
+        mode = response_mode(self, kwargs.pop('_response_mode', None))
+        if mode is ResponseMode.raw:
+            raise ValueError('Pages cannot be iterated in raw response mode')
+
+        if _page_size is not None:
+            if scheme.page_size is None:
+                raise ValueError('{} does not declare a page size parameter'.format(api.name))
+            kwargs[scheme.page_size] = _page_size
+
+        params = build_request_params(api, verb, kwargs)
+        # Cancelled when the iteration is closed so that a page still
+        # being fetched ahead is abandoned
+        deadline = Deadline(_timeout)
+        executor = ScheduledExecutor(self._executor, deadline=deadline.expires)
+        pages = iter_pages(executor.submit,
+                           lambda page_params: call_api(self, api, verb, page_params, mode,
+                                                        deadline=deadline),
+                           scheme, params, _max_buffered, _max_pages, deadline)
+        return iter_items(pages, scheme)
+
+    method_name = iter_api_method_name(api)
+
+    api_call_func.__name__ = method_name
+    api_call_func.__doc__ = """{}
+Call {} page after page, following the {} field of each response, and
+return a generator of the items listed in the {} field of the pages.
+
+The next page is fetched on the executor while the current one is
+consumed, with at most _max_buffered fetched pages waiting. _max_pages
+stops the iteration early, and _timeout bounds the whole iteration in
+seconds.
+""".format(method_name, api_method_name(verb, api), scheme.token, scheme.items)
+
+    return api_call_func
+
 
-def create_rest_client_class(name, apis, BaseClass=RestClient):
+def create_rest_client_class(name, apis, options=read_only_dict({}), BaseClass=RestClient):
     """
     Generate the api call functions and attach them to the generated
-    RestClient subclass with the name <Service>Client.
+    RestClient subclass with the name <Service>Client. options are the
+    service wide settings from the spec.
     """
 
     apis_with_actions = list(itertools.chain.from_iterable([ zip([api] * len(api.actions), api.actions) for api in apis]))
 
     api_funcs = [create_api_call_func(api, verb) for api, verb in apis_with_actions]
     api_funcs.extend([create_async_api_call_func(api, verb) for api, verb in apis_with_actions])
+    api_funcs.extend([create_batch_api_call_func(api, verb) for api, verb in apis_with_actions])
+
+    page_schemes = [(api, create_page_scheme(api)) for api in apis if HTTPVerb.GET in api.actions]
+    api_funcs.extend([create_iter_api_call_func(api, scheme) for api, scheme in page_schemes
+                      if scheme is not None])
     api_mapper = dict([ (f.__name__, f) for f in api_funcs ])
 
     # Adapted from :
     # http://stackoverflow.com/questions/15247075/how-can-i-dynamically-create-derived-classes-from-a-base-class
-    def __init__(self, thread_count=_ASYNC_WORKER_THREAD_COUNT, **reqargs):
+    def __init__(self, thread_count=_ASYNC_WORKER_THREAD_COUNT, pool=None, cache=None,
+                 coalesce=False, rate_limits=None, retry=None, retry_budget=None,
+                 circuit_breaker=None, response_mode=ResponseMode.object, decoder=None,
+                 metrics=None, executor=None, hedge=None, transport=None, http_cache=False,
+                 **reqargs):
+        if http_cache and cache is None:
+            raise ValueError('http_cache needs a cache to store the responses in')
+
         BaseClass.__init__(self)
         setattr(self, 'reqargs', read_only_dict(reqargs))
-        self._executor = concurrent.futures.ThreadPoolExecutor(thread_count)
+        setattr(self, 'response_mode', ResponseMode(response_mode))
+        setattr(self, 'decoder', get_decoder(decoder))
+        setattr(self, 'cache', cache)
+        setattr(self, 'http_cache', http_cache)
+        setattr(self, 'coalescer', SingleFlight() if coalesce else None)
+
+        # Token buckets keyed by service or resource name. Calls reserve a
+        # token from their resource bucket and then the service bucket,
+        # and wait for whichever is due last.
+        if rate_limits is None:
+            rate_limits = create_rate_limits(name, options, apis)
+        setattr(self, 'rate_limits', read_only_dict(dict(rate_limits or {})))
+        self._throttles = dict([(api.name, tuple([self.rate_limits[n] for n in (api.name, name)
+                                                  if n in self.rate_limits]))
+                                for api in apis])
+
+        # Per resource retry policies derived from the client policy and
+        # the spec, all drawing on one budget.
+        self._retry_policies = create_retry_policies(retry, apis)
+        setattr(self, 'retry_budget', retry_budget or RetryBudget())
+
+        setattr(self, 'circuit_breakers',
+                read_only_dict(create_circuit_breakers(circuit_breaker, apis)))
+
+        # Hook reporting requests, events and executor tasks, None to
+        # measure nothing
+        setattr(self, 'metrics', metrics)
+
+        # The async methods run on a pool owned by the client unless the
+        # shared pool or another executor is given. Its bounded queue
+        # blocks callers submitting faster than the calls complete.
+        self._thread_count = thread_count
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = WorkerPool(max_workers=thread_count,
+                                  max_queue=thread_count * QUEUE_PER_WORKER)
+        elif executor == 'shared':
+            executor = shared_executor()
+        self._executor = executor
+        workers = getattr(executor, 'max_workers', thread_count)
+        if metrics is not None:
+            self._executor = InstrumentedExecutor(self._executor, metrics)
+
+        # Per resource hedge policies for the idempotent resources. The
+        # attempts of a hedged call run on a pool of its own so that the
+        # caller can stop waiting on a slow one. The pool never queues:
+        # once it is busy calls go out unhedged from the caller's thread,
+        # so hedging never limits how many calls run at once.
+        setattr(self, 'hedge_policies', read_only_dict(create_hedge_policies(hedge, apis)))
+        self._hedge_executor = None
+        if self.hedge_policies:
+            self._hedge_executor = WorkerPool(max_workers=2 * workers, max_queue=0,
+                                              overflow=REJECT, idle_timeout=10.0,
+                                              thread_name_prefix='rekt-hedge')
+
+        # One keep-alive pool shared by the sync methods, the async
+        # methods running on the executor and the hedged attempts, so size
+        # it to fit every worker.
+        if pool is None:
+            pool = PoolConfig(maxsize=max((3 if self.hedge_policies else 1) * workers,
+                                          PoolConfig().maxsize))
+        self._session = create_session(pool, transport)
 
     api_mapper['__init__'] =  __init__
 
@@ -249,49 +1059,73 @@ def create_rest_client_class(name, apis, BaseClass=RestClient):
     return ClientClass
 
 
-def create_service_module(service_name, apis):
+def create_service_module(service_name, apis, options=read_only_dict({})):
    """
    Dynamically creates a module named defined by the PEP-8 version of
    the string contained in service_name (from the YAML config). This
    module will contain a Client class, a Call Factory, and list of API
-   definition objects.
+   definition objects. On python 3.5+ it also contains an AsyncClient
+   class whose api methods are asyncio coroutines.
    """
    service_module = imp.new_module(service_name.lower())
 
    for api in apis:
       setattr(service_module, api.__class__.__name__, api)
 
-   ClientClass = create_rest_client_class(service_name, apis)
+   ClientClass = create_rest_client_class(service_name, apis, options)
 
    setattr(service_module, 'resources', tuple(apis))
+   setattr(service_module, 'options', options)
    setattr(service_module, 'Client', ClientClass)
 
+   if sys.version_info >= (3, 5):
+       from rekt.aio import create_async_rest_client_class
+       setattr(service_module, 'AsyncClient', create_async_rest_client_class(service_name, apis))
+
    sys.modules[service_name.lower()] = service_module
    return service_module
 
 
-def load_service(config):
+def load_service(config, cache_dir=None, resources=None):
    """
    Load a restful service specified by some YAML file at config_path.
 
    :param config_path: A pathlib Path object that points to the yaml
        config
+   :param cache_dir: directory caching the parsed spec files, see
+       rekt.codegen
+   :param resources: names of the only resources to generate methods
+       for, all of them when None
    :returns: A python module containing a Client class, call factory,
        and the definition of each of the APIs defined by the config.
    """
    if isinstance(config, collections.abc.Mapping):
        service_config = config
-   elif isinstance(config, str):
-       service_config = load_config(pathlib.Path(config))
-   elif isinstance(config, pathlib.Path):
-       service_config = load_config(config)
+   elif isinstance(config, (str, pathlib.Path)):
+       if cache_dir is not None:
+           from rekt.codegen import load_cached_config
+           service_config = load_cached_config(config, cache_dir)
+       else:
+           service_config = load_config(pathlib.Path(config))
    else:
        raise TypeError('Cannot load config from type: {}'.format(type(config)))
 
+   definitions = service_config['apis']
+   if resources is not None:
+       unknown = set(resources) - set(definitions)
+       if unknown:
+           raise ValueError('Unknown resources: {}'.format(', '.join(sorted(unknown))))
+       definitions = dict([(api, definitions[api]) for api in resources])
+
    apis = []
-   for api, defn in service_config['apis'].items():
+   for api, defn in definitions.items():
        api_def= create_api_definition(api, defn, service_config['base_url'])
        apis.append(api_def)
 
-   service_module = create_service_module(service_config['name'], apis)
+   # Top level keys besides the name, url and apis configure the whole
+   # service, e.g. rate_limit : { qps : 50 }
+   options = read_only_dict(dict([(k, v) for k, v in service_config.items()
+                                  if k not in _SERVICE_KEYS]))
+
+   service_module = create_service_module(service_config['name'], apis, options)
    return service_module
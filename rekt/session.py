@@ -0,0 +1,97 @@
+import time
+import threading
+
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from requests.packages.urllib3.exceptions import ReadTimeoutError
+
+__all__ = ['PoolConfig', 'KeepAliveAdapter', 'create_session']
+
+#: Connection pool settings for the session owned by each generated
+#: client.
+#:
+#:  connections       -- number of per host connection pools to cache
+#:  maxsize           -- max number of connections kept alive per host
+#:  block             -- block when all maxsize connections are in use
+#:                       instead of opening throw away connections
+#:  keepalive_timeout -- seconds a pool may sit idle before its kept
+#:                       alive connections are dropped, None keeps them
+#:                       until the server closes them
+#:  max_retries       -- retries on connection errors and resets
+PoolConfig = namedtuple('PoolConfig',
+    ('connections', 'maxsize', 'block', 'keepalive_timeout', 'max_retries'))
+PoolConfig.__new__.__defaults__ = (10, 10, False, None, 3)
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that drops its pooled connections once they have been
+    idle for longer than keepalive_timeout seconds. Servers silently
+    close idle keep-alive connections, and reusing one of those costs a
+    reset and a retry so it is cheaper to reconnect up front.
+    """
+    def __init__(self, keepalive_timeout=None, **kwargs):
+        self.keepalive_timeout = keepalive_timeout
+        self._last_used = time.monotonic()
+        self._idle_lock = threading.Lock()
+        super(KeepAliveAdapter, self).__init__(**kwargs)
+
+    def _touch(self, expire):
+        with self._idle_lock:
+            now = time.monotonic()
+            if expire and now - self._last_used > self.keepalive_timeout:
+                self.poolmanager.clear()
+            self._last_used = now
+
+    def send(self, request, **kwargs):
+        if self.keepalive_timeout is None:
+            return super(KeepAliveAdapter, self).send(request, **kwargs)
+
+        self._touch(expire=True)
+        try:
+            return super(KeepAliveAdapter, self).send(request, **kwargs)
+        finally:
+            self._touch(expire=False)
+
+
+class ResetRetry(Retry):
+    """
+    Retry that gives up on read timeouts right away. The request reached
+    the server, which is slow rather than gone, and retrying would
+    stretch the timeout of the call by every retry.
+    """
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None,
+                  _stacktrace=None):
+        if isinstance(error, ReadTimeoutError):
+            raise error
+        return super(ResetRetry, self).increment(method, url, response, error, _pool,
+                                                 _stacktrace)
+
+
+def create_session(config, transport=None):
+    """
+    Create a requests Session whose http and https connection pools
+    are sized and configured by the given PoolConfig, sending through
+    the transport from rekt.transport when given.
+    """
+    # Only connection errors and resets are retried here, anything that
+    # made it to the server and got a status back is left to the caller.
+    retries = ResetRetry(total=config.max_retries, connect=config.max_retries,
+                         read=config.max_retries, status=0, redirect=None,
+                         raise_on_status=False)
+
+    session = requests.Session()
+    for prefix in ('http://', 'https://'):
+        adapter = KeepAliveAdapter(keepalive_timeout=config.keepalive_timeout,
+                                   pool_connections=config.connections,
+                                   pool_maxsize=config.maxsize,
+                                   pool_block=config.block,
+                                   max_retries=retries)
+        if transport is not None:
+            adapter = transport.adapter(adapter)
+        session.mount(prefix, adapter)
+
+    return session
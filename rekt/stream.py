@@ -0,0 +1,252 @@
+"""
+Incremental extraction of array elements from a json body.
+
+Resources can declare the path of the array holding the bulk of their
+response in the spec:
+
+    stream : "rows[*].elements[*]"
+
+and a streamed call then yields the elements at that path one by one as
+the body arrives, holding no more than one element (plus whatever is in
+flight on the wire) in memory at a time. Everything outside of the path
+is scanned over and dropped.
+"""
+import re
+import json
+
+__all__ = ['parse_path', 'PathScanner', 'iter_path']
+
+_ITEM = '*'
+_PATH_PART_RE = re.compile(r'^(?P<key>[^\[\]]*)(?P<items>(\[\*\])*)$')
+_SCALAR_END_RE = re.compile(rb'[\s,\]}]')
+_OPAQUE_RE = re.compile(rb'["\[\]{}]')
+_WHITESPACE = frozenset(b' \t\r\n')
+
+_QUOTE, _BACKSLASH = ord('"'), ord('\\')
+_COMMA, _COLON = ord(','), ord(':')
+_OPEN = frozenset(b'{[')
+_CLOSE = frozenset(b'}]')
+_OBJECT = ord('{')
+
+# Per container state while scanning along the path
+_KEY, _COLON_NEXT, _VALUE, _AFTER = range(4)
+
+
+def parse_path(path):
+    """
+    'rows[*].elements[*]' -> ('rows', '*', 'elements', '*')
+
+    A leading '[*]' addresses the elements of a top level array.
+    """
+    steps = []
+    for part in path.split('.'):
+        match = _PATH_PART_RE.match(part)
+        if match is None or not (match.group('key') or match.group('items')):
+            raise ValueError('Invalid stream path: {}'.format(path))
+        if match.group('key'):
+            steps.append(match.group('key'))
+        steps.extend([_ITEM] * (len(match.group('items')) // 3))
+
+    return tuple(steps)
+
+
+def _string_end(buf, start):
+    """
+    Index just past the closing quote of the string starting at start,
+    or -1 when it is not complete yet.
+    """
+    i = start + 1
+    while True:
+        i = buf.find(b'"', i)
+        if i == -1:
+            return -1
+        escapes, j = 0, i - 1
+        while buf[j] == _BACKSLASH:
+            escapes += 1
+            j -= 1
+        if escapes % 2 == 0:
+            return i + 1
+        i += 1
+
+
+class PathScanner(object):
+    """
+    Push parser that is fed the body in chunks and returns the raw json
+    text of every complete element found at the path.
+
+    Containers along the path are tracked key by key. Any value off the
+    path, and every element being captured, is only scanned for its
+    closing bracket.
+    """
+    def __init__(self, path):
+        self.path = parse_path(path) if isinstance(path, str) else tuple(path)
+        self._buf = bytearray()
+        self._pos = 0
+        # [key or '*', state, is_object] for each container on the path
+        self._stack = []
+        self._done = False
+        # Nesting depth, start and capture flag of the opaque value
+        self._opaque_depth = 0
+        self._opaque_start = None
+        self._capture = False
+
+    def feed(self, chunk):
+        self._buf.extend(chunk)
+        elements = []
+        self._scan(elements)
+
+        # Drop what has been consumed, keeping an element being captured
+        capturing = self._opaque_start is not None and self._capture
+        keep = self._opaque_start if capturing else self._pos
+        if keep:
+            del self._buf[:keep]
+            self._pos -= keep
+            if self._opaque_start is not None:
+                self._opaque_start = max(self._opaque_start - keep, 0)
+
+        return elements
+
+    def close(self):
+        """
+        Signal the end of the body, returns a final scalar element if the
+        body ended with one.
+        """
+        elements = []
+        if not self._done and not self._stack and self._opaque_start is None:
+            self._buf.extend(b' ')
+            self._scan(elements)
+        if not self._done:
+            raise ValueError('Truncated json body')
+        return elements
+
+    def _value_done(self, start, end, capture, elements):
+        if capture:
+            elements.append(bytes(self._buf[start:end]))
+        if self._stack:
+            self._stack[-1][1] = _AFTER
+        else:
+            self._done = True
+
+    def _scan_opaque(self, elements):
+        buf = self._buf
+        while self._opaque_depth:
+            match = _OPAQUE_RE.search(buf, self._pos)
+            if match is None:
+                self._pos = len(buf)
+                return False
+
+            i = match.start()
+            c = buf[i]
+            if c == _QUOTE:
+                end = _string_end(buf, i)
+                if end == -1:
+                    self._pos = i
+                    return False
+                self._pos = end
+                continue
+
+            self._opaque_depth += 1 if c in _OPEN else -1
+            self._pos = i + 1
+
+        start, self._opaque_start = self._opaque_start, None
+        self._value_done(start, self._pos, self._capture, elements)
+        return True
+
+    def _scan(self, elements):
+        buf = self._buf
+        stack = self._stack
+
+        while not self._done:
+            if self._opaque_depth and not self._scan_opaque(elements):
+                return
+
+            pos = self._pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos >= len(buf):
+                return
+
+            c = buf[pos]
+            top = stack[-1] if stack else None
+
+            if top is not None and top[1] == _AFTER:
+                if c == _COMMA:
+                    top[1] = _KEY if top[2] else _VALUE
+                    self._pos = pos + 1
+                elif c in _CLOSE:
+                    stack.pop()
+                    self._pos = pos + 1
+                    self._value_done(pos, pos + 1, False, elements)
+                else:
+                    raise ValueError('Unexpected {!r} in json body'.format(chr(c)))
+                continue
+
+            if top is not None and top[1] == _KEY:
+                if c in _CLOSE:
+                    stack.pop()
+                    self._pos = pos + 1
+                    self._value_done(pos, pos + 1, False, elements)
+                    continue
+                end = _string_end(buf, pos)
+                if end == -1:
+                    return
+                top[0] = json.loads(buf[pos:end].decode('utf-8'))
+                top[1] = _COLON_NEXT
+                self._pos = end
+                continue
+
+            if top is not None and top[1] == _COLON_NEXT:
+                if c != _COLON:
+                    raise ValueError('Expected : in json body')
+                top[1] = _VALUE
+                self._pos = pos + 1
+                continue
+
+            if top is not None and c in _CLOSE:
+                # Closing an empty array
+                stack.pop()
+                self._pos = pos + 1
+                self._value_done(pos, pos + 1, False, elements)
+                continue
+
+            # A value starts here, is it the one we want, on the way to
+            # it, or off the path entirely?
+            depth = len(stack)
+            on_path = all(frame[0] == self.path[i] for i, frame in enumerate(stack))
+            capture = on_path and depth == len(self.path)
+            descend = on_path and depth < len(self.path)
+
+            if c in _OPEN:
+                self._pos = pos + 1
+                if descend and (c == _OBJECT) == (self.path[depth] != _ITEM):
+                    stack.append([_ITEM, _KEY if c == _OBJECT else _VALUE, c == _OBJECT])
+                else:
+                    self._opaque_depth = 1
+                    self._opaque_start = pos
+                    self._capture = capture
+                continue
+
+            if c == _QUOTE:
+                end = _string_end(buf, pos)
+            else:
+                match = _SCALAR_END_RE.search(buf, pos)
+                end = -1 if match is None else match.start()
+            if end == -1:
+                return
+
+            self._pos = end
+            self._value_done(pos, end, capture, elements)
+
+
+def iter_path(chunks, path):
+    """
+    Yield the raw json text of each element at path from an iterable of
+    body chunks.
+    """
+    scanner = PathScanner(path)
+    for chunk in chunks:
+        for element in scanner.feed(chunk):
+            yield element
+    for element in scanner.close():
+        yield element
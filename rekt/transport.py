@@ -0,0 +1,339 @@
+"""
+Pluggable transports for generated clients.
+
+A client sends its calls through the requests adapters mounted on its
+session. Client(transport=...) puts a transport in front of them:
+
+* SessionTransport, the default, sends calls over the network.
+* RecordingTransport sends them over the network as well and writes
+  every request and response to a cassette file.
+* ReplayTransport answers calls from a cassette without any network,
+  at full speed or with the latency of the recorded calls, so that a
+  recorded workload can be replayed offline to measure throughput.
+
+    with RecordingTransport('places.cassette') as transport:
+        client = service.Client(transport=transport)
+        ...
+    with ReplayTransport('places.cassette', latency=True) as transport:
+        client = service.Client(transport=transport)
+        ...
+
+Calls are matched by method, path, query and a hash of the body. The
+scheme and host are left out so that a cassette recorded against one
+server replays under any base url, and params carrying credentials
+(key, signature and client by default), in the query or a form encoded
+body, are neither matched on nor stored. The responses recorded for a call are replayed in order and
+start over once they are used up.
+
+A cassette is a single file of records, each a json header with the
+status, headers and latency of a response followed by its zlib
+compressed body, and an index of the records by call written when the
+recording is closed. A cassette whose recording did not close is
+indexed by scanning its records instead.
+"""
+import io
+import json
+import mmap
+import time
+import zlib
+import struct
+import hashlib
+import threading
+
+from collections import namedtuple, defaultdict
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests.exceptions
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.packages.urllib3.response import HTTPResponse
+
+from rekt.exceptions import ReplayMissError
+
+__all__ = ['SessionTransport', 'RecordingTransport', 'ReplayTransport', 'ReplayStats',
+           'Cassette', 'request_key']
+
+#: Counters of a ReplayTransport, calls answered from the cassette and
+#: calls it had no response for.
+ReplayStats = namedtuple('ReplayStats', ('hits', 'misses'))
+
+_MAGIC = b'REKTCAS1'
+_INDEX_MAGIC = b'REKTIDX1'
+_RECORD = struct.Struct('>II')
+_FOOTER = struct.Struct('>Q')
+_SECRET_PARAMS = ('key', 'signature', 'client')
+# The recorded body is already decoded and read whole
+_DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+
+def request_key(method, url, body=None, ignore_params=_SECRET_PARAMS):
+    """
+    The key matching a request to its recorded responses. Form encoded
+    bodies are hashed without the ignore_params, like the query.
+    """
+    url = urlsplit(url)
+    query = sorted([(k, v) for k, v in parse_qsl(url.query, keep_blank_values=True)
+                    if k not in ignore_params])
+    key = '{} {}'.format(method, url.path)
+    if query:
+        key += '?' + urlencode(query)
+    if body:
+        body = _form_body(body, ignore_params)
+    if body:
+        key += ' ' + hashlib.sha1(body).hexdigest()
+    return key
+
+
+def _form_body(body, ignore_params):
+    # Bodies that are not form encoded, e.g. json, are hashed as they are
+    if not isinstance(body, bytes):
+        body = body.encode('utf-8')
+    try:
+        params = parse_qsl(body.decode('utf-8'), keep_blank_values=True, strict_parsing=True)
+    except ValueError:
+        return body
+    return urlencode(sorted([(k, v) for k, v in params
+                             if k not in ignore_params])).encode('utf-8')
+
+
+class Cassette(object):
+    """
+    The file of recorded calls at path, opened for reading, or with
+    mode='w' truncated for recording.
+    """
+    def __init__(self, path, mode='r'):
+        if mode not in ('r', 'w'):
+            raise ValueError("mode must be 'r' or 'w'")
+        self.path = str(path)
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._index = defaultdict(list)
+
+        if mode == 'w':
+            self._file = open(self.path, 'wb')
+            self._file.write(_MAGIC)
+            self._file.flush()
+            self._data = None
+            return
+
+        with open(self.path, 'rb') as infile:
+            self._data = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        self._file = None
+        if self._data[:len(_MAGIC)] != _MAGIC:
+            self._data.close()
+            raise ValueError('{} is not a rekt cassette'.format(self.path))
+        self._load_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return sum(len(offsets) for offsets in self._index.values())
+
+    def keys(self):
+        return self._index.keys()
+
+    def _load_index(self):
+        data = self._data
+        end = len(data) - len(_INDEX_MAGIC)
+        if end > _FOOTER.size and data[end:] == _INDEX_MAGIC:
+            start, = _FOOTER.unpack_from(data, end - _FOOTER.size)
+            self._index.update(json.loads(data[start:end - _FOOTER.size].decode('utf-8')))
+            return
+
+        # The recording did not close, every record that was written
+        # whole is still usable
+        offset = len(_MAGIC)
+        while offset + _RECORD.size <= len(data):
+            header_size, body_size = _RECORD.unpack_from(data, offset)
+            if offset + _RECORD.size + header_size + body_size > len(data):
+                break
+            header = self._header(offset)
+            self._index[header['key']].append(offset)
+            offset += _RECORD.size + header_size + body_size
+
+    def _header(self, offset):
+        header_size, _ = _RECORD.unpack_from(self._data, offset)
+        start = offset + _RECORD.size
+        return json.loads(self._data[start:start + header_size].decode('utf-8'))
+
+    def record(self, key, status, reason, headers, body, elapsed):
+        """
+        Append a response to the call with key.
+        """
+        header = json.dumps({'key' : key, 'status' : status, 'reason' : reason,
+                             'headers' : headers, 'elapsed' : elapsed},
+                            separators=(',', ':')).encode('utf-8')
+        body = zlib.compress(body)
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(_RECORD.pack(len(header), len(body)))
+            self._file.write(header)
+            self._file.write(body)
+            self._file.flush()
+            self._index[key].append(offset)
+
+    def responses(self, key):
+        """
+        The offsets of the responses recorded for the call with key.
+        """
+        return self._index.get(key, ())
+
+    def read(self, offset):
+        """
+        The (header, body) of the record at offset.
+        """
+        header_size, body_size = _RECORD.unpack_from(self._data, offset)
+        start = offset + _RECORD.size + header_size
+        return self._header(offset), zlib.decompress(self._data[start:start + body_size])
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                index = json.dumps(self._index, separators=(',', ':')).encode('utf-8')
+                start = self._file.tell()
+                self._file.write(index)
+                self._file.write(_FOOTER.pack(start))
+                self._file.write(_INDEX_MAGIC)
+                self._file.close()
+            if self._data is not None and not self._data.closed:
+                self._data.close()
+
+
+class SessionTransport(object):
+    """
+    Sends calls over the network with the adapters of the client
+    session. Transports may be shared by several clients and are closed
+    by their owner rather than by the clients.
+    """
+    def adapter(self, adapter):
+        """
+        The adapter to mount on a client session in place of adapter.
+        """
+        return adapter
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordingTransport(SessionTransport):
+    """
+    Sends calls over the network and records them to a new cassette at
+    path, leaving out the ignore_params.
+    """
+    def __init__(self, path, ignore_params=_SECRET_PARAMS):
+        self.ignore_params = tuple(ignore_params)
+        self.cassette = Cassette(path, 'w')
+
+    def adapter(self, adapter):
+        return _RecordingAdapter(adapter, self)
+
+    def close(self):
+        self.cassette.close()
+
+
+class _RecordingAdapter(BaseAdapter):
+    def __init__(self, adapter, transport):
+        super(_RecordingAdapter, self).__init__()
+        self._adapter = adapter
+        self._transport = transport
+
+    def send(self, request, **kwargs):
+        started = time.monotonic()
+        response = self._adapter.send(request, **kwargs)
+        # Streamed bodies are read here too, requests serves them from
+        # the content afterwards
+        body = response.content
+        elapsed = time.monotonic() - started
+
+        headers = dict([(k, v) for k, v in response.headers.items()
+                        if k.lower() not in _DROPPED_HEADERS])
+        self._transport.cassette.record(
+            request_key(request.method, request.url, request.body, self._transport.ignore_params),
+            response.status_code, response.reason, headers, body, elapsed)
+        return response
+
+    def close(self):
+        self._adapter.close()
+
+
+class ReplayTransport(SessionTransport):
+    """
+    Answers calls from the cassette at path.
+
+    :param latency: False to answer right away, True to wait as long as
+        the recorded call took, or a factor scaling the recorded latency
+    :param ignore_params: params left out when matching calls, the ones
+        left out by the recording
+    """
+    def __init__(self, path, latency=False, ignore_params=_SECRET_PARAMS):
+        self.latency = float(latency)
+        self.ignore_params = tuple(ignore_params)
+        self.cassette = Cassette(path)
+        self._lock = threading.Lock()
+        self._next = defaultdict(int)
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def stats(self):
+        with self._lock:
+            return ReplayStats(self._hits, self._misses)
+
+    def adapter(self, adapter):
+        # Nothing is sent, so the connection pool is not needed
+        adapter.close()
+        return _ReplayAdapter(self)
+
+    def next_response(self, request):
+        """
+        The (header, body) of the next recorded response to request.
+        """
+        key = request_key(request.method, request.url, request.body, self.ignore_params)
+        offsets = self.cassette.responses(key)
+        with self._lock:
+            if not offsets:
+                self._misses += 1
+                raise ReplayMissError('No recorded response to {}'.format(key), request=request)
+            offset = offsets[self._next[key] % len(offsets)]
+            self._next[key] += 1
+            self._hits += 1
+        return self.cassette.read(offset)
+
+    def close(self):
+        self.cassette.close()
+
+
+class _ReplayAdapter(BaseAdapter):
+    def __init__(self, transport):
+        super(_ReplayAdapter, self).__init__()
+        self._transport = transport
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        header, body = self._transport.next_response(request)
+
+        delay = header['elapsed'] * self._transport.latency
+        if isinstance(timeout, tuple):
+            timeout = timeout[1]
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise requests.exceptions.ReadTimeout('Replayed call timed out', request=request)
+        if delay > 0:
+            time.sleep(delay)
+
+        headers = dict(header['headers'], **{'Content-Length' : str(len(body))})
+        raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=header['status'],
+                           reason=header['reason'], preload_content=False,
+                           decode_content=False)
+        return HTTPAdapter.build_response(self, request, raw)
+
+    def close(self):
+        pass
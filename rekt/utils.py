@@ -1,5 +1,7 @@
 import re
+import json
 import types
+import functools
 import collections
 import pathlib
 
@@ -7,29 +9,42 @@ from collections import defaultdict, OrderedDict
 from itertools import chain
 from pathlib import Path, PurePath
 
-from pkg_resources import resource_filename
 import yaml
 
 from . import specs
 
 __all__ = [
     'read_only_dict',
+    'builtin_config_path',
     'load_builtin_config',
     'load_config',
+    'parse_config',
+    'load_swagger_config',
     'api_method_name',
     'async_api_method_name',
+    'batch_api_method_name',
+    'iter_api_method_name',
     'api_method_names',
 ]
 
 # Kept as a way to safely do .get() but allow a None reference
 _NULL_OBJECT = object()
 _ASYNC_METHOD_PREFIX = 'async_'
+_BATCH_METHOD_PREFIX = 'batch_'
+_ITER_METHOD_PREFIX = 'iter_'
+
+# The libyaml loader is an order of magnitude faster when pyyaml was
+# built with it. Specs are plain data so the safe loaders are enough.
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+_SPEC_SUFFIXES = ('.yaml', '.json')
 
 def read_only_dict(mapping):
     return types.MappingProxyType(mapping)
 
 _FIRST_CAP_RE = re.compile('(.)([A-Z][a-z]+)')
 _ALL_CAP_RE = re.compile('([a-z0-9])([A-Z])')
+# Every method name of a client is derived from the resource names
+@functools.lru_cache(maxsize=4096)
 def camel_case_to_snake_case(name):
     """
     HelloWorld -> hello_world
@@ -44,26 +59,45 @@ def snake_case_to_camel_case(name):
     return name.replace('_', ' ').title().replace(' ', '')
 
 
-def load_builtin_config(name, module_name=__name__, specs_path=specs.__path__):
+def builtin_config_path(name, specs_path=specs.__path__):
     """
-    Uses package info magic to find the resource file located in the specs
+    Path of the spec file named name, yaml or json, in the specs
     submodule.
     """
-    config_path = Path(next(iter(specs_path)))
-    config_path = config_path / PurePath(resource_filename(module_name, name + '.yaml'))
-    return load_config(config_path)
+    specs_dir = Path(next(iter(specs_path)))
+    for suffix in _SPEC_SUFFIXES:
+        config_path = specs_dir / PurePath(name + suffix)
+        if config_path.exists():
+            return config_path
+    raise FileNotFoundError('No builtin spec named {}'.format(name))
+
+def load_builtin_config(name, specs_path=specs.__path__):
+    """
+    Loads the spec named name from the specs submodule.
+    """
+    return load_config(builtin_config_path(name, specs_path))
+
+def parse_config(data, suffix=None):
+   """
+   Parses the bytes of a yaml or json configuration. Json, which is also
+   valid yaml, goes through the much faster json parser, going by the
+   .json suffix of the file or else its first character.
+   """
+   text = data.decode('utf-8') if isinstance(data, bytes) else data
+   if suffix == '.json' or (suffix is None and text.lstrip()[:1] in ('{', '[')):
+       return json.loads(text)
+   return yaml.load(text, Loader=_YAML_LOADER)
 
 def load_config(path):
    """
-   Loads a yaml configuration.
+   Loads a yaml or json configuration.
 
    :param path: a pathlib Path object pointing to the configuration
    """
    with path.open('rb') as fi:
        file_bytes = fi.read()
-       config = yaml.load(file_bytes.decode('utf-8'))
 
-   return config
+   return parse_config(file_bytes, path.suffix.lower() or None)
 
 def api_method_name(verb, resource):
     """
@@ -82,31 +116,50 @@ def async_api_method_name(verb, resource):
     return _ASYNC_METHOD_PREFIX + api_method_name(verb, resource)
 
 
+def batch_api_method_name(verb, resource):
+    """
+    Create a canonical python method name for a batch request method by
+    combining the http verb name and the resource name with the batch
+    method prefix.
+    """
+    return _BATCH_METHOD_PREFIX + api_method_name(verb, resource)
+
+
+def iter_api_method_name(resource):
+    """
+    Create a canonical python method name for the iterator over the
+    pages of a resource from its name with the iter method prefix.
+    """
+    return _ITER_METHOD_PREFIX + camel_case_to_snake_case(resource.name)
+
+
 def api_method_names(resources):
     api_methods = [[api_method_name(verb, rsrc) for verb in rsrc.actions] for rsrc in resources]
     api_methods.extend([[async_api_method_name(verb, rsrc) for verb in rsrc.actions] for rsrc in resources])
+    api_methods.extend([[batch_api_method_name(verb, rsrc) for verb in rsrc.actions] for rsrc in resources])
+    api_methods.append([iter_api_method_name(rsrc) for rsrc in resources if rsrc.options.get('paginate')])
     api_methods = chain.from_iterable(api_methods)
     return api_methods
 
 
-def load_swagger_config(name, base_url, config):
+def load_swagger_config(name, base_url, config, resources=None):
    """
    Load a restful service specified by some YAML file at config_path.
 
    :param config_path: A pathlib Path object that points to the yaml
-       config
+       or json config
+   :param resources: names of the only resources to convert, all of
+       them when None
    :returns: A python module containing a Client class, call factory,
        and the definition of each of the APIs defined by the config.
    """
    if isinstance(config, collections.abc.Mapping):
        pass
    elif isinstance(config, str):
-       with pathlib.Path(config).open('r') as infile:
-           config = yaml.load(infile)
+       config = load_config(pathlib.Path(config))
 
    elif isinstance(config, pathlib.Path):
-       with config.open('r') as infile:
-           config = yaml.load(infile)
+       config = load_config(config)
 
    else:
        raise TypeError('Cannot load swagger config from type: {}'.format(type(config)))
@@ -116,11 +169,15 @@ def load_swagger_config(name, base_url, config):
            ('name', name), ('base_url', base_url), ('apis', defaultdict(dict))])
 
    apis = config['apis']
+   if resources is not None:
+       resources = frozenset(resources)
 
 
    for api in apis:
        # /some/path/to/my_resource -> MyResource
        resource = snake_case_to_camel_case(api['path'].rsplit('/', 1)[-1])
+       if resources is not None and resource not in resources:
+           continue
        for op in api['operations']:
            verb = op['method'].upper()
            args = [(param['name'], {'default' : None}) for param in op['parameters']
@@ -28,7 +28,7 @@ setup(
     description='A requests wrapper library for dynamically generating rest clients',
     long_description=__doc__,
     packages=['rekt'],
-    package_data={'rekt' : ['specs/*.yaml']},
+    package_data={'rekt' : ['specs/*.yaml', 'specs/*.json']},
     include_package_data=True,
     platforms='any',
     install_requires=[
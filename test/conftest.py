@@ -0,0 +1,56 @@
+import copy
+
+import pytest
+
+from rekt.mock import MockService
+from rekt.service import load_service
+
+#: The spec most tests run against, a single resource declaring no
+#: rate limits
+SPEC = {
+    'name' : 'Things',
+    'base_url' : 'http://localhost/api',
+    'apis' : {
+        'Things' : {
+            'url' : '/things',
+            'idempotent' : True,
+            'GET' : {'q' : None, 'key' : None},
+            'POST' : {'q' : None, 'key' : None},
+        },
+    },
+}
+
+
+@pytest.fixture
+def spec():
+    """
+    A copy of SPEC that the test may change.
+    """
+    return copy.deepcopy(SPEC)
+
+
+@pytest.fixture
+def start_mock(spec):
+    """
+    Starts a MockService, or a mock_class subclass of it, of the spec or
+    of the spec given, with the options given. Every mock is stopped
+    after the test.
+    """
+    mocks = []
+
+    def start(config=None, mock_class=MockService, **options):
+        mock = mock_class(spec if config is None else config, **options).start()
+        mocks.append(mock)
+        return mock
+
+    yield start
+    for mock in mocks:
+        mock.stop()
+
+
+@pytest.fixture
+def service(start_mock):
+    """
+    The service of the spec, loaded against a mock of it.
+    """
+    return load_service(start_mock().config)
@@ -4,6 +4,7 @@ import concurrent.futures
 from pathlib import Path
 
 from rekt import load_service
+from rekt.transport import SessionTransport, RecordingTransport, ReplayTransport
 import requests.exceptions
 
 def parse_args():
@@ -12,6 +13,8 @@ def parse_args():
    parser.add_argument('--cert')
    parser.add_argument('--no-verify', action='store_false', dest='verify')
    parser.add_argument('--key')
+   parser.add_argument('--record', help='record the calls to this cassette')
+   parser.add_argument('--replay', help='answer the calls from this cassette, offline')
 
    return parser.parse_args()
 
@@ -29,7 +32,14 @@ def main():
    verify = args.verify
    key = args.key
 
-   client = service_module.Client(cert=cert, verify=verify)
+   if args.replay:
+      transport = ReplayTransport(args.replay)
+   elif args.record:
+      transport = RecordingTransport(args.record)
+   else:
+      transport = SessionTransport()
+
+   client = service_module.Client(cert=cert, verify=verify, transport=transport)
    try:
       result = client.get_places(key=key, location='47.6097,-122.3331', keyword='bar', radius=10000)
       print(result.keys())
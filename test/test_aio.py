@@ -0,0 +1,98 @@
+import asyncio
+
+import requests
+
+from rekt.aio import AsyncTransport
+
+ANSWER, HANG_UP, CLOSE = 'answer', 'hang up', 'close'
+
+
+async def scripted_server(received, script):
+    """
+    Plays the script of actions on each connection: ANSWER reads a
+    request and answers it with keep-alive, HANG_UP reads a request and
+    closes without a response, the way a server that timed out an idle
+    connection looks to a client, and CLOSE closes right away. Each
+    request read is recorded as a (connection, method) pair.
+    """
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        for action in script:
+            if action == CLOSE:
+                break
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = [int(line.split(b':', 1)[1]) for line in head.split(b'\r\n')
+                      if line.lower().startswith(b'content-length:')]
+            await reader.readexactly(length[0] if length else 0)
+            received.append((len(connections), head.split(b' ', 1)[0].decode('latin-1')))
+            if action == HANG_UP:
+                break
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, '127.0.0.1', 0)
+
+
+def send(method, script, times=2, pause=0):
+    """
+    Sends the same request times times over one AsyncTransport and
+    returns the last response, None when it raised a ConnectionError,
+    with the requests the server read.
+    """
+    received = []
+
+    async def run():
+        server = await scripted_server(received, script)
+        url = 'http://127.0.0.1:{}/things'.format(server.sockets[0].getsockname()[1])
+        prepared = requests.Request(method, url, data={'q' : 'a'}).prepare()
+        transport = AsyncTransport()
+        try:
+            for _ in range(times - 1):
+                assert (await transport.send(prepared)).text == 'ok'
+                await asyncio.sleep(pause)
+            return await transport.send(prepared)
+        finally:
+            transport.close()
+            server.close()
+            await server.wait_closed()
+
+    try:
+        return asyncio.run(run()), received
+    except requests.exceptions.ConnectionError:
+        return None, received
+
+
+def test_connections_kept_alive():
+    response, received = send('GET', [ANSWER] * 3, times=3)
+    assert response.text == 'ok'
+    assert received == [(1, 'GET')] * 3
+
+
+def test_connections_closed_while_idle_not_reused():
+    # The close is seen before the connection is taken from the pool
+    response, received = send('POST', [ANSWER, CLOSE], pause=0.05)
+    assert response.text == 'ok'
+    assert received == [(1, 'POST'), (2, 'POST')]
+
+
+def test_idempotent_requests_retried_on_a_stale_connection():
+    response, received = send('PUT', [ANSWER, HANG_UP])
+    assert response.text == 'ok'
+    assert received == [(1, 'PUT'), (1, 'PUT'), (2, 'PUT')]
+
+
+def test_posts_not_resent_on_a_stale_connection():
+    response, received = send('POST', [ANSWER, HANG_UP])
+    # The server may have acted on the second POST before hanging up
+    assert response is None
+    assert received == [(1, 'POST'), (1, 'POST')]
+
+
+def test_new_connections_not_retried():
+    # Only a connection that sat in the pool can have gone stale
+    response, received = send('GET', [HANG_UP], times=1)
+    assert response is None
+    assert received == [(1, 'GET')]
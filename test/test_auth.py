@@ -0,0 +1,87 @@
+import time
+import asyncio
+
+from rekt.auth import TokenAuth
+from rekt.executor import WorkerPool
+
+
+def slow_fetch(delay):
+    def fetch():
+        time.sleep(delay)
+        return 'token', 3600
+    return fetch
+
+
+def test_token_refresh_does_not_block_the_event_loop(service):
+    auth = TokenAuth(slow_fetch(0.3))
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def run():
+        ticker = asyncio.ensure_future(tick())
+        client = service.AsyncClient(auth=auth)
+        try:
+            responses = await asyncio.gather(*[client.get_things(q='a') for _ in range(4)])
+        finally:
+            ticker.cancel()
+            await client.close()
+        return responses
+
+    responses = asyncio.run(run())
+
+    assert [r.status for r in responses] == ['OK'] * 4
+    assert auth.refreshes == 1
+    # The loop kept ticking while the token was fetched
+    assert len(ticks) > 10
+    assert max([b - a for a, b in zip(ticks, ticks[1:])]) < 0.2
+    auth.close()
+
+
+def test_pending_refresh_is_none_with_a_valid_token():
+    auth = TokenAuth(slow_fetch(0.0))
+    assert auth.pending_refresh().result(5) == 'token'
+    assert auth.pending_refresh() is None
+    assert auth.refreshes == 1
+    auth.close()
+
+
+def counting_fetch(expires_in):
+    fetches = []
+
+    def fetch():
+        fetches.append(time.monotonic())
+        return 'token-{}'.format(len(fetches)), expires_in
+    return fetch, fetches
+
+
+def test_short_lived_tokens_are_not_refreshed_on_every_call():
+    fetch, fetches = counting_fetch(expires_in=30)
+    with TokenAuth(fetch, refresh_before=60) as auth:
+        for _ in range(20):
+            assert auth.token() == 'token-1'
+            time.sleep(0.005)
+    assert len(fetches) == 1
+
+
+def test_tokens_are_refreshed_in_the_background_before_they_expire():
+    fetch, fetches = counting_fetch(expires_in=0.4)
+    with TokenAuth(fetch, refresh_before=60) as auth:
+        assert auth.token() == 'token-1'
+        time.sleep(0.25)
+        # Past half its lifetime the old token is used while refreshing
+        assert auth.token() == 'token-1'
+        time.sleep(0.1)
+        assert auth.token() == 'token-2'
+    assert len(fetches) == 2
+
+
+def test_executors_passed_in_are_left_running():
+    executor = WorkerPool(max_workers=1)
+    with TokenAuth(slow_fetch(0.0), executor=executor) as auth:
+        assert auth.token() == 'token'
+    assert executor.submit(lambda: 1).result(5) == 1
+    executor.shutdown()
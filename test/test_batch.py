@@ -0,0 +1,104 @@
+import asyncio
+import itertools
+import threading
+import concurrent.futures
+
+import pytest
+
+from rekt.aio import aiter_batch
+from rekt.batch import iter_batch
+
+
+class Submitter(object):
+    """
+    A submit for iter_batch. Calls with fail set raise, calls with error
+    set fail their future, calls with hold set are left for the test to
+    resolve, and the rest return their q right away.
+    """
+    def __init__(self):
+        self.futures = []
+
+    def __call__(self, kwargs):
+        if kwargs.get('fail'):
+            raise ValueError(kwargs['q'])
+        future = concurrent.futures.Future()
+        self.futures.append(future)
+        if kwargs.get('error'):
+            future.set_exception(KeyError(kwargs['q']))
+        elif not kwargs.get('hold'):
+            future.set_result(kwargs['q'])
+        return future
+
+
+def test_window_bounds_calls_in_flight():
+    submit = Submitter()
+    pulled = []
+    calls = ({'q' : pulled.append(i) or i, 'hold' : i >= 3} for i in itertools.count())
+    results = iter_batch(submit, calls, max_in_flight=3)
+
+    assert sorted(next(results).response for _ in range(3)) == [0, 1, 2]
+    # The finished calls were replaced before their results came back,
+    # and no more calls were pulled than fit in the window
+    assert len(submit.futures) == 6
+    assert pulled == list(range(6))
+    results.close()
+    assert all(f.cancelled() for f in submit.futures[3:])
+
+
+def test_errors_yielded_as_results():
+    calls = [{'q' : 'a'}, {'q' : 'b', 'fail' : True}, {'q' : 'c', 'error' : True}]
+    a, b, c = iter_batch(Submitter(), calls, max_in_flight=3, ordered=True)
+
+    assert a.index == 0 and a.response == 'a' and a.exception is None
+    assert b.index == 1 and b.response is None and isinstance(b.exception, ValueError)
+    assert c.kwargs == calls[2] and isinstance(c.exception, KeyError)
+
+
+def test_ordered_results_follow_the_input():
+    submit = Submitter()
+    calls = [{'q' : 0, 'hold' : True}, {'q' : 1}, {'q' : 2}]
+    # The first call finishes last
+    timer = threading.Timer(0.05, lambda: submit.futures[0].set_result(0))
+    timer.start()
+    results = list(iter_batch(submit, calls, max_in_flight=3, ordered=True))
+    timer.join()
+    assert [r.response for r in results] == [0, 1, 2]
+
+
+def test_window_must_hold_a_call():
+    with pytest.raises(ValueError):
+        next(iter_batch(Submitter(), [{}], max_in_flight=0))
+
+
+def test_client_batches(service):
+    with service.Client() as client:
+        calls = [{'q' : 'a'}, {'q' : 'b', 'nope' : 1}, {'q' : 'c'}]
+        results = sorted(client.batch_get_things(calls, max_in_flight=2), key=lambda r: r.index)
+
+    assert [r.index for r in results] == [0, 1, 2]
+    assert results[0].response.status == 'OK'
+    assert isinstance(results[1].exception, TypeError)
+    assert results[2].response.status == 'OK'
+
+
+def test_asyncio_window_bounds_calls_in_flight():
+    in_flight = []
+    most = []
+
+    async def call(q):
+        in_flight.append(q)
+        most.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(q)
+        if q == 3:
+            raise ValueError(q)
+        return q
+
+    async def run():
+        return [r async for r in aiter_batch(call, ({'q' : i} for i in range(10)), 4, ordered=True)]
+
+    results = asyncio.run(run())
+    assert max(most) == 4
+    assert [r.index for r in results] == list(range(10))
+    assert isinstance(results[3].exception, ValueError)
+    assert [r.response for r in results if r.index != 3] == [0, 1, 2, 4, 5, 6, 7, 8, 9]
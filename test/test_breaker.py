@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from rekt.breaker import BreakerState, CircuitBreaker
+from rekt.ratelimit import TokenBucket
+from rekt.exceptions import CircuitOpenError, DeadlineExceededError, QuotaExceededError
+
+
+def half_open(breaker, cooldown):
+    breaker.record(True, 0.0)
+    assert breaker.state is BreakerState.open
+    time.sleep(cooldown)
+    assert breaker.state is BreakerState.half_open
+
+
+def test_half_open_trial_released_when_the_deadline_ends_the_throttle_wait(service):
+    bucket = TokenBucket(qps=0.5, burst=1)
+    with service.Client(circuit_breaker=CircuitBreaker(min_calls=1, cooldown=0.05),
+                        rate_limits={'Things' : bucket}) as client:
+        breaker = client.circuit_breakers['Things']
+        half_open(breaker, 0.06)
+        bucket.reserve()
+
+        with pytest.raises(DeadlineExceededError):
+            client.get_things(q='a', _timeout=0.1)
+
+        # The trial taken by the failed call was given back
+        breaker.allow()
+
+
+def test_half_open_trial_released_when_the_quota_is_spent(service):
+    bucket = TokenBucket(qps=100, daily_quota=1)
+    with service.Client(circuit_breaker=CircuitBreaker(min_calls=1, cooldown=0.05),
+                        rate_limits={'Things' : bucket}) as client:
+        breaker = client.circuit_breakers['Things']
+        half_open(breaker, 0.06)
+        bucket.reserve()
+
+        for _ in range(3):
+            with pytest.raises(QuotaExceededError):
+                client.get_things(q='a')
+
+        breaker.allow()
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+
+
+def test_half_open_breaker_closes_after_a_successful_trial(service):
+    with service.Client(circuit_breaker=CircuitBreaker(min_calls=1, cooldown=0.05)) as client:
+        breaker = client.circuit_breakers['Things']
+        half_open(breaker, 0.06)
+
+        assert client.get_things(q='a').status == 'OK'
+        assert breaker.state is BreakerState.closed
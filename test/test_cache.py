@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from rekt.mock import MockService
+from rekt.service import load_service
+from rekt.cache import MemoryCache, SqliteCache
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        cache = MemoryCache()
+    else:
+        cache = SqliteCache(str(tmp_path / 'cache.db'))
+    yield cache
+    cache.close()
+
+
+def test_refresh_replaces_the_validators_given(cache):
+    cache.set('k', b'body', 0, '"v1"', 'Mon, 05 Oct 2026 10:00:00 GMT')
+
+    cache.refresh('k', 60, etag='"v2"')
+    entry = cache.lookup('k')
+    assert entry.fresh
+    assert entry.content == b'body'
+    assert entry.etag == '"v2"'
+    assert entry.last_modified == 'Mon, 05 Oct 2026 10:00:00 GMT'
+
+    cache.refresh('k', 60, last_modified='Tue, 06 Oct 2026 10:00:00 GMT')
+    entry = cache.lookup('k')
+    assert entry.etag == '"v2"'
+    assert entry.last_modified == 'Tue, 06 Oct 2026 10:00:00 GMT'
+
+
+def test_http_cache_needs_a_cache(service):
+    with pytest.raises(ValueError):
+        service.Client(http_cache=True)
+
+
+class DenyingMock(MockService):
+    """
+    Answers the first calls with a 200 carrying an error status.
+    """
+    def __init__(self, config, statuses=(), **options):
+        super(DenyingMock, self).__init__(config, **options)
+        self.statuses = list(statuses)
+
+    def respond(self, method, path, query):
+        status, content = super(DenyingMock, self).respond(method, path, query)
+        if self.statuses:
+            return 200, json.dumps({'status' : self.statuses.pop(0)})
+        return status, content
+
+
+@pytest.mark.parametrize('mode', ['object', 'lazy', 'compact', 'dict', 'raw'])
+def test_error_bodies_are_not_cached(spec, start_mock, mode):
+    spec['apis']['Things']['cache'] = {'ttl' : 3600}
+    mock = start_mock(spec, DenyingMock, statuses=['OVER_QUERY_LIMIT', 'REQUEST_DENIED'])
+    service = load_service(mock.config)
+
+    with service.Client(cache=MemoryCache(), response_mode=mode) as client:
+        denied = [client.get_things(q='a', key='k{}'.format(i)) for i in range(2)]
+        ok = [client.get_things(q='a', key='k{}'.format(i)) for i in range(2, 4)]
+
+    if mode == 'raw':
+        denied, ok = [json.loads(r) for r in denied], [json.loads(r) for r in ok]
+    assert [r['status'] for r in denied] == ['OVER_QUERY_LIMIT', 'REQUEST_DENIED']
+    assert [r['status'] for r in ok] == ['OK', 'OK']
+    assert mock.calls[('Things', 'GET')] == 3
+
+
+def test_spec_statuses_are_cached(spec, start_mock):
+    spec['apis']['Things']['cache'] = {'ttl' : 3600, 'statuses' : ['NOT_FOUND']}
+    mock = start_mock(spec, DenyingMock, statuses=['NOT_FOUND'])
+    service = load_service(mock.config)
+
+    with service.Client(cache=MemoryCache()) as client:
+        assert [client.get_things(q='a').status for _ in range(2)] == ['NOT_FOUND'] * 2
+    assert mock.calls[('Things', 'GET')] == 1
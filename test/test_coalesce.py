@@ -0,0 +1,88 @@
+import threading
+import concurrent.futures
+
+import pytest
+
+from rekt.service import load_service
+from rekt.coalesce import SingleFlight
+
+
+@pytest.fixture
+def executor():
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def blocked_call(calls, release):
+    def call():
+        calls.append(1)
+        release.wait(5)
+        return 'result'
+    return call
+
+
+def test_leader_cancel_does_not_reach_followers(executor):
+    flight, calls, release = SingleFlight(), [], threading.Event()
+    call = blocked_call(calls, release)
+
+    leader = flight.submit('key', executor, call)
+    followers = [flight.submit('key', executor, call) for _ in range(2)]
+    assert leader.cancel()
+    release.set()
+
+    assert [f.result(5) for f in followers] == ['result', 'result']
+    assert leader.cancelled()
+    assert len(calls) == 1
+    assert flight.coalesced == 2
+    assert flight.in_flight == 0
+
+
+def test_follower_cancel_does_not_reach_the_leader(executor):
+    flight, calls, release = SingleFlight(), [], threading.Event()
+    call = blocked_call(calls, release)
+
+    leader = flight.submit('key', executor, call)
+    follower = flight.submit('key', executor, call)
+    assert follower.cancel()
+    release.set()
+
+    assert leader.result(5) == 'result'
+    assert follower.cancelled()
+
+
+def test_exceptions_reach_every_caller(executor):
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError('boom')
+
+    futures = [flight.submit('key', executor, fail) for _ in range(3)]
+    release.set()
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result(5)
+
+
+def concurrent_calls(call, kwargs_list):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(kwargs_list)) as executor:
+        futures = [executor.submit(call, **kwargs) for kwargs in kwargs_list]
+        return [future.result(5) for future in futures]
+
+
+def test_calls_with_other_api_keys_do_not_share_a_request(start_mock):
+    mock = start_mock(latency=0.2)
+    service = load_service(mock.config)
+    with service.Client(coalesce=True) as client:
+        concurrent_calls(client.get_things, [{'q' : 'a', 'key' : 'k1'}] * 2)
+        assert mock.calls[('Things', 'GET')] == 1
+
+        concurrent_calls(client.get_things, [{'q' : 'a', 'key' : 'k1'},
+                                             {'q' : 'a', 'key' : 'k2'}])
+        assert mock.calls[('Things', 'GET')] == 3
+
+        futures = [client.async_get_things(q='a', key=key) for key in ('k1', 'k2', 'k2')]
+        assert [f.result(5).status for f in futures] == ['OK'] * 3
+        assert mock.calls[('Things', 'GET')] == 5
@@ -0,0 +1,103 @@
+import json
+import importlib.util
+
+import pytest
+
+import rekt
+
+from rekt.service import load_service
+from rekt.codegen import load_cached_config, spec_digest, main
+
+
+def write_spec(path, name):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'name' : name, 'base_url' : 'http://localhost/api',
+                                'apis' : {'Things' : {'url' : '/things', 'GET' : {}}}}))
+    return path
+
+
+def test_specs_sharing_a_name_prefix_keep_their_entries(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    places = write_spec(tmp_path / 'places.json', 'Places')
+    places_v2 = write_spec(tmp_path / 'places-v2.json', 'PlacesV2')
+
+    load_cached_config(places_v2, cache_dir)
+    load_cached_config(places, cache_dir)
+    assert len(list(cache_dir.iterdir())) == 2
+
+
+def test_specs_with_the_same_name_in_other_directories_keep_their_entries(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    first = write_spec(tmp_path / 'a' / 'places.json', 'A')
+    second = write_spec(tmp_path / 'b' / 'places.json', 'B')
+
+    for _ in range(2):
+        assert load_cached_config(first, cache_dir)['name'] == 'A'
+        assert load_cached_config(second, cache_dir)['name'] == 'B'
+    entries = sorted(cache_dir.iterdir())
+    assert len(entries) == 2
+
+    # Loading again reads the entries instead of writing them anew
+    stamps = [entry.stat().st_mtime_ns for entry in entries]
+    load_cached_config(first, cache_dir)
+    load_cached_config(second, cache_dir)
+    assert [entry.stat().st_mtime_ns for entry in sorted(cache_dir.iterdir())] == stamps
+
+
+def test_edited_specs_replace_their_entry(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    spec = write_spec(tmp_path / 'places.json', 'Places')
+    assert load_cached_config(spec, cache_dir)['name'] == 'Places'
+
+    write_spec(spec, 'Edited')
+    assert load_cached_config(spec, cache_dir)['name'] == 'Edited'
+    assert len(list(cache_dir.iterdir())) == 1
+
+
+def test_broken_entries_parsed_again(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    spec = write_spec(tmp_path / 'places.json', 'Places')
+    load_cached_config(spec, cache_dir)
+    entry, = cache_dir.iterdir()
+    entry.write_bytes(b'not marshal')
+    assert load_cached_config(spec, cache_dir)['name'] == 'Places'
+    assert load_cached_config(spec, cache_dir)['name'] == 'Places'
+
+
+def test_unwritable_cache_dir_only_costs_time(tmp_path):
+    spec = write_spec(tmp_path / 'places.json', 'Places')
+    not_a_dir = tmp_path / 'cache'
+    not_a_dir.write_text('')
+    assert load_cached_config(spec, not_a_dir)['name'] == 'Places'
+    assert load_service(str(spec), cache_dir=str(not_a_dir)).Client is not None
+
+
+def test_digest_changes_with_the_rekt_version(monkeypatch):
+    digest = spec_digest(b'name: Places')
+    monkeypatch.setattr(rekt, '__version__', rekt.__version__ + '.1')
+    assert spec_digest(b'name: Places') != digest
+
+
+def test_generated_module_and_check(tmp_path):
+    spec = write_spec(tmp_path / 'places.json', 'Places')
+    module = tmp_path / 'places.py'
+
+    main([str(spec), '-o', str(module)])
+    loader = importlib.util.spec_from_file_location('places', str(module))
+    places = importlib.util.module_from_spec(loader)
+    loader.loader.exec_module(places)
+    assert places.SPEC['name'] == 'Places'
+    assert hasattr(places.Client, 'get_things')
+
+    def check():
+        with pytest.raises(SystemExit) as exited:
+            main([str(spec), '-o', str(module), '--check'])
+        return exited.value.code
+
+    assert check() == 0
+    write_spec(spec, 'Edited')
+    assert check() == 1
+    module.unlink()
+    assert check() == 1
+    with pytest.raises(SystemExit, match='--output'):
+        main([str(spec), '--check'])
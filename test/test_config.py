@@ -0,0 +1,59 @@
+import json
+
+import pytest
+import yaml
+
+from rekt.service import load_service
+from rekt.utils import parse_config, load_config, builtin_config_path
+
+CONFIG = {'name' : 'Things', 'apis' : {'Things' : {'url' : '/things', 'GET' : {'q' : None}}}}
+
+
+@pytest.fixture
+def no_yaml(monkeypatch):
+    """
+    Fails any parse that goes through yaml.
+    """
+    def load(*args, **kwargs):
+        raise AssertionError('parsed as yaml')
+    monkeypatch.setattr(yaml, 'load', load)
+
+
+def test_json_sniffed_without_a_suffix(no_yaml):
+    text = json.dumps(CONFIG)
+    assert parse_config(text) == CONFIG
+    assert parse_config(('\n  ' + text).encode('utf-8')) == CONFIG
+    assert parse_config(b'[1, 2]') == [1, 2]
+
+
+def test_json_suffix_skips_yaml(no_yaml):
+    assert parse_config(b'"a"', '.json') == 'a'
+
+
+def test_yaml_parsed_as_yaml():
+    assert parse_config(yaml.safe_dump(CONFIG)) == CONFIG
+    assert parse_config(yaml.safe_dump(CONFIG).encode('utf-8'), '.yaml') == CONFIG
+    # Json is yaml too
+    assert parse_config(json.dumps(CONFIG), '.yml') == CONFIG
+
+
+def test_load_config_goes_by_the_suffix(tmp_path):
+    for name in ('things.json', 'things.yaml', 'THINGS.JSON', 'things'):
+        path = tmp_path / name
+        path.write_text(json.dumps(CONFIG, indent=2))
+        assert load_config(path) == CONFIG
+    with pytest.raises(ValueError):
+        path = tmp_path / 'bad.json'
+        path.write_text('name: Things')
+        load_config(path)
+
+
+def test_resource_subsets():
+    path = builtin_config_path('googlemaps')
+    service = load_service(path, resources=['Geocoding'])
+    assert [api.name for api in service.resources] == ['Geocoding']
+    assert hasattr(service.Client, 'get_geocoding')
+    assert not hasattr(service.Client, 'get_directions')
+
+    with pytest.raises(ValueError, match='Nope'):
+        load_service(path, resources=['Geocoding', 'Nope'])
@@ -0,0 +1,105 @@
+import time
+import threading
+import concurrent.futures
+
+import pytest
+
+from rekt.service import load_service
+from rekt.executor import WorkerPool
+from rekt.deadline import Deadline, as_deadline, cancellable
+from rekt.exceptions import DeadlineExceededError
+
+
+def test_deadline_runs_out():
+    deadline = Deadline(0.05)
+    assert 0 < deadline.remaining() <= 0.05
+    assert deadline.timeout(10) <= 0.05
+    assert deadline.timeout((10, None)) == pytest.approx((0.05, 0.05), abs=0.01)
+    time.sleep(0.06)
+    assert deadline.expired
+    with pytest.raises(DeadlineExceededError):
+        deadline.remaining()
+
+    unlimited = Deadline()
+    assert unlimited.remaining() is None and unlimited.timeout(3) == 3
+    assert as_deadline(None) is None and as_deadline(unlimited) is unlimited
+
+
+def test_sleep_fails_fast_past_the_deadline():
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        Deadline(0.5).sleep(1)
+    assert time.monotonic() - started < 0.1
+
+
+def test_sleep_wakes_up_when_cancelled():
+    deadline = Deadline()
+    threading.Timer(0.05, deadline.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(concurrent.futures.CancelledError):
+        deadline.sleep(5)
+    assert time.monotonic() - started < 1
+
+
+def test_children_cancelled_with_their_parent():
+    parent = Deadline(10)
+    first, second = parent.child(), parent.child()
+    assert first.expires == parent.expires
+    first.cancel()
+    assert first.cancelled and not second.cancelled and not parent.cancelled
+    parent.cancel()
+    with pytest.raises(concurrent.futures.CancelledError):
+        second.remaining()
+
+
+def test_cancel_stops_running_work():
+    deadline = Deadline()
+    checks = []
+
+    def work():
+        while True:
+            checks.append(deadline.remaining())
+            time.sleep(0.01)
+
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        future = cancellable(lambda: executor.submit(work), deadline)
+        while not checks:
+            time.sleep(0.01)
+        assert future.cancel()
+        assert future.cancelled() and deadline.cancelled
+        with pytest.raises(concurrent.futures.CancelledError):
+            future._inner.result(1)
+
+
+def test_timeout_covers_the_whole_call(start_mock):
+    service = load_service(start_mock(latency=0.5).config)
+    with service.Client() as client:
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceededError):
+            client.get_things(q='a', _timeout=0.1)
+        assert time.monotonic() - started < 0.4
+
+
+def test_async_timeout_covers_the_wait_in_the_queue(start_mock):
+    mock = start_mock(latency=0.3)
+    service = load_service(mock.config)
+    with WorkerPool(max_workers=1) as pool, service.Client(executor=pool) as client:
+        busy = client.async_get_things(q='a')
+        queued = client.async_get_things(q='b', _timeout=0.1)
+        with pytest.raises(DeadlineExceededError):
+            queued.result(5)
+        busy.result(5)
+    assert mock.calls[('Things', 'GET')] == 1
+
+
+def test_cancelled_async_calls_never_start(start_mock):
+    mock = start_mock(latency=0.2)
+    service = load_service(mock.config)
+    with WorkerPool(max_workers=1) as pool, service.Client(executor=pool) as client:
+        busy = client.async_get_things(q='a')
+        queued = client.async_get_things(q='b')
+        assert queued.cancel()
+        busy.result(5)
+        with pytest.raises(concurrent.futures.CancelledError):
+            queued.result(0)
+    assert mock.calls[('Things', 'GET')] == 1
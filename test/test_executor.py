@@ -0,0 +1,166 @@
+import time
+import threading
+
+import pytest
+
+from rekt.exceptions import QueueFullError, DeadlineExceededError
+from rekt.executor import FairQueue, WorkerPool, BLOCK, REJECT, CALLER_RUNS, QUEUE_PER_WORKER
+
+
+def drain(queue):
+    return [queue.pop() for _ in range(len(queue))]
+
+
+def test_higher_priorities_run_first():
+    queue = FairQueue()
+    for item, priority in (('low', 0), ('high', 2), ('mid', 1), ('high2', 2)):
+        queue.push(item, priority=priority)
+    assert drain(queue) == ['high', 'high2', 'mid', 'low']
+
+
+def test_tags_share_in_proportion_to_their_weight():
+    queue = FairQueue()
+    for i in range(6):
+        queue.push(('a', i), tag='a', weight=2.0)
+    for i in range(6):
+        queue.push(('b', i), tag='b', weight=1.0)
+
+    order = drain(queue)
+    assert [tag for tag, _ in order[:6]] == ['a', 'a', 'b', 'a', 'a', 'b']
+    # Calls of a tag keep their submission order
+    assert [i for tag, i in order if tag == 'a'] == list(range(6))
+    assert [i for tag, i in order if tag == 'b'] == list(range(6))
+
+
+def test_queue_weights_override_the_call_weights():
+    queue = FairQueue(weights={'b' : 3.0})
+    for i in range(4):
+        queue.push('a', tag='a', weight=1.0)
+        queue.push('b', tag='b', weight=1.0)
+    assert drain(queue)[:4] == ['b', 'b', 'a', 'b']
+
+
+def test_a_new_tag_does_not_wait_behind_a_backlog():
+    queue = FairQueue()
+    for i in range(10):
+        queue.push('bulk', tag='bulk')
+    assert queue.pop() == 'bulk'
+    queue.push('interactive', tag='interactive')
+    assert queue.pop() == 'interactive'
+
+
+def test_weights_must_be_positive():
+    with pytest.raises(ValueError):
+        FairQueue().push('a', weight=0)
+
+
+def test_worker_pool_runs_queued_calls_by_priority():
+    release, order = threading.Event(), []
+    pool = WorkerPool(max_workers=1)
+    try:
+        blocker = pool.submit(release.wait, 5)
+        futures = [pool.schedule(lambda p=p: order.append(p), priority=p) for p in (0, 2, 1)]
+        release.set()
+        blocker.result(5)
+        for future in futures:
+            future.result(5)
+    finally:
+        pool.shutdown()
+    assert order == [2, 1, 0]
+
+
+def full_pool(overflow):
+    """
+    A pool of one busy worker and a full queue of one call, with the
+    event releasing the worker.
+    """
+    pool = WorkerPool(max_workers=1, max_queue=1, overflow=overflow)
+    started, release = threading.Event(), threading.Event()
+    pool.submit(lambda: started.set() or release.wait(5))
+    started.wait(5)
+    pool.submit(lambda: None)
+    return pool, release
+
+
+def test_full_queue_rejects_calls():
+    pool, release = full_pool(REJECT)
+    try:
+        with pytest.raises(QueueFullError):
+            pool.submit(lambda: None)
+        assert pool.stats.rejected == 1
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_full_queue_runs_calls_on_the_caller():
+    pool, release = full_pool(CALLER_RUNS)
+    try:
+        future = pool.submit(threading.current_thread)
+        assert future.result(0) is threading.current_thread()
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_full_queue_blocks_the_caller_until_there_is_room():
+    pool, release = full_pool(BLOCK)
+    futures = []
+    try:
+        submitter = threading.Thread(target=lambda: futures.append(pool.submit(lambda: 1)))
+        submitter.start()
+        submitter.join(0.1)
+        assert submitter.is_alive() and not futures
+
+        release.set()
+        submitter.join(5)
+        assert futures[0].result(5) == 1
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_calls_expire_in_the_queue():
+    pool, release = WorkerPool(max_workers=1), threading.Event()
+    try:
+        pool.submit(release.wait, 5)
+        expiring = pool.schedule(lambda: 1, deadline=time.monotonic() + 0.05)
+        time.sleep(0.1)
+        release.set()
+        with pytest.raises(DeadlineExceededError):
+            expiring.result(5)
+        assert pool.stats.expired == 1
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_no_calls_after_shutdown():
+    pool = WorkerPool(max_workers=1)
+    pool.shutdown()
+    with pytest.raises(RuntimeError):
+        pool.submit(lambda: None)
+
+
+def test_blocking_submit_from_a_worker_runs_on_the_worker():
+    pool = WorkerPool(max_workers=1, max_queue=1, overflow=BLOCK)
+    release, order = threading.Event(), []
+    try:
+        def first():
+            # Fills the queue, then submits from the only worker
+            pool.submit(release.wait, 5)
+            inner = pool.submit(lambda: order.append(threading.current_thread()))
+            order.append(inner.done())
+            return threading.current_thread()
+
+        worker = pool.submit(first).result(5)
+        release.set()
+    finally:
+        pool.shutdown()
+    assert order == [worker, True]
+
+
+def test_default_client_pool_has_a_bounded_queue(service):
+    with service.Client(thread_count=3) as client:
+        assert client._executor.max_queue == 3 * QUEUE_PER_WORKER
+        assert client._executor.overflow == BLOCK
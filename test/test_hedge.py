@@ -0,0 +1,50 @@
+import time
+import threading
+
+from rekt.service import load_service
+from rekt.hedge import HedgePolicy
+from rekt.breaker import BreakerState, CircuitBreaker
+from rekt.metrics import Metrics
+
+
+def test_cancelled_hedge_loser_does_not_count_as_a_failure(start_mock):
+    metrics = Metrics()
+    service = load_service(start_mock(latency=0.2, items=200, item_size=1000).config)
+    with service.Client(hedge=HedgePolicy(delay=0.05, max_rate=1.0),
+                        circuit_breaker=CircuitBreaker(min_calls=2, failure_rate=0.5),
+                        metrics=metrics) as client:
+        for _ in range(4):
+            assert client.get_things(q='a').status == 'OK'
+        # Let the losers see their cancellation
+        time.sleep(0.4)
+
+        assert client.hedge_policies['Things'].stats.hedged > 0
+        breaker = client.circuit_breakers['Things']
+        assert breaker.state is BreakerState.closed
+        assert breaker.stats.failures == 0
+
+    statuses = set([status for _, _, status in metrics.snapshot().requests])
+    assert statuses == set([200])
+
+
+def test_busy_hedge_pool_does_not_limit_concurrent_calls(start_mock):
+    service = load_service(start_mock(latency=0.3).config)
+    with service.Client(thread_count=2, hedge=HedgePolicy(delay=5.0)) as client:
+        errors = []
+
+        def call():
+            try:
+                client.get_things(q='a')
+            except Exception as e:
+                errors.append(e)
+
+        # Four hedge workers for sixteen callers
+        threads = [threading.Thread(target=call) for _ in range(16)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert not errors
+        assert time.monotonic() - started < 0.9
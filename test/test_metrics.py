@@ -0,0 +1,126 @@
+import gzip
+import json
+import time
+import asyncio
+import threading
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from rekt.service import load_service
+from rekt.metrics import Metrics, prometheus_text, CACHE_HIT, TASK_QUEUED, TASK_STARTED
+
+CONTENT = json.dumps({'status' : 'OK', 'results' : ['x' * 100] * 100}).encode('utf-8')
+BODY = gzip.compress(CONTENT)
+
+
+class SlowBodyHandler(BaseHTTPRequestHandler):
+    """
+    Sends the headers right away and the gzipped body late, chunked
+    unless the server has a content_length.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Encoding', 'gzip')
+        if self.server.content_length:
+            self.send_header('Content-Length', str(len(BODY)))
+        else:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.wfile.flush()
+        time.sleep(0.2)
+        if self.server.content_length:
+            self.wfile.write(BODY)
+            return
+        for start in range(0, len(BODY), 1000):
+            chunk = BODY[start:start + 1000]
+            self.wfile.write('{:x}\r\n'.format(len(chunk)).encode() + chunk + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+
+@pytest.fixture(params=[True, False], ids=['content-length', 'chunked'])
+def slow_service(request, spec):
+    server = HTTPServer(('127.0.0.1', 0), SlowBodyHandler)
+    server.content_length = request.param
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    spec['base_url'] = 'http://127.0.0.1:{}/api'.format(server.server_address[1])
+    service = load_service(spec)
+    service.content_length = request.param
+    yield service
+    server.shutdown()
+    server.server_close()
+
+
+def request_metrics(metrics):
+    snapshot = metrics.snapshot()
+    latency = snapshot.latency
+    return (latency[('Things', 'GET', 'ttfb')].sum, latency[('Things', 'GET', 'total')].sum,
+            snapshot.bytes[('Things', 'GET', 'in')])
+
+
+def test_sync_and_asyncio_metrics_agree(slow_service):
+    sync_metrics, async_metrics = Metrics(), Metrics()
+    with slow_service.Client(metrics=sync_metrics) as client:
+        assert client.get_things(q='a').status == 'OK'
+
+    async def call():
+        client = slow_service.AsyncClient(metrics=async_metrics)
+        try:
+            return await client.get_things(q='a')
+        finally:
+            await client.close()
+    assert asyncio.run(call()).status == 'OK'
+
+    for metrics in (sync_metrics, async_metrics):
+        ttfb, total, bytes_in = request_metrics(metrics)
+        assert ttfb < 0.15 <= total
+        # The gzipped Content-Length, else the size of the decoded body
+        assert bytes_in == (len(BODY) if slow_service.content_length else len(CONTENT))
+
+
+def test_prometheus_text():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.on_request('Things', 'GET', 200, 0.05, 0.01, 10, 100)
+    metrics.on_request('Things', 'GET', 200, 0.5, 0.2, 10, 100)
+    metrics.on_request('Things', 'GET', 'Timeout', 2.0, None, 10, 0)
+    metrics.on_event('Say "hi"\\', CACHE_HIT)
+    metrics.on_task(TASK_QUEUED)
+    metrics.on_task(TASK_QUEUED)
+    metrics.on_task(TASK_STARTED)
+
+    lines = prometheus_text(metrics.snapshot(), namespace='api').splitlines()
+    for line in (
+            'api_requests_total{resource="Things",status="200",verb="GET"} 2',
+            'api_requests_total{resource="Things",status="Timeout",verb="GET"} 1',
+            # Buckets are cumulative and end with every observation
+            'api_request_duration_seconds_bucket{le="0.1",resource="Things",verb="GET"} 1',
+            'api_request_duration_seconds_bucket{le="1.0",resource="Things",verb="GET"} 2',
+            'api_request_duration_seconds_bucket{le="+Inf",resource="Things",verb="GET"} 3',
+            'api_request_duration_seconds_sum{resource="Things",verb="GET"} 2.55',
+            'api_request_duration_seconds_count{resource="Things",verb="GET"} 3',
+            # Failed attempts have no ttfb
+            'api_request_ttfb_seconds_bucket{le="+Inf",resource="Things",verb="GET"} 2',
+            'api_request_ttfb_seconds_count{resource="Things",verb="GET"} 2',
+            'api_bytes_total{direction="in",resource="Things",verb="GET"} 200',
+            'api_bytes_total{direction="out",resource="Things",verb="GET"} 30',
+            'api_events_total{event="cache_hit",resource="Say \\"hi\\"\\\\"} 1',
+            'api_executor_queued 1',
+            'api_executor_active 1'):
+        assert line in lines
+
+    # Every sample belongs to a family declared once
+    declared = [line.split()[2] for line in lines if line.startswith('# TYPE')]
+    assert len(declared) == len(set(declared))
+    for line in lines:
+        if not line.startswith('#'):
+            family = line.split('{')[0].split(' ')[0]
+            assert any(family.startswith(name) for name in declared)
+    assert '# TYPE api_request_duration_seconds histogram' in lines
@@ -0,0 +1,28 @@
+import time
+
+import pytest
+
+from rekt.utils import builtin_config_path
+from rekt.service import load_service
+from rekt.exceptions import DeadlineExceededError
+
+
+def test_nested_stream_paths_are_served(start_mock):
+    mock = start_mock(builtin_config_path('googlemaps'), items=4)
+    service = load_service(mock.config)
+    with service.Client() as client:
+        elements = list(client.get_distance_matrix(origins='a', destinations='b', _stream=True))
+    assert [e.id for e in elements] == ['{:012d}'.format(i) for i in range(4)]
+
+
+def test_clients_hanging_up_are_dropped_quietly(start_mock, capfd):
+    mock = start_mock(latency=0.2, items=2000, item_size=1000)
+    service = load_service(mock.config)
+    for _ in range(3):
+        with service.Client() as client:
+            with pytest.raises(DeadlineExceededError):
+                client.get_things(q='a', _timeout=0.05)
+    # Let the mock write to the closed connections
+    time.sleep(0.5)
+
+    assert 'Traceback' not in capfd.readouterr().err
@@ -0,0 +1,102 @@
+import time
+import concurrent.futures
+
+from collections import namedtuple
+
+import pytest
+
+from rekt.service import load_service
+from rekt.paginate import PageScheme, create_page_scheme, iter_pages, iter_items
+
+SCHEME = PageScheme(token='next', cursor='page', items='results', page_size=None, delay=0)
+
+
+def run_inline(func):
+    """
+    A submit running func right away, so that fetching ahead happens
+    within the calls into the iteration.
+    """
+    future = concurrent.futures.Future()
+    try:
+        future.set_result(func())
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+class Pages(object):
+    """
+    A fetch serving pages numbered from 1 and recording each one asked
+    for, failing the page numbered fail.
+    """
+    def __init__(self, count, fail=None):
+        self.count = count
+        self.fail = fail
+        self.fetched = []
+
+    def __call__(self, params):
+        number = params.get('page', 1)
+        self.fetched.append(number)
+        if number == self.fail:
+            raise IOError(number)
+        page = {'results' : [number * 10 + i for i in range(2)]}
+        if number < self.count:
+            page['next'] = number + 1
+        return page
+
+
+@pytest.mark.parametrize('max_buffered, fetched', [(0, [1]), (1, [1, 2]), (2, [1, 2, 3])])
+def test_pages_fetched_ahead_up_to_max_buffered(max_buffered, fetched):
+    fetch = Pages(5)
+    pages = iter_pages(run_inline, fetch, SCHEME, {'q' : 'a'}, max_buffered=max_buffered)
+    assert next(pages)['results'] == [10, 11]
+    assert fetch.fetched == fetched
+
+    assert [page['results'][0] for page in pages] == [20, 30, 40, 50]
+    assert fetch.fetched == [1, 2, 3, 4, 5]
+
+
+def test_max_pages_stops_fetching_ahead():
+    fetch = Pages(5)
+    items = iter_items(iter_pages(run_inline, fetch, SCHEME, {}, max_buffered=3, max_pages=2),
+                       SCHEME)
+    assert list(items) == [10, 11, 20, 21]
+    assert fetch.fetched == [1, 2]
+
+
+def test_failed_page_raised_in_turn():
+    pages = iter_pages(run_inline, Pages(3, fail=2), SCHEME, {})
+    assert next(pages)['next'] == 2
+    with pytest.raises(IOError):
+        next(pages)
+
+
+def test_token_delay_waited_for():
+    scheme = SCHEME._replace(delay=0.1)
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        started = time.monotonic()
+        assert len(list(iter_pages(executor.submit, Pages(3), scheme, {}))) == 3
+    assert time.monotonic() - started >= 0.2
+
+
+def test_page_scheme_from_the_spec():
+    Api = namedtuple('Api', ('name', 'options'))
+    scheme = create_page_scheme(Api('Things', {'paginate' : {'token' : 'next', 'cursor' : 'page'}}))
+    assert scheme == SCHEME
+    assert create_page_scheme(Api('Things', {})) is None
+    for spec in ({'token' : 'next'}, {'token' : 'next', 'cursor' : 'page', 'size' : 10}):
+        with pytest.raises(ValueError):
+            create_page_scheme(Api('Things', {'paginate' : spec}))
+
+
+def test_client_iterates_the_items_of_every_page(spec, start_mock):
+    spec['apis']['Things']['GET']['page'] = None
+    spec['apis']['Things']['paginate'] = {'token' : 'next', 'cursor' : 'page'}
+    mock = start_mock(spec, items=4, pages=3)
+    service = load_service(mock.config)
+
+    with service.Client() as client:
+        assert len(list(client.iter_things(q='a'))) == 12
+        assert mock.calls[('Things', 'GET')] == 3
+        assert len(list(client.iter_things(q='a', _max_pages=1, _max_buffered=0))) == 4
+        assert mock.calls[('Things', 'GET')] == 4
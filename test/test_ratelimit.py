@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from rekt.service import load_service
+from rekt.ratelimit import TokenBucket
+from rekt.exceptions import DeadlineExceededError, QuotaExceededError
+
+
+def test_spent_quota_gives_back_the_tokens_of_other_buckets(spec, start_mock):
+    spec['name'] = 'ThingService'
+    service = load_service(start_mock(spec).config)
+    # Calls take a token of the resource bucket, then of the service one
+    resource_bucket = TokenBucket(qps=100, burst=5, daily_quota=10)
+    service_bucket = TokenBucket(qps=100, daily_quota=1)
+    with service.Client(rate_limits={'Things' : resource_bucket,
+                                     'ThingService' : service_bucket}) as client:
+        service_bucket.reserve()
+        for _ in range(3):
+            with pytest.raises(QuotaExceededError):
+                client.get_things(q='a')
+
+    stats = resource_bucket.stats
+    assert stats.daily_remaining == 10
+    assert stats.tokens == pytest.approx(5)
+
+
+def test_deadline_gives_back_the_tokens(service):
+    bucket = TokenBucket(qps=0.5, burst=1, daily_quota=10)
+    with service.Client(rate_limits={'Things' : bucket}) as client:
+        bucket.reserve()
+        with pytest.raises(DeadlineExceededError):
+            client.get_things(q='a', _timeout=0.1)
+
+    stats = bucket.stats
+    assert stats.daily_remaining == 9
+    assert stats.tokens == pytest.approx(0, abs=0.1)
+
+
+class Clock(object):
+    """
+    Stands in for time.monotonic and time.time, moved on by the test.
+    """
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr('rekt.ratelimit.time.monotonic', clock)
+    monkeypatch.setattr('rekt.ratelimit.time.time', clock)
+    return clock
+
+
+def test_bursts_then_paces(clock):
+    bucket = TokenBucket(qps=10, burst=2)
+    waits = [bucket.reserve() for _ in range(4)]
+    assert waits == pytest.approx([0, 0, 0.1, 0.2])
+
+    stats = bucket.stats
+    assert stats.throttled == 2
+    assert stats.throttled_seconds == pytest.approx(0.3)
+
+    # Tokens come back at qps but never beyond the burst
+    clock.now += 10
+    assert bucket.stats.tokens == pytest.approx(2)
+
+
+def test_daily_quota_resets_each_day(clock):
+    bucket = TokenBucket(qps=1000, daily_quota=2)
+    bucket.reserve()
+    bucket.reserve()
+    assert bucket.stats.daily_remaining == 0
+    with pytest.raises(QuotaExceededError):
+        bucket.reserve()
+
+    clock.now += 24 * 60 * 60
+    assert bucket.reserve() == 0
+    assert bucket.stats.daily_remaining == 1
+
+
+def test_spec_limits_pace_the_client(spec, start_mock):
+    spec['name'] = 'ThingService'
+    spec['rate_limit'] = {'qps' : 1000, 'daily_quota' : 5}
+    spec['apis']['Things']['rate_limit'] = {'qps' : 20, 'burst' : 1}
+    service = load_service(start_mock(spec).config)
+
+    with service.Client() as client:
+        assert sorted(client.rate_limits) == ['ThingService', 'Things']
+        started = time.monotonic()
+        for _ in range(4):
+            client.get_things(q='a')
+        # The first call spends the burst and the others wait 1/qps each
+        assert time.monotonic() - started >= 0.15
+        assert client.rate_limits['ThingService'].stats.daily_remaining == 1
@@ -0,0 +1,83 @@
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+from requests.adapters import BaseAdapter
+
+from rekt.transport import SessionTransport
+from rekt.httputils import HTTPVerb, ArgsLocation
+from rekt.service import create_request_builder, request_arguments, load_service
+
+ARGS = {
+    'q' : None,
+    'radius' : {'default' : 500},
+    'language' : {'default' : 'en'},
+    'key' : {'location' : 'query_string'},
+    'token' : {'location' : 'body'},
+}
+
+
+class SentRequests(SessionTransport, BaseAdapter):
+    """
+    Sends calls with the session adapter and keeps the requests sent.
+    """
+    def __init__(self):
+        BaseAdapter.__init__(self)
+        self.sent = []
+
+    def adapter(self, adapter):
+        self._adapter = adapter
+        return self
+
+    def send(self, request, **kwargs):
+        self.sent.append(request)
+        return self._adapter.send(request, **kwargs)
+
+    def close(self):
+        pass
+
+
+def test_defaults_applied_and_none_left_out():
+    build = create_request_builder('Things', HTTPVerb.GET, ARGS).build
+    assert build({'q' : 'a'}) == {'q' : 'a', 'radius' : 500, 'language' : 'en'}
+    assert build({'q' : None, 'radius' : 10}) == {'radius' : 10, 'language' : 'en'}
+    # Passing None leaves out an argument with a default
+    assert build({'language' : None}) == {'radius' : 500}
+    assert create_request_builder('Things', HTTPVerb.GET, {'q' : None}).build({'q' : None}) == {}
+
+
+def test_unknown_arguments_rejected():
+    builder = create_request_builder('Things', HTTPVerb.GET, ARGS)
+    with pytest.raises(TypeError, match='nope'):
+        builder.build({'q' : 'a', 'nope' : 1})
+
+
+def test_verbs_send_their_arguments_where_the_spec_says():
+    get = create_request_builder('Things', HTTPVerb.GET, ARGS)
+    post = create_request_builder('Things', HTTPVerb.POST, ARGS)
+    assert get.location is ArgsLocation.query_string and get.moved == frozenset(['token'])
+    assert post.location is ArgsLocation.body and post.moved == frozenset(['key'])
+
+    params = {'q' : 'a', 'key' : 'k', 'token' : 't'}
+    assert request_arguments(get, params) == ({'q' : 'a', 'key' : 'k'}, {'token' : 't'})
+    assert request_arguments(post, params) == ({'key' : 'k'}, {'q' : 'a', 'token' : 't'})
+
+    plain = create_request_builder('Things', HTTPVerb.POST, {'q' : None})
+    assert request_arguments(plain, {'q' : 'a'}) == (None, {'q' : 'a'})
+
+
+def test_requests_carry_the_arguments(spec, start_mock):
+    spec['apis']['Things']['GET']['radius'] = {'default' : 500}
+    spec['apis']['Things']['POST']['key'] = {'location' : 'query_string'}
+    service = load_service(start_mock(spec).config)
+
+    with SentRequests() as transport:
+        with service.Client(transport=transport) as client:
+            client.get_things(q='a')
+            client.post_things(q='b', key='k')
+        get, post = transport.sent
+
+    assert parse_qs(urlsplit(get.url).query) == {'q' : ['a'], 'radius' : ['500']}
+    assert get.body is None
+    assert parse_qs(urlsplit(post.url).query) == {'key' : ['k']}
+    assert parse_qs(post.body) == {'q' : ['b']}
@@ -0,0 +1,75 @@
+import pickle
+
+import pytest
+
+from rekt.service import HTTPVerb, load_service, decode_content
+from rekt.response import ResponseMode, LazyObject, LazyList, Layouts
+from rekt.response import _MAX_LAYOUTS, _RESTORED_LAYOUTS
+
+BODY = b'{"items": [{"id": 1}], "keys": "k", "values": [2], "get": null, "name": "a"}'
+
+
+@pytest.fixture
+def decode(spec):
+    api, = load_service(spec).resources
+
+    def decode(content, mode):
+        return decode_content(api, HTTPVerb.GET, content, ResponseMode(mode))
+    return decode
+
+
+def test_lazy_top_level_array_is_wrapped(decode):
+    response = decode(b'[{"id": 1, "tags": [{"name": "a"}]}, 2]', 'lazy')
+    assert isinstance(response, LazyList)
+    assert isinstance(response[0], LazyObject)
+    assert response[0].id == 1
+    assert response[0].tags[0].name == 'a'
+    assert response[0].missing is None
+    assert response[1] == 2
+
+
+def test_lazy_fields_shadow_mapping_methods(decode):
+    response = decode(BODY, 'lazy')
+    assert response.items[0].id == 1
+    assert response.keys == 'k'
+    assert response.values == [2]
+    assert response.get is None
+    assert response.name == 'a'
+    assert response['items'][0].id == 1
+
+    # Without such keys the methods are still there
+    item = response.items[0]
+    assert list(item.keys()) == ['id']
+    assert item.get('id') == 1
+
+
+def test_modes_agree_on_field_access(decode):
+    for mode in ('object', 'lazy'):
+        response = decode(BODY, mode)
+        assert response.items[0]['id'] == 1
+        assert response.keys == 'k'
+        assert response.nothing is None
+
+
+def test_compact_fields_shadow_mapping_methods(decode):
+    response = decode(BODY, 'compact')
+    assert response.items[0].id == 1
+    assert response.keys == 'k'
+    assert response.values == [2]
+    assert response.get is None
+    assert response.nothing is None
+
+    item = response.items[0]
+    assert list(item.keys()) == ['id']
+    assert item.get('id') == 1
+
+
+def test_restored_compact_layouts_are_bounded():
+    layouts = Layouts('Thing', max_layouts=_MAX_LAYOUTS + 10)
+    objects = [layouts.make({'f{}'.format(i) : i}) for i in range(_MAX_LAYOUTS + 10)]
+    restored = [pickle.loads(pickle.dumps(obj)) for obj in objects]
+
+    assert len(_RESTORED_LAYOUTS['Thing']) == _MAX_LAYOUTS
+    assert [dict(obj) for obj in restored] == [dict(obj) for obj in objects]
+    assert restored[0].__class__.__name__ == 'Thing'
+    assert restored[-1].f265 == 265
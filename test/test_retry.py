@@ -0,0 +1,97 @@
+import time
+import email.utils
+
+from collections import namedtuple
+
+import pytest
+import requests
+
+from rekt.service import load_service
+from rekt.retry import RetryPolicy, RetryBudget, parse_retry_after, create_retry_policies
+
+
+def response(status=503, **headers):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+
+def test_backoff_doubles_up_to_max_backoff():
+    policy = RetryPolicy(backoff=0.1, max_backoff=0.5, jitter=False)
+    assert [policy.delay(n) for n in range(4)] == pytest.approx([0.1, 0.2, 0.4, 0.5])
+
+    jittered = RetryPolicy(backoff=0.1, max_backoff=0.5)
+    assert all(0 <= jittered.delay(3) <= 0.5 for _ in range(100))
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('2.5') == 2.5
+    assert parse_retry_after('-1') == 0.0
+    in_a_minute = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert parse_retry_after(in_a_minute) == pytest.approx(60, abs=2)
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_retry_after_is_waited_for_up_to_max_backoff():
+    policy = RetryPolicy(backoff=0.1, max_backoff=10.0, jitter=False)
+    assert policy.delay(0, response(**{'Retry-After' : '3'})) == 3.0
+    assert policy.delay(0, response(**{'Retry-After' : '10'})) == 10.0
+
+
+def test_long_retry_after_fails_fast():
+    policy = RetryPolicy(backoff=0.1, max_backoff=10.0)
+    assert policy.delay(0, response(**{'Retry-After' : '3600'})) is None
+    assert RetryPolicy(respect_retry_after=False).delay(
+        0, response(**{'Retry-After' : '3600'})) <= 0.1
+
+
+def test_long_retry_after_returns_the_response_without_waiting(start_mock):
+    mock = start_mock(error_rate=1.0, retry_after=3600)
+    service = load_service(mock.config)
+    with service.Client(retry=RetryPolicy(max_attempts=3, max_backoff=1.0)) as client:
+        started = time.monotonic()
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.get_things(q='a')
+        assert time.monotonic() - started < 0.5
+    assert mock.calls[('Things', 'GET')] == 1
+
+
+def test_budget_caps_retries_at_a_ratio_of_calls():
+    budget = RetryBudget(ratio=0.5, min_per_second=0)
+    for _ in range(4):
+        budget.record_call()
+    assert [budget.try_retry() for _ in range(3)] == [True, True, False]
+    assert budget.stats == (4, 2, 1)
+
+
+def test_spec_retry_settings_override_the_client_policy():
+    Api = namedtuple('Api', ('name', 'options'))
+    apis = [Api('Things', {'retry' : {'max_attempts' : 5, 'statuses' : [429]}}),
+            Api('Others', {'retry' : False}), Api('Plain', {})]
+
+    policies = create_retry_policies(RetryPolicy(backoff=1.0), apis)
+    assert policies['Things'].max_attempts == 5
+    assert policies['Things'].statuses == frozenset([429])
+    assert policies['Things'].backoff == 1.0
+    assert policies['Others'] is None
+    assert policies['Plain'].max_attempts == 3
+    assert create_retry_policies(None, apis[2:]) == {'Plain' : None}
+
+
+def test_failed_calls_retried_within_the_budget(start_mock):
+    mock = start_mock(error_rate=1.0)
+    service = load_service(mock.config)
+    policy = RetryPolicy(max_attempts=3, backoff=0.01)
+    with service.Client(retry=policy) as client:
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.get_things(q='a')
+    assert mock.calls[('Things', 'GET')] == 3
+
+    spent = RetryBudget(ratio=0, min_per_second=0)
+    with service.Client(retry=policy, retry_budget=spent) as client:
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.get_things(q='a')
+    assert mock.calls[('Things', 'GET')] == 4
+    assert spent.stats == (1, 0, 1)
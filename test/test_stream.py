@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from rekt.stream import PathScanner, iter_path, parse_path
+
+BODY = json.dumps({
+    'status' : 'OK',
+    'origin_addresses' : ['a [b] {c}', 'say "hi"', 'back\\slash\\'],
+    'rows' : [
+        {'elements' : [{'distance' : {'text' : '1 km', 'value' : 1000}, 'status' : 'OK'},
+                       {'status' : 'NOT_FOUND', 'note' : '"}]\\'}]},
+        {'extra' : {'elements' : [1, 2]}, 'elements' : []},
+        {'elements' : [3.5e2, None, True, 'x,y', [1, [2]]]},
+    ],
+    'elements' : ['off the path'],
+}, indent=1).encode('utf-8')
+
+ELEMENTS = [element for row in json.loads(BODY.decode('utf-8'))['rows'] for element in row['elements']]
+
+
+def scan(chunks, path='rows[*].elements[*]'):
+    return [json.loads(element.decode('utf-8')) for element in iter_path(chunks, path)]
+
+
+def test_parse_path():
+    assert parse_path('rows[*].elements[*]') == ('rows', '*', 'elements', '*')
+    assert parse_path('[*]') == ('*',)
+    assert parse_path('matrix[*][*]') == ('matrix', '*', '*')
+    for path in ('', 'rows.', 'rows[0]', 'rows[*'):
+        with pytest.raises(ValueError):
+            parse_path(path)
+
+
+def test_nested_path_elements():
+    assert scan([BODY]) == ELEMENTS
+
+
+def test_every_chunk_boundary():
+    for split in range(1, len(BODY)):
+        assert scan([BODY[:split], BODY[split:]]) == ELEMENTS, split
+
+
+def test_byte_at_a_time():
+    assert scan(BODY[i:i + 1] for i in range(len(BODY))) == ELEMENTS
+
+
+def test_escapes_at_chunk_boundaries():
+    body = json.dumps([{'v' : 'a\\"b'}, '\\\\', '"]', '\\']).encode('utf-8')
+    expected = json.loads(body.decode('utf-8'))
+    for split in range(1, len(body)):
+        assert scan([body[:split], body[split:]], '[*]') == expected, split
+
+
+def test_elements_released_as_they_complete():
+    scanner = PathScanner('[*]')
+    assert scanner.feed(b'[{"a" : [1, 2') == []
+    assert scanner.feed(b']}, 3') == [b'{"a" : [1, 2]}']
+    # A scalar is only complete once what follows it arrives
+    assert scanner.feed(b' ') == [b'3']
+    assert scanner.feed(b']') == []
+    assert scanner.close() == []
+
+
+def test_values_of_the_wrong_type_skipped():
+    assert scan([b'{"rows" : {"elements" : [1]}}']) == []
+    assert scan([b'[1, 2]'], 'rows[*]') == []
+
+
+def test_truncated_body():
+    scanner = PathScanner('[*]')
+    assert scanner.feed(b'[1, {"a"') == [b'1']
+    with pytest.raises(ValueError):
+        scanner.close()
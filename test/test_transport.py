@@ -0,0 +1,29 @@
+from rekt.transport import RecordingTransport, ReplayTransport, request_key
+
+
+def test_request_key_leaves_secrets_out_of_form_bodies():
+    key = request_key('POST', 'http://a/things', 'q=1&key=secret&signature=s')
+    assert key == request_key('POST', 'http://b/things', b'key=other&q=1')
+    assert key != request_key('POST', 'http://a/things', 'q=2&key=secret')
+    assert 'secret' not in key
+    assert request_key('POST', 'http://a/things', 'key=secret') == 'POST /things'
+
+
+def test_request_key_hashes_other_bodies_whole():
+    assert (request_key('POST', 'http://a/things', '{"key": "a"}')
+            != request_key('POST', 'http://a/things', '{"key": "b"}'))
+
+
+def test_replay_matches_posts_made_with_another_key(service, tmp_path):
+    path = str(tmp_path / 'things.cassette')
+    with RecordingTransport(path) as transport:
+        with service.Client(transport=transport) as client:
+            recorded = client.post_things(q='a', key='recording-key')
+
+    with open(path, 'rb') as infile:
+        assert b'recording-key' not in infile.read()
+
+    with ReplayTransport(path) as transport:
+        with service.Client(transport=transport) as client:
+            assert client.post_things(q='a', key='replay-key') == recorded
+        assert transport.stats.hits == 1